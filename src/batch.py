@@ -0,0 +1,227 @@
+import argparse
+import collections
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from book import sanToMove
+from chessengine import TranspositionTable, createEngine, moveToUCI
+
+DEFAULT_DEPTH = 4
+#Positions handed to the pool but not yet written, per worker. Bounds the memory used however long the input is.
+IN_FLIGHT_PER_WORKER = 4
+#Results written between two checkpoints.
+CHECKPOINT_EVERY = 100
+CHECKPOINT_SUFFIX = ".checkpoint"
+#Scores are in pawns, the results report them in centipawns like UCI.
+CENTIPAWNS = 100
+
+#Engine of the worker process, created once by _initWorker and reused for every position.
+_worker = {}
+
+
+def _initWorker(backend, hashSizeMB):
+    """
+    Creates the engine of a worker process.
+
+    Args:
+        backend (str): Board representation of the engine.
+        hashSizeMB (int): Size of the transposition table in megabytes.
+    """
+    engine = createEngine(backend, hashSizeMB)
+    engine.verbose = False
+    _worker["engine"] = engine
+
+
+def parseEpd(text):
+    """
+    Splits an EPD or FEN line into the position and the EPD operations, eg. bm Nf3; id "WAC.001";
+
+    Args:
+        text (str): The line.
+
+    Returns:
+        tuple: (fen, operations), operations maps each opcode to its operand without quotes.
+
+    Raises:
+        ValueError: If the line has fewer than the four position fields.
+    """
+    fields = text.split()
+    if len(fields) < 4:
+        raise ValueError(f"Invalid EPD: {text}")
+    #A FEN has the halfmove clock and move number after the four position fields, EPD has operations there.
+    count = 6 if len(fields) >= 6 and fields[4].isdigit() and fields[5].isdigit() else 4
+    operations = {}
+    for operation in " ".join(fields[count:]).split(";"):
+        opcode, _, operand = operation.strip().partition(" ")
+        if opcode:
+            operations[opcode] = operand.strip().strip('"')
+    return " ".join(fields[:count]), operations
+
+
+def analysePosition(lineNumber, text, depth, timeLimit, nodeLimit):
+    """
+    Searches one position in a worker process. The transposition table is cleared first, so the result does not
+    depend on which positions the worker searched before.
+
+    Args:
+        lineNumber (int): Line of the position in the input, 1 for the first line.
+        text (str): The EPD or FEN line.
+        depth (int): The maximum search depth.
+        timeLimit (float): Time budget in seconds or None.
+        nodeLimit (int): Node budget or None.
+
+    Returns:
+        dict: The result: line, fen, bestmove, score (centipawns for the side to move), depth, nodes and time,
+        plus id, bm and solved for EPD lines with those operations, or error if the line could not be read.
+    """
+    result = {"line": lineNumber, "fen": text}
+    engine = _worker["engine"]
+    try:
+        fen, operations = parseEpd(text)
+        result["fen"] = fen
+        engine.setBoard(fen)
+        expected = [moveToUCI(sanToMove(engine, san)) for san in operations["bm"].split()] \
+            if "bm" in operations else None
+    except (ValueError, KeyError, IndexError) as error:
+        result["error"] = str(error)
+        return result
+    if "id" in operations:
+        result["id"] = operations["id"]
+    engine.tt.clear()
+    start = time.perf_counter()
+    move = engine.bestMove(depth, timeLimit, nodeLimit)
+    elapsed = time.perf_counter() - start
+    score = engine.rootScore if engine.turn == "white" else -engine.rootScore
+    result.update({
+        "bestmove": move.getUCI() if move is not None else None,
+        "score": round(score * CENTIPAWNS),
+        "depth": engine.completedDepth,
+        "nodes": engine.nodes + engine.qNodes,
+        "time": round(elapsed, 4),
+    })
+    if expected is not None:
+        result["bm"] = expected
+        result["solved"] = result["bestmove"] in expected
+    return result
+
+
+def readCheckpoint(path):
+    """
+    Returns:
+        dict: The saved progress (inputOffset, outputOffset and line) or the start of the input if there is none.
+    """
+    if not os.path.exists(path):
+        return {"inputOffset": 0, "outputOffset": 0, "line": 0}
+    with open(path, encoding="utf-8") as file:
+        return json.load(file)
+
+
+def writeCheckpoint(path, state):
+    """
+    Saves the progress. The file is replaced in one step, so an interrupted write leaves the previous checkpoint.
+
+    Args:
+        path (str): Path of the checkpoint file.
+        state (dict): inputOffset, outputOffset and line of the last written result.
+    """
+    with open(path + ".tmp", "w", encoding="utf-8") as file:
+        json.dump(state, file)
+    os.replace(path + ".tmp", path)
+
+
+def runBatch(inPath, outPath, depth=DEFAULT_DEPTH, timeLimit=None, nodeLimit=None, workers=None, # pylint: disable=R0913,R0914,R0917
+             resume=False, backend="mailbox", hashSizeMB=TranspositionTable.DEFAULT_SIZE_MB,
+             checkpointEvery=CHECKPOINT_EVERY):
+    """
+    Analyses every position of an EPD or FEN file, one per line, and writes the results as JSON lines in input
+    order. The file is read as it is analysed and at most IN_FLIGHT_PER_WORKER positions per worker are waiting,
+    so memory use does not grow with the file. Empty lines and lines starting with # are skipped.
+    The progress is saved to outPath + CHECKPOINT_SUFFIX; with resume the run continues from it.
+
+    Args:
+        inPath (str): Path of the positions.
+        outPath (str): Path of the results.
+        depth (int): The maximum search depth per position.
+        timeLimit (float): Time budget per position in seconds or None.
+        nodeLimit (int): Node budget per position or None.
+        workers (int): Number of worker processes, defaults to the number of CPUs.
+        resume (bool): Continue from the checkpoint instead of starting over.
+        backend (str): Board representation of the engines.
+        hashSizeMB (int): Size of the transposition table of each worker in megabytes.
+        checkpointEvery (int): Results written between two checkpoints.
+
+    Returns:
+        dict: {"positions": int, "errors": int, "time": float} for the positions analysed by this run.
+    """
+    workers = workers or os.cpu_count() or 1
+    checkpoint_path = outPath + CHECKPOINT_SUFFIX
+    state = readCheckpoint(checkpoint_path) if resume else {"inputOffset": 0, "outputOffset": 0, "line": 0}
+    stats = {"positions": 0, "errors": 0, "time": 0.0}
+    start = time.perf_counter()
+    executor = ProcessPoolExecutor(workers, initializer=_initWorker, initargs=(backend, hashSizeMB))
+    pending = collections.deque()
+    with open(inPath, "rb") as source, open(outPath, "r+b" if resume and os.path.exists(outPath) else "wb") as sink:
+        #Results written after the last checkpoint are written again.
+        sink.truncate(state["outputOffset"])
+        sink.seek(state["outputOffset"])
+        source.seek(state["inputOffset"])
+
+        def writeOldest():
+            future, offset, line = pending.popleft()
+            result = future.result()
+            sink.write(json.dumps(result).encode("utf-8") + b"\n")
+            state.update({"inputOffset": offset, "outputOffset": sink.tell(), "line": line})
+            stats["positions"] += 1
+            stats["errors"] += "error" in result
+            if stats["positions"] % checkpointEvery == 0:
+                sink.flush()
+                writeCheckpoint(checkpoint_path, state)
+
+        try:
+            offset, line = state["inputOffset"], state["line"]
+            for raw in source:
+                offset += len(raw)
+                line += 1
+                text = raw.decode("utf-8", errors="replace").strip()
+                if not text or text.startswith("#"):
+                    continue
+                pending.append((executor.submit(analysePosition, line, text, depth, timeLimit, nodeLimit), offset, line))
+                if len(pending) >= workers * IN_FLIGHT_PER_WORKER:
+                    writeOldest()
+            while pending:
+                writeOldest()
+        finally:
+            executor.shutdown(cancel_futures=True)
+            sink.flush()
+            writeCheckpoint(checkpoint_path, state)
+    stats["time"] = time.perf_counter() - start
+    return stats
+
+
+def main():
+    """
+    Command line entry point, eg. python src/batch.py positions.epd --out results.jsonl --depth 5 --workers 8
+    """
+    parser = argparse.ArgumentParser(description="Analyse the positions of an EPD or FEN file.")
+    parser.add_argument("positions", help="EPD or FEN file, one position per line")
+    parser.add_argument("--out", default="results.jsonl", help="JSON lines file to write the results to")
+    parser.add_argument("--depth", type=int, default=DEFAULT_DEPTH, help="Maximum search depth per position")
+    parser.add_argument("--time", type=float, default=None, help="Time budget per position in seconds")
+    parser.add_argument("--nodes", type=int, default=None, help="Node budget per position")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes (default: CPUs)")
+    parser.add_argument("--hash", type=int, default=TranspositionTable.DEFAULT_SIZE_MB, help="Hash size per worker in MB")
+    parser.add_argument("--backend", choices=("mailbox", "bitboard"), default="mailbox",
+                        help="Board representation to search with")
+    parser.add_argument("--resume", action="store_true", help="Continue from the checkpoint of an earlier run")
+    args = parser.parse_args()
+    stats = runBatch(args.positions, args.out, args.depth, args.time, args.nodes, args.workers, args.resume,
+                     args.backend, args.hash)
+    rate = stats["positions"] / stats["time"] if stats["time"] > 0 else 0.0
+    print(f"{stats['positions']} positions, {stats['errors']} errors, {stats['time']:.1f} s ({rate:.1f} positions/s)",
+          file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
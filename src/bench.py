@@ -0,0 +1,222 @@
+import argparse
+import json
+import math
+import os
+import sys
+import time
+
+from chessengine import createEngine
+from perft import perft
+
+#Fixed benchmark positions by phase of the game. Changing them makes the stored baselines useless.
+BENCH_POSITIONS = [
+    ("opening", "initial", "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"),
+    ("opening", "italian", "r1bqkb1r/pppp1ppp/2n2n2/4p3/2B1P3/5N2/PPPP1PPP/RNBQK2R w KQkq - 4 4"),
+    ("middlegame", "kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1"),
+    ("middlegame", "closed", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10"),
+    ("endgame", "rook-pawns", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1"),
+    ("endgame", "rooks", "3r2k1/5ppp/8/8/8/8/5PPP/3R2K1 w - - 0 1"),
+    ("tactical", "position5", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8"),
+    ("tactical", "hanging-bishop", "r1b1k2r/ppppnppp/2n2q2/2b5/3NP3/2P1B3/PP3PPP/RN1QKB1R w KQkq - 0 1"),
+]
+PERFT_DEPTH = 3
+SEARCH_DEPTH = 4
+#evaluateBoard calls per position in the evaluation benchmark.
+EVALUATIONS = 2000
+#A run fails when a speed drops more than NPS_THRESHOLD or a search node count grows more than NODE_THRESHOLD,
+#both as a share of the baseline.
+NPS_THRESHOLD = 0.10
+NODE_THRESHOLD = 0.05
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_baseline.json")
+
+
+def _engineAt(fen, backend):
+    """
+    Returns:
+        ChessEngine: A new engine set to the position without printing it.
+    """
+    engine = createEngine(backend)
+    engine.verbose = False
+    engine.setBoard(fen)
+    return engine
+
+
+def benchPerft(depth=PERFT_DEPTH, backend="mailbox", repeat=1):
+    """
+    Measures move generation with perft on every benchmark position.
+
+    Args:
+        depth (int): Perft depth.
+        backend (str): Board representation of the engine.
+        repeat (int): Number of runs, the fastest one is kept.
+
+    Returns:
+        dict: {"nodes": int, "time": float, "nps": float, "positions": {name: nodes}}.
+    """
+    counts, best = {}, math.inf
+    for _ in range(repeat):
+        elapsed = 0.0
+        for _, name, fen in BENCH_POSITIONS:
+            engine = _engineAt(fen, backend)
+            start = time.perf_counter()
+            counts[name] = perft(engine, depth)
+            elapsed += time.perf_counter() - start
+        best = min(best, elapsed)
+    nodes = sum(counts.values())
+    return {"nodes": nodes, "time": best, "nps": nodes / best, "positions": counts}
+
+
+def benchEvaluation(calls=EVALUATIONS, backend="mailbox", repeat=1):
+    """
+    Measures evaluateBoard throughput on every benchmark position.
+
+    Args:
+        calls (int): evaluateBoard calls per position.
+        backend (str): Board representation of the engine.
+        repeat (int): Number of runs, the fastest one is kept.
+
+    Returns:
+        dict: {"calls": int, "time": float, "nps": float}, nps in evaluations per second.
+    """
+    engines = [_engineAt(fen, backend) for _, _, fen in BENCH_POSITIONS]
+    best = math.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for engine in engines:
+            for _ in range(calls):
+                engine.evaluateBoard()
+        best = min(best, time.perf_counter() - start)
+    total = calls * len(engines)
+    return {"calls": total, "time": best, "nps": total / best}
+
+
+def benchSearch(depth=SEARCH_DEPTH, backend="mailbox", repeat=1):
+    """
+    Measures fixed-depth bestMove on every benchmark position, each with empty transposition and pawn hash tables.
+
+    Args:
+        depth (int): Search depth.
+        backend (str): Board representation of the engine.
+        repeat (int): Number of runs, the fastest one is kept.
+
+    Returns:
+        dict: {"nodes": int, "time": float, "nps": float, "pawnHashHitRate": float,
+        "positions": {name: {"nodes": int, "move": str, "pawnHashHitRate": float}}}, nodes counting minimax and
+        quiescence nodes.
+    """
+    results, best = {}, math.inf
+    probes = hits = 0
+    for _ in range(repeat):
+        elapsed = 0.0
+        for _, name, fen in BENCH_POSITIONS:
+            engine = _engineAt(fen, backend)
+            start = time.perf_counter()
+            move = engine.bestMove(depth, timeLimit=math.inf, nodeLimit=math.inf)
+            elapsed += time.perf_counter() - start
+            results[name] = {"nodes": engine.nodes + engine.qNodes, "move": move.getUCI() if move is not None else None,
+                             "pawnHashHitRate": engine.searchStats()["pawnHashHitRate"]}
+            probes += engine.pawnHashProbes
+            hits += engine.pawnHashHits
+        best = min(best, elapsed)
+    nodes = sum(result["nodes"] for result in results.values())
+    return {"nodes": nodes, "time": best, "nps": nodes / best, "pawnHashHitRate": hits / probes if probes else 0.0,
+            "positions": results}
+
+
+def runBench(perftDepth=PERFT_DEPTH, searchDepth=SEARCH_DEPTH, backend="mailbox", repeat=1, out=sys.stdout): # pylint: disable=R0913,R0917
+    """
+    Runs the whole benchmark suite and reports it.
+
+    Args:
+        perftDepth (int): Perft depth.
+        searchDepth (int): Search depth.
+        backend (str): Board representation of the engine.
+        repeat (int): Number of runs of each benchmark, the fastest one is kept.
+        out (file): Where the report is written.
+
+    Returns:
+        dict: The results, in the format of the baseline files.
+    """
+    results = {
+        "config": {"perftDepth": perftDepth, "searchDepth": searchDepth, "backend": backend,
+                   "evaluations": EVALUATIONS, "positions": [name for _, name, _ in BENCH_POSITIONS]},
+        "perft": benchPerft(perftDepth, backend, repeat),
+        "evaluation": benchEvaluation(EVALUATIONS, backend, repeat),
+        "search": benchSearch(searchDepth, backend, repeat),
+    }
+    print(f"perft {perftDepth}: {results['perft']['nodes']} nodes, {results['perft']['nps']:.0f} NPS", file=out)
+    print(f"evaluation: {results['evaluation']['calls']} calls, {results['evaluation']['nps']:.0f} per second", file=out)
+    print(f"search {searchDepth}: {results['search']['nodes']} nodes, {results['search']['time']:.2f} s, "
+          f"{results['search']['nps']:.0f} NPS, pawn hash hit rate {results['search']['pawnHashHitRate']:.1%}",
+          file=out)
+    return results
+
+
+def compareResults(baseline, results, npsThreshold=NPS_THRESHOLD, nodeThreshold=NODE_THRESHOLD):
+    """
+    Compares a run with a baseline. Perft counts must stay the same, speeds may not drop by more than
+    npsThreshold and search node counts may not grow by more than nodeThreshold, in total or per position.
+
+    Args:
+        baseline (dict): Results of the baseline run.
+        results (dict): Results of this run.
+        npsThreshold (float): Allowed drop of a speed as a share of the baseline, None to compare node counts only,
+            eg. with a baseline stored on other hardware.
+        nodeThreshold (float): Allowed growth of a node count as a share of the baseline.
+
+    Returns:
+        list: Descriptions of the regressions, empty if there are none.
+    """
+    if baseline["config"] != results["config"]:
+        return [f"Baseline was run with {baseline['config']}, not {results['config']}"]
+    failures = []
+    if baseline["perft"]["positions"] != results["perft"]["positions"]:
+        failures.append("perft node counts changed")
+    for part in ("perft", "evaluation", "search") if npsThreshold is not None else ():
+        old, new = baseline[part]["nps"], results[part]["nps"]
+        if new < old * (1 - npsThreshold):
+            failures.append(f"{part} speed dropped {1 - new / old:.1%}: {new:.0f} < {old:.0f}")
+    searches = [("total", baseline["search"]["nodes"], results["search"]["nodes"])] + [
+        (name, result["nodes"], results["search"]["positions"][name]["nodes"])
+        for name, result in baseline["search"]["positions"].items()
+    ]
+    for name, old, new in searches:
+        if new > old * (1 + nodeThreshold):
+            failures.append(f"search nodes of {name} grew {new / old - 1:.1%}: {new} > {old}")
+    return failures
+
+
+def main():
+    """
+    Command line entry point, eg. python src/bench.py --save to store a baseline and python src/bench.py to compare
+    with it. Exits with status 1 if a regression is found.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark move generation, evaluation and search.")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON file")
+    parser.add_argument("--save", action="store_true", help="Store this run as the baseline instead of comparing")
+    parser.add_argument("--perft-depth", type=int, default=PERFT_DEPTH, help="Perft depth")
+    parser.add_argument("--depth", type=int, default=SEARCH_DEPTH, help="Search depth")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs of each benchmark, the fastest is kept")
+    parser.add_argument("--nps-threshold", type=float, default=NPS_THRESHOLD, help="Allowed speed drop, eg. 0.1")
+    parser.add_argument("--nodes-only", action="store_true", help="Compare node counts only, not speeds")
+    parser.add_argument("--node-threshold", type=float, default=NODE_THRESHOLD, help="Allowed node count growth")
+    parser.add_argument("--backend", choices=("mailbox", "bitboard"), default="mailbox",
+                        help="Board representation to benchmark")
+    args = parser.parse_args()
+    results = runBench(args.perft_depth, args.depth, args.backend, args.repeat)
+    if args.save:
+        with open(args.baseline, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return
+    with open(args.baseline, encoding="utf-8") as file:
+        baseline = json.load(file)
+    failures = compareResults(baseline, results, None if args.nodes_only else args.nps_threshold, args.node_threshold)
+    for failure in failures:
+        print(f"FAILED: {failure}")
+    if failures:
+        sys.exit(1)
+    print("No regressions")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,606 @@
+from chessengine import (
+    ALL_MOVES, CAPTURE_FLAG, CAPTURES, CASTLE_FLAG, PROMOTION_ORDER, PROMOTION_PIECES, PROMOTION_SHIFT, QUIETS,
+    ChessEngine, TranspositionTable, positionToFen
+)
+
+#Bitboards are Python ints where bit r * 8 + c stands for the square on row r and column c, the same square
+#numbering as in the encoded moves (a8 = 0, h1 = 63).
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+FULL = (1 << 64) - 1
+FILE_A = sum(1 << (r * 8) for r in range(8))
+FILE_H = FILE_A << 7
+#Rows 2 and 5 hold the pawns that have made one step from their starting rows 1 (black) and 6 (white).
+ROW_2 = 0xFF << 16
+ROW_5 = 0xFF << 40
+#Rows where white (row 0) and black (row 7) pawns promote.
+ROW_0 = 0xFF
+ROW_7 = 0xFF << 56
+#Castling rights as bits: white kingside, white queenside, black kingside, black queenside.
+WHITE_KINGSIDE, WHITE_QUEENSIDE, BLACK_KINGSIDE, BLACK_QUEENSIDE = 1, 2, 4, 8
+
+
+def _stepTable(offsets):
+    """
+    Builds a table of leaper attacks (knight, king) as bitboards.
+
+    Returns:
+        list: Attack bitboard for each square.
+    """
+    table = []
+    for square in range(64):
+        r, c = square >> 3, square & 7
+        attacks = 0
+        for dr, dc in offsets:
+            if 0 <= r + dr < 8 and 0 <= c + dc < 8:
+                attacks |= 1 << ((r + dr) * 8 + c + dc)
+        table.append(attacks)
+    return table
+
+def _rayTable(dr, dc):
+    """
+    Builds a table of rays in one direction as bitboards, not including the starting square.
+
+    Returns:
+        list: Ray bitboard for each square.
+    """
+    table = []
+    for square in range(64):
+        r, c = square >> 3, square & 7
+        ray = 0
+        for i in range(1, 8):
+            if 0 <= r + dr * i < 8 and 0 <= c + dc * i < 8:
+                ray |= 1 << ((r + dr * i) * 8 + c + dc * i)
+        table.append(ray)
+    return table
+
+KNIGHT_ATTACKS = _stepTable(((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)))
+KING_ATTACKS = _stepTable(((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)))
+#Squares attacked by a white pawn (up the board) and by a black pawn.
+WHITE_PAWN_ATTACKS = _stepTable(((-1, -1), (-1, 1)))
+BLACK_PAWN_ATTACKS = _stepTable(((1, -1), (1, 1)))
+#Rays where the blocker nearest to the square has the lowest bit index (towards h1) ...
+POSITIVE_ROOK_RAYS = (_rayTable(1, 0), _rayTable(0, 1))
+POSITIVE_BISHOP_RAYS = (_rayTable(1, 1), _rayTable(1, -1))
+#... and the highest bit index (towards a8).
+NEGATIVE_ROOK_RAYS = (_rayTable(-1, 0), _rayTable(0, -1))
+NEGATIVE_BISHOP_RAYS = (_rayTable(-1, -1), _rayTable(-1, 1))
+#Castling rights kept when a move starts or ends on the square.
+CASTLING_MASKS = [15] * 64
+CASTLING_MASKS[60] = 15 & ~(WHITE_KINGSIDE | WHITE_QUEENSIDE)
+CASTLING_MASKS[63] = 15 & ~WHITE_KINGSIDE
+CASTLING_MASKS[56] = 15 & ~WHITE_QUEENSIDE
+CASTLING_MASKS[4] = 15 & ~(BLACK_KINGSIDE | BLACK_QUEENSIDE)
+CASTLING_MASKS[7] = 15 & ~BLACK_KINGSIDE
+CASTLING_MASKS[0] = 15 & ~BLACK_QUEENSIDE
+
+
+def slidingAttacks(square, occupied, positiveRays, negativeRays):
+    """
+    Calculates the squares a sliding piece attacks, up to and including the first blocker in each direction.
+
+    Args:
+        square (int): Square of the piece.
+        occupied (int): Bitboard of all pieces.
+        positiveRays (tuple): Ray tables where the nearest blocker has the lowest bit.
+        negativeRays (tuple): Ray tables where the nearest blocker has the highest bit.
+
+    Returns:
+        int: Bitboard of the attacked squares.
+    """
+    attacks = 0
+    for rays in positiveRays:
+        ray = rays[square]
+        blockers = ray & occupied
+        if blockers:
+            ray ^= rays[(blockers & -blockers).bit_length() - 1]
+        attacks |= ray
+    for rays in negativeRays:
+        ray = rays[square]
+        blockers = ray & occupied
+        if blockers:
+            ray ^= rays[blockers.bit_length() - 1]
+        attacks |= ray
+    return attacks
+
+def rookAttacks(square, occupied):
+    """
+    Returns:
+        int: Bitboard of the squares a rook on the square attacks.
+    """
+    return slidingAttacks(square, occupied, POSITIVE_ROOK_RAYS, NEGATIVE_ROOK_RAYS)
+
+def bishopAttacks(square, occupied):
+    """
+    Returns:
+        int: Bitboard of the squares a bishop on the square attacks.
+    """
+    return slidingAttacks(square, occupied, POSITIVE_BISHOP_RAYS, NEGATIVE_BISHOP_RAYS)
+
+
+class BitboardPosition:
+    """
+    A chess position stored as bitboards: one int per piece type and colour, plus occupancy sets for both colours.
+    A 64-square list of piece letters is kept alongside for finding the piece on a square.
+    Moves use the same int encoding as ChessEngine, and the methods legalMoves, doMove and undoMove match the
+    engine's, so the perft harness works on both. Like ChessEngine, it has no en passant.
+    """
+    def __init__(self, fen=START_FEN):
+        """
+        Creates a position from a FEN string.
+
+        Args:
+            fen (str): The position, the starting position by default.
+        """
+        self.bitboards = {}
+        self.occupancy = [0, 0]
+        self.squares = [" "] * 64
+        self.whiteToMove = True
+        self.castling = 0
+        self.history = []
+        self.setFen(fen)
+
+    def clear(self):
+        """
+        Removes all pieces and the move history.
+        """
+        self.bitboards = {piece: 0 for piece in "PNBRQKpnbrqk"}
+        self.occupancy = [0, 0]
+        self.squares = [" "] * 64
+        self.history = []
+
+    def putPiece(self, piece, square):
+        """
+        Places a piece on an empty square.
+
+        Args:
+            piece (str): Piece letter, uppercase for white.
+            square (int): Square index r * 8 + c.
+        """
+        self.bitboards[piece] |= 1 << square
+        self.occupancy[0 if piece.isupper() else 1] |= 1 << square
+        self.squares[square] = piece
+
+    def setFen(self, fen):
+        """
+        Sets up the position from a FEN string. En passant and move counters are ignored.
+
+        Args:
+            fen (str): The position in FEN.
+
+        Raises:
+            ValueError: If the FEN is invalid.
+        """
+        fields = fen.split()
+        ranks = fields[0].split("/")
+        if len(ranks) != 8:
+            raise ValueError(f"Invalid FEN: {fen}")
+        self.clear()
+        for r, rank in enumerate(ranks):
+            c = 0
+            for char in rank:
+                if char.isdigit():
+                    c += int(char)
+                elif char in "PNBRQKpnbrqk" and c < 8:
+                    self.putPiece(char, r * 8 + c)
+                    c += 1
+                else:
+                    raise ValueError(f"Invalid character in FEN: {char}")
+            if c != 8:
+                raise ValueError(f"Invalid FEN: rank {r} does not have 8 squares")
+        if fields[1] not in ("w", "b"):
+            raise ValueError(f"Invalid active color: {fields[1]}")
+        self.whiteToMove = fields[1] == "w"
+        castling = fields[2] if len(fields) > 2 else "-"
+        self.castling = sum(bit for letter, bit in zip("KQkq", (1, 2, 4, 8)) if letter in castling)
+
+    def getFen(self):
+        """
+        Writes the position as a FEN string. There is no en passant square or move counters, so those fields
+        are always "- 0 1".
+
+        Returns:
+            str: The position in FEN.
+        """
+        rows = [self.squares[r * 8:r * 8 + 8] for r in range(8)]
+        return positionToFen(rows, self.whiteToMove, [self.castling & bit for bit in (1, 2, 4, 8)])
+
+    def loadBoard(self, board, turn, castlingRights):
+        """
+        Sets up the position from the state of a ChessEngine.
+
+        Args:
+            board (list): 8x8 list of piece letters.
+            turn (str): "white" or "black".
+            castlingRights (tuple): White kingside, white queenside, black kingside and black queenside rights.
+        """
+        self.clear()
+        for r, row in enumerate(board):
+            for c, piece in enumerate(row):
+                if piece != " ":
+                    self.putPiece(piece, r * 8 + c)
+        self.whiteToMove = turn == "white"
+        self.castling = sum(bit for right, bit in zip(castlingRights, (1, 2, 4, 8)) if right)
+
+    def isAttacked(self, square, byWhite):
+        """
+        Determines if a square is attacked by the pieces of one side.
+
+        Args:
+            square (int): Square index r * 8 + c.
+            byWhite (bool): True to look for white attackers, False for black ones.
+
+        Returns:
+            bool: Is True if the square is attacked.
+        """
+        bitboards = self.bitboards
+        if byWhite:
+            pawn, knight, bishop, rook, queen, king = "P", "N", "B", "R", "Q", "K"
+            pawnAttackers = BLACK_PAWN_ATTACKS[square]
+        else:
+            pawn, knight, bishop, rook, queen, king = "p", "n", "b", "r", "q", "k"
+            pawnAttackers = WHITE_PAWN_ATTACKS[square]
+        if (KNIGHT_ATTACKS[square] & bitboards[knight] or pawnAttackers & bitboards[pawn]
+                or KING_ATTACKS[square] & bitboards[king]):
+            return True
+        occupied = self.occupancy[0] | self.occupancy[1]
+        rooks = bitboards[rook] | bitboards[queen]
+        if rooks and rookAttacks(square, occupied) & rooks:
+            return True
+        bishops = bitboards[bishop] | bitboards[queen]
+        return bool(bishops and bishopAttacks(square, occupied) & bishops)
+
+    def inCheck(self):
+        """
+        Returns:
+            bool: Is True if the king of the side to move is attacked.
+        """
+        king = self.bitboards["K" if self.whiteToMove else "k"]
+        return bool(king) and self.isAttacked(king.bit_length() - 1, not self.whiteToMove)
+
+    def pseudoLegalMoves(self, kind=ALL_MOVES, fromMask=FULL): # pylint: disable=R0912,R0914,R0915
+        """
+        Generates the moves of the side to move without checking if they leave the own king in check.
+        Castling is only generated when the king does not pass through or land on an attacked square.
+
+        Args:
+            kind (int): ALL_MOVES, CAPTURES (captures and promotions) or QUIETS (the rest, castling included).
+            fromMask (int): Bitboard of the squares whose pieces are moved, all squares by default.
+
+        Returns:
+            list: The moves encoded as ints.
+        """
+        moves = []
+        bitboards = self.bitboards
+        white = self.whiteToMove
+        own = self.occupancy[0 if white else 1]
+        enemy = self.occupancy[1 if white else 0]
+        occupied = own | enemy
+        empty = ~occupied & FULL
+        prefix = "PNBRQK" if white else "pnbrqk"
+
+        #Pawns, moved as whole sets: single and double pushes, and captures to both sides.
+        pawns = bitboards[prefix[0]] & fromMask
+        if white:
+            single = (pawns >> 8) & empty
+            double = ((single & ROW_5) >> 8) & empty
+            captureWest = ((pawns & ~FILE_A) >> 9) & enemy
+            captureEast = ((pawns & ~FILE_H) >> 7) & enemy
+            steps = ((single, 8, 0), (double, 16, 0), (captureWest, 9, CAPTURE_FLAG), (captureEast, 7, CAPTURE_FLAG))
+            promotionRow, promotions = 0, ROW_0
+        else:
+            single = (pawns << 8) & empty
+            double = ((single & ROW_2) << 8) & empty
+            captureWest = ((pawns & ~FILE_A) << 7) & enemy
+            captureEast = ((pawns & ~FILE_H) << 9) & enemy
+            steps = ((single, -8, 0), (double, -16, 0), (captureWest, -7, CAPTURE_FLAG), (captureEast, -9, CAPTURE_FLAG))
+            promotionRow, promotions = 7, ROW_7
+        if kind == CAPTURES:
+            #Pushes that promote count as captures.
+            steps = ((single & promotions, steps[0][1], 0),) + steps[2:]
+        elif kind == QUIETS:
+            steps = ((single & ~promotions, steps[0][1], 0), steps[1])
+        for targets, offset, flag in steps:
+            while targets:
+                low = targets & -targets
+                targets ^= low
+                end = low.bit_length() - 1
+                move = (end + offset) | end << 6 | flag
+                if end >> 3 == promotionRow:
+                    for promotion in PROMOTION_ORDER:
+                        moves.append(move | promotion)
+                else:
+                    moves.append(move)
+
+        #Knights, bishops, rooks, queens and the king.
+        allowed = enemy if kind == CAPTURES else empty if kind == QUIETS else ~own
+        for piece in prefix[1:]:
+            pieces = bitboards[piece] & fromMask
+            while pieces:
+                low = pieces & -pieces
+                pieces ^= low
+                start = low.bit_length() - 1
+                if piece in "Nn":
+                    targets = KNIGHT_ATTACKS[start]
+                elif piece in "Bb":
+                    targets = bishopAttacks(start, occupied)
+                elif piece in "Rr":
+                    targets = rookAttacks(start, occupied)
+                elif piece in "Qq":
+                    targets = rookAttacks(start, occupied) | bishopAttacks(start, occupied)
+                else:
+                    targets = KING_ATTACKS[start]
+                targets &= allowed
+                while targets:
+                    target = targets & -targets
+                    targets ^= target
+                    end = target.bit_length() - 1
+                    moves.append(start | end << 6 | (CAPTURE_FLAG if target & enemy else 0))
+
+        #Castling, the king may not be in check or pass through an attacked square.
+        if kind == CAPTURES or not fromMask & (1 << 60 if white else 1 << 4):
+            return moves
+        if white and self.castling & (WHITE_KINGSIDE | WHITE_QUEENSIDE) and self.squares[60] == "K":
+            if (self.castling & WHITE_KINGSIDE and self.squares[63] == "R" and not occupied & (3 << 61)
+                    and not any(self.isAttacked(square, False) for square in (60, 61, 62))):
+                moves.append(60 | 62 << 6 | CASTLE_FLAG)
+            if (self.castling & WHITE_QUEENSIDE and self.squares[56] == "R" and not occupied & (7 << 57)
+                    and not any(self.isAttacked(square, False) for square in (60, 59, 58))):
+                moves.append(60 | 58 << 6 | CASTLE_FLAG)
+        elif not white and self.castling & (BLACK_KINGSIDE | BLACK_QUEENSIDE) and self.squares[4] == "k":
+            if (self.castling & BLACK_KINGSIDE and self.squares[7] == "r" and not occupied & (3 << 5)
+                    and not any(self.isAttacked(square, True) for square in (4, 5, 6))):
+                moves.append(4 | 6 << 6 | CASTLE_FLAG)
+            if (self.castling & BLACK_QUEENSIDE and self.squares[0] == "r" and not occupied & (7 << 1)
+                    and not any(self.isAttacked(square, True) for square in (4, 3, 2))):
+                moves.append(4 | 2 << 6 | CASTLE_FLAG)
+        return moves
+
+    def pinSuspects(self):
+        """
+        Finds the pieces whose moves can expose the own king. Outside check only king moves and moves of pieces
+        that a slider could pin (own pieces seen from the king) can do that, in check every move can.
+
+        Returns:
+            int: Bitboard of the pieces whose moves have to be tested, 0 without a king.
+        """
+        white = self.whiteToMove
+        kingBits = self.bitboards["K" if white else "k"]
+        if not kingBits:
+            return 0
+        kingSquare = kingBits.bit_length() - 1
+        if self.isAttacked(kingSquare, not white):
+            return FULL
+        occupied = self.occupancy[0] | self.occupancy[1]
+        return kingBits | ((rookAttacks(kingSquare, occupied) | bishopAttacks(kingSquare, occupied))
+                           & self.occupancy[0 if white else 1])
+
+    def legalMoves(self, kind=ALL_MOVES, fromMask=FULL, suspects=None):
+        """
+        Generates the legal moves of the side to move. Only the moves of the pieces from pinSuspects are made
+        and tested.
+
+        Args:
+            kind (int): ALL_MOVES, CAPTURES or QUIETS.
+            fromMask (int): Bitboard of the squares whose pieces are moved, all squares by default.
+            suspects (int): The result of pinSuspects when it is already known for the position.
+
+        Returns:
+            list: The legal moves encoded as ints.
+        """
+        legal = []
+        white = self.whiteToMove
+        king = "K" if white else "k"
+        if suspects is None:
+            suspects = self.pinSuspects()
+        for move in self.pseudoLegalMoves(kind, fromMask):
+            if not suspects >> (move & 63) & 1:
+                legal.append(move)
+                continue
+            self.doMove(move)
+            kingSquare = self.bitboards[king].bit_length() - 1
+            if not self.isAttacked(kingSquare, not white):
+                legal.append(move)
+            self.undoMove()
+        return legal
+
+    def doMove(self, move):
+        """
+        Makes an encoded move, pushing what is needed to take it back to the history.
+
+        Args:
+            move (int): The encoded move.
+        """
+        bitboards = self.bitboards
+        squares = self.squares
+        start = move & 63
+        end = (move >> 6) & 63
+        piece = squares[start]
+        captured = squares[end]
+        us = 0 if self.whiteToMove else 1
+        self.history.append((move, captured, self.castling))
+
+        startBit = 1 << start
+        endBit = 1 << end
+        if captured != " ":
+            bitboards[captured] ^= endBit
+            self.occupancy[1 - us] ^= endBit
+        promotion = (move >> PROMOTION_SHIFT) & 7
+        newPiece = piece
+        if promotion:
+            newPiece = PROMOTION_PIECES[promotion] if us == 0 else PROMOTION_PIECES[promotion].lower()
+        bitboards[piece] ^= startBit
+        bitboards[newPiece] ^= endBit
+        self.occupancy[us] ^= startBit | endBit
+        squares[start] = " "
+        squares[end] = newPiece
+
+        if move & CASTLE_FLAG:
+            rookStart, rookEnd = (end + 1, end - 1) if end & 7 == 6 else (end - 2, end + 1)
+            rook = squares[rookStart]
+            rookBits = (1 << rookStart) | (1 << rookEnd)
+            bitboards[rook] ^= rookBits
+            self.occupancy[us] ^= rookBits
+            squares[rookStart] = " "
+            squares[rookEnd] = rook
+
+        self.castling &= CASTLING_MASKS[start] & CASTLING_MASKS[end]
+        self.whiteToMove = not self.whiteToMove
+
+    def undoMove(self):
+        """
+        Takes back the last move made with doMove.
+        """
+        move, captured, self.castling = self.history.pop()
+        self.whiteToMove = not self.whiteToMove
+        bitboards = self.bitboards
+        squares = self.squares
+        start = move & 63
+        end = (move >> 6) & 63
+        us = 0 if self.whiteToMove else 1
+        newPiece = squares[end]
+        piece = newPiece
+        if move & (7 << PROMOTION_SHIFT):
+            piece = "P" if us == 0 else "p"
+        startBit = 1 << start
+        endBit = 1 << end
+        bitboards[newPiece] ^= endBit
+        bitboards[piece] ^= startBit
+        self.occupancy[us] ^= startBit | endBit
+        squares[start] = piece
+        squares[end] = captured
+        if captured != " ":
+            bitboards[captured] ^= endBit
+            self.occupancy[1 - us] ^= endBit
+
+        if move & CASTLE_FLAG:
+            rookStart, rookEnd = (end + 1, end - 1) if end & 7 == 6 else (end - 2, end + 1)
+            rook = squares[rookEnd]
+            rookBits = (1 << rookStart) | (1 << rookEnd)
+            bitboards[rook] ^= rookBits
+            self.occupancy[us] ^= rookBits
+            squares[rookEnd] = " "
+            squares[rookStart] = rook
+
+
+class BitboardEngine(ChessEngine):
+    """
+    ChessEngine that generates its moves from a BitboardPosition instead of the 8x8 list. The list board is still
+    kept up to date by doMove and undoMove, as the evaluation, move ordering and the rest of the API read it.
+    Created with createEngine("bitboard").
+    """
+    def __init__(self, hashSizeMB=TranspositionTable.DEFAULT_SIZE_MB):
+        """
+        Initializes the starting state of the game and the bitboards.
+
+        Args:
+            hashSizeMB (int): Size of the transposition table in megabytes.
+        """
+        super().__init__(hashSizeMB)
+        self.position = BitboardPosition()
+
+    def syncState(self):
+        """
+        Updates the incremental scores like ChessEngine.syncState and rebuilds the bitboards only when the list
+        board, turn or castling rights were changed directly instead of through doMove, so the history of the
+        bitboards is kept for undoMove otherwise.
+        """
+        super().syncState()
+        rights = (self.whiteCastleKingside, self.whiteCastleQueenside,
+                  self.blackCastleKingside, self.blackCastleQueenside)
+        position = self.position
+        if (position.whiteToMove != (self.turn == "white")
+                or position.castling != sum(bit for right, bit in zip(rights, (1, 2, 4, 8)) if right)
+                or position.squares != [piece for row in self.board for piece in row]):
+            position.loadBoard(self.board, self.turn, rights)
+
+    def setBoard(self, fen):
+        """
+        Sets the board position and the bitboards based on the provided FEN string.
+
+        Args:
+            fen (str): The FEN string representing the board position.
+        """
+        super().setBoard(fen)
+        self.position.setFen(fen)
+
+    def resetBoard(self):
+        """
+        Resets board, bitboards and game state to the starting position.
+        """
+        super().resetBoard()
+        self.position.setFen(START_FEN)
+
+    def legalMoves(self):
+        """
+        Generates all legal moves for the current player from the bitboards.
+
+        Returns:
+            list: The legal moves encoded as ints.
+        """
+        moves = self.position.legalMoves()
+        self.check = self.position.inCheck() # pylint: disable=W0201
+        return moves
+
+    def checkAndPins(self):
+        """
+        Finds from the bitboards if the player in turn is in check and which pieces may be pinned.
+
+        Returns:
+            tuple: (is_in_check, suspects), suspects being the bitboard from BitboardPosition.pinSuspects.
+        """
+        suspects = self.position.pinSuspects()
+        #In check every piece is a suspect.
+        return suspects == FULL, suspects
+
+    def pieceMovesFrom(self, square, kind, pins):
+        """
+        Generates the legal moves of one kind from the bitboards for stagedMoves, when the player in turn is not in
+        check. The search of earlier moves changes self.check, so it is set back for terminalScore.
+
+        Args:
+            square (int): Square of the piece to generate the moves of, None for all pieces.
+            kind (int): ALL_MOVES, CAPTURES or QUIETS.
+            pins (int): The pin suspects of the position from checkAndPins.
+
+        Returns:
+            list: The moves encoded as ints.
+        """
+        self.check = False # pylint: disable=W0201
+        return self.position.legalMoves(kind, FULL if square is None else 1 << square, pins)
+
+    def doMove(self, move):
+        """
+        Executes an encoded move on both the list board and the bitboards.
+
+        Args:
+            move (int): The encoded move to execute.
+        """
+        super().doMove(move)
+        self.position.doMove(move)
+
+    def doNullMove(self):
+        """
+        Passes the turn on both the list board and the bitboards.
+        """
+        super().doNullMove()
+        self.position.whiteToMove = not self.position.whiteToMove
+
+    def undoNullMove(self):
+        """
+        Takes back a pass on both the list board and the bitboards.
+        """
+        super().undoNullMove()
+        self.position.whiteToMove = not self.position.whiteToMove
+
+    def undoMove(self):
+        """
+        Undos the last made move on both the list board and the bitboards.
+        """
+        if not self.moves:
+            return
+        super().undoMove()
+        if self.position.history:
+            self.position.undoMove()
+        else:
+            #The bitboards were rebuilt after this move was made, so they are rebuilt again.
+            self.syncState()
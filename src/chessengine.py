@@ -1,6 +1,477 @@
+import math
+import multiprocessing
+import os
+import threading
 import time
 import random
 
+#Random keys for Zobrist hashing. A position key is the XOR of the keys of every piece on its square,
+#the side to move and each castling right that is still available. The generator is seeded so that
+#keys stay the same between runs.
+_zobrist_random = random.Random(20250417)
+ZOBRIST_PIECES = {piece: [_zobrist_random.getrandbits(64) for _ in range(64)] for piece in "PNBRQKpnbrqk"}
+ZOBRIST_BLACK_TO_MOVE = _zobrist_random.getrandbits(64)
+#Keys for white kingside, white queenside, black kingside and black queenside castling rights.
+ZOBRIST_CASTLING = tuple(_zobrist_random.getrandbits(64) for _ in range(4))
+
+
+def _leaperTargets(offsets):
+    """
+    Builds a table of the squares reached from every square with the given (row, col) steps.
+
+    Returns:
+        list: For each square index r * 8 + c, a tuple of the (row, col) squares that are on the board.
+    """
+    return [
+        tuple((r + dr, c + dc) for dr, dc in offsets if 0 <= r + dr < 8 and 0 <= c + dc < 8)
+        for r in range(8) for c in range(8)
+    ]
+
+def _slidingRays(directions):
+    """
+    Builds a table of the rays going out from every square in the given directions.
+
+    Returns:
+        list: For each square index r * 8 + c, a tuple of non-empty rays ordered from the nearest square outwards.
+    """
+    table = []
+    for r in range(8):
+        for c in range(8):
+            rays = []
+            for dr, dc in directions:
+                ray = tuple((r + dr * i, c + dc * i) for i in range(1, 8)
+                            if 0 <= r + dr * i < 8 and 0 <= c + dc * i < 8)
+                if ray:
+                    rays.append(ray)
+            table.append(tuple(rays))
+    return table
+
+#Precomputed attack tables indexed by square r * 8 + c.
+KNIGHT_ATTACKS = _leaperTargets(((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)))
+KING_ATTACKS = _leaperTargets(((-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)))
+#Squares a white pawn attacking the square could stand on (one row below) and the same for a black pawn.
+WHITE_PAWN_ATTACKERS = _leaperTargets(((1, -1), (1, 1)))
+BLACK_PAWN_ATTACKERS = _leaperTargets(((-1, -1), (-1, 1)))
+ROOK_RAYS = _slidingRays(((-1, 0), (0, -1), (1, 0), (0, 1)))
+BISHOP_RAYS = _slidingRays(((-1, -1), (-1, 1), (1, -1), (1, 1)))
+
+def _betweenSquares():
+    """
+    Builds a table of the squares strictly between two squares on the same row, column or diagonal.
+
+    Returns:
+        list: BETWEEN[a][b] is a tuple of the square indices between a and b, empty if they are not on a line.
+    """
+    table = [[() for _ in range(64)] for _ in range(64)]
+    for square in range(64):
+        for ray in ROOK_RAYS[square] + BISHOP_RAYS[square]:
+            for i, (r, c) in enumerate(ray):
+                table[square][r * 8 + c] = tuple(tr * 8 + tc for tr, tc in ray[:i])
+    return table
+
+BETWEEN = _betweenSquares()
+
+#Inside the search moves are plain ints instead of Move objects. Bits 0-5 hold the start square and bits 6-11
+#the end square (r * 8 + c), bits 12-14 the promotion piece and the bits above them the flags below.
+PROMOTION_SHIFT = 12
+PROMOTION_MASK = 7 << PROMOTION_SHIFT
+#Promotion pieces by their code in a move, 0 means no promotion.
+PROMOTION_PIECES = ("", "N", "B", "R", "Q")
+#Promotions in the order pawn moves are generated: queen, rook, knight, bishop.
+PROMOTION_ORDER = (4 << PROMOTION_SHIFT, 3 << PROMOTION_SHIFT, 1 << PROMOTION_SHIFT, 2 << PROMOTION_SHIFT)
+CASTLE_FLAG = 1 << 15
+CAPTURE_FLAG = 1 << 16
+
+#Kinds of moves the piece move generators produce: all moves, only captures and promotions, or only the rest.
+ALL_MOVES = 0
+CAPTURES = 1
+QUIETS = 2
+
+#Methods timed by ChessEngine.setProfiling, by search phase.
+SEARCH_PHASES = {
+    "moveGeneration": ("legalMoves", "pieceMovesFrom"),
+    "makeUndo": ("doMove", "undoMove"),
+    "evaluation": ("staticEvaluation",),
+}
+#Longest principal variation read from the transposition table.
+MAX_PV_LENGTH = 32
+
+def _timedMethod(method, phaseTimes, phase):
+    """
+    Wraps a bound method so that the time spent in it is added to phaseTimes[phase].
+
+    Returns:
+        function: The wrapped method.
+    """
+    def timed(*args):
+        start = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            phaseTimes[phase] += time.perf_counter() - start
+    return timed
+
+def moveToUCI(move):
+    """
+    Converts an encoded move to UCI notation.
+
+    Args:
+        move (int): The encoded move.
+
+    Returns:
+        str: The move in UCI format.
+    """
+    start = move & 63
+    end = (move >> 6) & 63
+    uci = "abcdefgh"[start & 7] + str(8 - (start >> 3)) + "abcdefgh"[end & 7] + str(8 - (end >> 3))
+    promotion = (move >> PROMOTION_SHIFT) & 7
+    if promotion:
+        uci += PROMOTION_PIECES[promotion].lower()
+    return uci
+
+
+def positionToFen(rows, whiteToMove, castlingRights):
+    """
+    Writes a position as a FEN string. En passant is not implemented and move counters are not tracked,
+    so those fields are always "- 0 1".
+
+    Args:
+        rows (list): Eight rows of eight piece letters, " " for an empty square.
+        whiteToMove (bool): True if it is white's turn.
+        castlingRights (tuple): White kingside, white queenside, black kingside and black queenside rights.
+
+    Returns:
+        str: The position in FEN.
+    """
+    ranks = []
+    for row in rows:
+        rank = ""
+        empty = 0
+        for piece in row:
+            if piece == " ":
+                empty += 1
+                continue
+            if empty:
+                rank += str(empty)
+                empty = 0
+            rank += piece
+        ranks.append(rank + (str(empty) if empty else ""))
+    castling = "".join(letter for letter, right in zip("KQkq", castlingRights) if right) or "-"
+    return f"{'/'.join(ranks)} {'w' if whiteToMove else 'b'} {castling} - 0 1"
+
+
+class SearchTimeout(Exception):
+    """Raised inside the search when the time or node budget of the move runs out."""
+
+
+class TranspositionTable:
+    """
+    A fixed-size table of earlier search results indexed by the Zobrist key of the position.
+    Each slot holds one entry (key, depth, flag, score, move, age). The flag tells if the score is exact or
+    only a lower or upper bound of the real value. When two positions map to the same slot, the entry
+    searched deeper is kept, unless it is left over from an earlier search.
+    """
+    EXACT = 0
+    LOWERBOUND = 1
+    UPPERBOUND = 2
+    #Approximate memory used by one entry in CPython (list slot, tuple and its contents).
+    ENTRY_BYTES = 128
+    DEFAULT_SIZE_MB = 16
+
+    def __init__(self, sizeMB=DEFAULT_SIZE_MB):
+        """
+        Creates an empty table.
+
+        Args:
+            sizeMB (int): Approximate memory limit of the table in megabytes.
+        """
+        self.size = 0
+        self.entries = []
+        self.age = 0
+        self.resize(sizeMB)
+
+    def resize(self, sizeMB):
+        """
+        Changes the size of the table. All stored entries are lost.
+
+        Args:
+            sizeMB (int): Approximate memory limit of the table in megabytes.
+        """
+        self.size = max(1, int(sizeMB * 1024 * 1024) // self.ENTRY_BYTES)
+        self.clear()
+
+    def clear(self):
+        """
+        Removes all entries from the table.
+        """
+        self.entries = [None] * self.size
+        self.age = 0
+
+    def newSearch(self):
+        """
+        Marks the start of a new search, so entries of earlier searches can be replaced first.
+        """
+        self.age += 1
+
+    def probe(self, key):
+        """
+        Looks up the entry of a position.
+
+        Args:
+            key (int): Zobrist key of the position.
+
+        Returns:
+            tuple: (key, depth, flag, score, move, age) or None if the position is not in the table.
+        """
+        entry = self.entries[key % self.size]
+        if entry is not None and entry[0] == key:
+            return entry
+        return None
+
+    def store(self, key, depth, flag, score, move):
+        """
+        Stores a search result using depth-preferred replacement.
+
+        Args:
+            key (int): Zobrist key of the position.
+            depth (int): The depth the position was searched to.
+            flag (int): EXACT, LOWERBOUND or UPPERBOUND.
+            score (float): The score found by the search.
+            move (int): The best move found as an encoded move or None.
+        """
+        index = key % self.size
+        old = self.entries[index]
+        if old is None or old[0] == key or old[5] != self.age or depth >= old[1]:
+            if move is None and old is not None and old[0] == key:
+                move = old[4]
+            self.entries[index] = (key, depth, flag, score, move, self.age)
+
+
+class PawnHashTable:
+    """
+    A fixed-size table of pawn structure evaluations indexed by the pawn key, the Zobrist key of the pawns alone.
+    The pawns change only when a pawn moves or is captured, so nearly every evaluation in a search is found here.
+    The entries depend on nothing but the pawns, so they never go out of date. Nearly all misses are pawn
+    structures seen for the first time, so a bigger table only helps long searches with a big hash.
+    """
+    DEFAULT_SIZE = 1 << 14
+    #ChessEngine.setHashSize gives the table one entry per this many transposition table entries,
+    #but no fewer than DEFAULT_SIZE.
+    TT_ENTRIES_PER_ENTRY = 8
+
+    def __init__(self, size=DEFAULT_SIZE):
+        """
+        Creates an empty table.
+
+        Args:
+            size (int): Number of entries.
+        """
+        self.size = size
+        self.entries = [None] * size
+
+    def resize(self, size):
+        """
+        Changes the size of the table. All stored entries are lost.
+
+        Args:
+            size (int): Number of entries.
+        """
+        self.size = size
+        self.clear()
+
+    def clear(self):
+        """
+        Removes all entries from the table.
+        """
+        self.entries = [None] * self.size
+
+    def probe(self, key):
+        """
+        Looks up the evaluation of a pawn structure.
+
+        Args:
+            key (int): Pawn key of the position.
+
+        Returns:
+            tuple: The evaluation stored by ChessEngine.evaluatePawns or None if it is not in the table.
+        """
+        entry = self.entries[key % self.size]
+        if entry is not None and entry[0] == key:
+            return entry[1]
+        return None
+
+    def store(self, key, evaluation):
+        """
+        Stores the evaluation of a pawn structure, replacing whatever was in its slot.
+
+        Args:
+            key (int): Pawn key of the position.
+            evaluation (tuple): The evaluation from ChessEngine.evaluatePawns.
+        """
+        self.entries[key % self.size] = (key, evaluation)
+
+
+class MoveOrdering:
+    """
+    Orders moves before the search loop, so that alpha-beta pruning finds its cutoffs early. The order is: the move
+    from the transposition table, promotions, captures by MVV-LVA (most valuable victim, least valuable attacker),
+    the two killer moves of the ply and finally quiet moves by their history score. ChessEngine.stagedMoves
+    uses the same scores stage by stage, and searches captures that give up material after the quiet moves.
+    Killers and history are kept between iterations and searches and cleared between games.
+    """
+    MAX_PLY = 64
+    HASH_MOVE_SCORE = 10000000
+    PROMOTION_SCORE = 9000000
+    CAPTURE_SCORE = 8000000
+    KILLER_SCORES = (7000000, 6999999)
+    #History scores are halved when they grow this big, so they stay below the killer scores.
+    HISTORY_LIMIT = 1000000
+    #Piece ranks for MVV-LVA, the victim rank is worth more than any attacker rank.
+    PIECE_RANKS = {"P": 1, "N": 2, "B": 3, "R": 4, "Q": 5, "K": 6}
+
+    def __init__(self):
+        """
+        Creates empty killer and history tables.
+        """
+        self.killers = []
+        self.history = []
+        self.clear()
+
+    def clear(self):
+        """
+        Empties the killer and history tables, used when a new game starts.
+        """
+        self.killers = [[None, None] for _ in range(self.MAX_PLY)]
+        #Butterfly table indexed by the from and to squares of the move (its lowest 12 bits).
+        self.history = [0] * 4096
+
+    def scoreMove(self, move, board, ply, hashMove=None):
+        """
+        Gives a move its ordering score, bigger scores are searched first.
+
+        Args:
+            move (int): The encoded move to score.
+            board (list): The board the move is made on.
+            ply (int): Distance from the root of the search.
+            hashMove (int): Best move stored in the transposition table or None.
+
+        Returns:
+            int: The ordering score of the move.
+        """
+        if move == hashMove:
+            return self.HASH_MOVE_SCORE
+        if move & (CAPTURE_FLAG | PROMOTION_MASK):
+            return self.captureScore(move, board)
+        if ply < self.MAX_PLY:
+            killers = self.killers[ply]
+            if move == killers[0]:
+                return self.KILLER_SCORES[0]
+            if move == killers[1]:
+                return self.KILLER_SCORES[1]
+        return self.history[move & 4095]
+
+    def captureScore(self, move, board):
+        """
+        Gives a promotion or capture its ordering score.
+
+        Args:
+            move (int): An encoded promotion or capture.
+            board (list): The board the move is made on.
+
+        Returns:
+            int: The ordering score of the move.
+        """
+        promotion = (move >> PROMOTION_SHIFT) & 7
+        if promotion:
+            return self.PROMOTION_SCORE + self.PIECE_RANKS[PROMOTION_PIECES[promotion]]
+        start = move & 63
+        end = (move >> 6) & 63
+        return (self.CAPTURE_SCORE + self.PIECE_RANKS[board[end >> 3][end & 7].upper()] * 10
+                - self.PIECE_RANKS[board[start >> 3][start & 7].upper()])
+
+    def orderMoves(self, moves, board, ply, hashMove=None):
+        """
+        Sorts moves in place from the most to the least promising.
+
+        Args:
+            moves (list): The encoded moves to sort.
+            board (list): The board the moves are made on.
+            ply (int): Distance from the root of the search.
+            hashMove (int): Best move stored in the transposition table or None.
+
+        Returns:
+            list: The sorted moves.
+        """
+        moves.sort(key=lambda move: self.scoreMove(move, board, ply, hashMove), reverse=True)
+        return moves
+
+    def orderCaptures(self, moves, board):
+        """
+        Sorts promotions and captures in place for the quiescence search.
+
+        Args:
+            moves (list): Encoded promotions and captures to sort.
+            board (list): The board the moves are made on.
+
+        Returns:
+            list: The sorted moves.
+        """
+        moves.sort(key=lambda move: self.captureScore(move, board), reverse=True)
+        return moves
+
+    def splitCaptures(self, moves, board, losesMaterial):
+        """
+        Separates promotions and captures that win or keep material from the ones that lose it by static exchange
+        evaluation, and sorts both by their ordering score.
+
+        Args:
+            moves (list): Encoded promotions and captures.
+            board (list): The board the moves are made on.
+            losesMaterial (callable): Tells if a move loses material, ChessEngine.losesMaterial.
+
+        Returns:
+            tuple: (winning, losing) lists of moves.
+        """
+        winning, losing = [], []
+        for move in moves:
+            (losing if losesMaterial(move) else winning).append(move)
+        return self.orderCaptures(winning, board), self.orderCaptures(losing, board)
+
+    def orderQuiets(self, moves):
+        """
+        Sorts quiet moves in place by their history score.
+
+        Args:
+            moves (list): Encoded quiet moves.
+
+        Returns:
+            list: The sorted moves.
+        """
+        moves.sort(key=lambda move: self.history[move & 4095], reverse=True)
+        return moves
+
+    def addCutoff(self, move, ply, depth):
+        """
+        Records a quiet move that caused a beta cutoff as a killer of the ply and raises its history score.
+        Captures and promotions are already ordered first, so they are not recorded.
+
+        Args:
+            move (int): The encoded move that caused the cutoff.
+            ply (int): Distance from the root of the search.
+            depth (int): Remaining depth of the node, deeper cutoffs weigh more.
+        """
+        if move & (CAPTURE_FLAG | PROMOTION_MASK):
+            return
+        if ply < self.MAX_PLY:
+            killers = self.killers[ply]
+            if move != killers[0]:
+                killers[1] = killers[0]
+                killers[0] = move
+        index = move & 4095
+        self.history[index] += depth * depth
+        if self.history[index] > self.HISTORY_LIMIT:
+            self.history = [value // 2 for value in self.history]
+
 class ChessEngine: # pylint: disable=C0302
     """
     A chess engine that manages the game state, evaluates positions, and computes moves using a minimax algorithm with alpha-beta pruning.
@@ -8,13 +479,46 @@ class ChessEngine: # pylint: disable=C0302
     It supports move generation, validation, castling, pawn promotion, and basic AI move selection.
     No en passant implementation is in the code.
     """
-    def __init__(self):
+    PIECE_VALUES = {"P": 1, "N": 3, "B": 3, "R": 5, "Q": 9, "K": 0}
+    #Pawn structure terms in pawns, see evaluatePawns. The passed pawn bonus is indexed by the rows the pawn has
+    #advanced, the shield bonus by the distance of the shield pawn from the king's row.
+    PASSED_PAWN_BONUS = (0, 0.05, 0.1, 0.2, 0.35, 0.6)
+    ISOLATED_PAWN_PENALTY = 0.15
+    DOUBLED_PAWN_PENALTY = 0.15
+    BACKWARD_PAWN_PENALTY = 0.1
+    SHIELD_BONUS = (0.1, 0.05)
+    #Values for the static exchange evaluation, where the king may only capture last.
+    SEE_VALUES = {"P": 1, "N": 3, "B": 3, "R": 5, "Q": 9, "K": 100}
+    #Captures that cannot bring the score this close to alpha are skipped in the quiescence search.
+    DELTA_MARGIN = 2
+    #Maximum number of captures searched after the depth of minimax is used up.
+    MAX_QUIESCENCE_PLY = 8
+    #Width of the zero window of the principal variation search. Scores are in pawns, so any real difference is larger.
+    PVS_WINDOW = 1e-6
+    #Null-move pruning is tried from this remaining depth, and with one more ply of reduction above NULL_MOVE_DEEP_DEPTH.
+    NULL_MOVE_MIN_DEPTH = 3
+    NULL_MOVE_DEEP_DEPTH = 6
+    #Iterations from ASPIRATION_MIN_DEPTH on search the root with an aspiration window, see aspirationSearch.
+    #A window that fails is made ASPIRATION_GROWTH times wider on that side, and unbounded past ASPIRATION_MAX_WINDOW.
+    ASPIRATION_MIN_DEPTH = 5
+    ASPIRATION_GROWTH = 4
+    ASPIRATION_MAX_WINDOW = 4
+    #Razoring and futility pruning are used at the last FRONTIER_DEPTH plies, with margins in pawns by remaining
+    #depth. A quiet move changes the piece-square score by about a pawn at most.
+    FRONTIER_DEPTH = 2
+    FUTILITY_MARGINS = (0, 1.25, 3)
+    RAZOR_MARGINS = (0, 2, 4)
+
+    def __init__(self, hashSizeMB=TranspositionTable.DEFAULT_SIZE_MB): # pylint: disable=R0915
         """
         This function initializes the starting state of the game by setting the starting position, king locations, castling rights,
         initializing moves, pins and checks lists.
+
+        Args:
+            hashSizeMB (int): Size of the transposition table in megabytes.
         """
         self.board = ChessEngine.initialize()
-        #Tracks all moves made during a game for the undo function.
+        #Tracks all moves made during a game, encoded as ints.
         self.moves = []
         #Current player turn, set as white for the start.
         self.turn = "white"
@@ -41,6 +545,69 @@ class ChessEngine: # pylint: disable=C0302
         self.whiteCastleQueenside = True
         self.blackCastleKingside = True
         self.blackCastleQueenside = True
+        #Zobrist key of the current position and of its pawns only.
+        self.zobristKey = self.calculateHash()
+        self.pawnKey = self.calculatePawnKey()
+        #State that a move cannot restore by itself, saved for the undo function: captured piece,
+        #castling rights, Zobrist keys and material score before the move.
+        self.undoStack = []
+        #Results of earlier searches.
+        self.tt = TranspositionTable(hashSizeMB)
+        #Pawn structure evaluations, see pawnScore.
+        self.pawnTable = PawnHashTable()
+        #Killer moves and history scores for ordering moves in the search.
+        self.ordering = MoveOrdering()
+        #Default time (seconds) and node budgets per move, None means no limit.
+        self.moveTime = None
+        self.nodeBudget = None
+        #Search state used by the iterative deepening driver.
+        self.nodes = 0
+        self.qNodes = 0
+        #Moves generated and moves searched by minimax, see stagedMoves.
+        self.generatedMoves = 0
+        self.searchedMoves = 0
+        self.nodeLimit = None
+        self.deadline = None
+        self.stopSearch = False
+        #Optional shared flag (e.g. multiprocessing.RawValue) that stops the search when its value is set,
+        #used to stop searches running in other processes.
+        self.stopFlag = None
+        #Optional callable (depth, alpha, beta, moves) -> {move: score} called at the root after the first move is
+        #searched, which may search the other root moves elsewhere with the root's zero window (see parallel.py).
+        self.rootSplit = None
+        self.completedDepth = 0
+        #Score and encoded move of the best move found by the last completed iteration.
+        self.rootScore = 0
+        self.rootMove = None
+        #Opening book (book.OpeningBook) that bestMove plays from while the position is in it, None for no book.
+        self.book = None
+        #Search options, see negamax. Late move reductions reduce quiet moves after the first lmrMinMoves
+        #from lmrMinDepth on.
+        self.nullMove = True
+        self.nullMoveReduction = 2
+        self.lateMoveReductions = True
+        self.lmrMinDepth = 3
+        self.lmrMinMoves = 3
+        #Frontier node pruning, see frontierPruning.
+        self.futilityPruning = True
+        self.razoring = True
+        #Half width of the first aspiration window in pawns, 0 searches every iteration with the full window.
+        self.aspirationWindow = 0.5
+        #Search statistics, see searchStats. The counters are always kept, the phase timers only while profiling.
+        self.ttHits = 0
+        self.cutoffs = 0
+        self.firstMoveCutoffs = 0
+        self.nullMoveCutoffs = self.lmrReductions = self.lmrResearches = self.pvsResearches = 0
+        self.aspirationFailLows = self.aspirationFailHighs = 0
+        self.seePrunes = 0
+        self.futilityPrunes = self.razorCuts = 0
+        self.pawnHashProbes = self.pawnHashHits = 0
+        self.iterationNodes = []
+        self.searchTime = 0.0
+        self.profiling = False
+        self.phaseTimes = dict.fromkeys(SEARCH_PHASES, 0.0)
+        #Called with searchStats() after every completed iteration of bestMove, eg. to send UCI info lines.
+        self.infoCallback = None
 
         #Preferred board position mappings for different pieces eg. pawn is best on the penultimate row since on next move it can promote,
         # queen is best in the middle since it has more possible moves.
@@ -165,6 +732,30 @@ class ChessEngine: # pylint: disable=C0302
             -0.3,-0.3, 0, 0, 0, 0,-0.3,-0.3,
             -0.5,-0.3,-0.3,-0.3,-0.3,-0.3,-0.3,-0.5
         ]
+        #The preferred coordinates by piece letter, with black values negated so that every table adds to
+        #white's point of view.
+        self.pieceSquareTables = {
+            "P": self.white_pawn_preferred_coordinates,
+            "N": self.white_knight_preferred_coordinates,
+            "B": self.white_bishop_preferred_coordinates,
+            "R": self.white_rook_preferred_coordinates,
+            "Q": self.white_queen_preferred_coordinates,
+            "K": self.white_king_preferred_coordinates,
+            "p": [-value for value in self.black_pawn_preferred_coordinates],
+            "n": [-value for value in self.black_knight_preferred_coordinates],
+            "b": [-value for value in self.black_bishop_preferred_coordinates],
+            "r": [-value for value in self.black_rook_preferred_coordinates],
+            "q": [-value for value in self.black_queen_preferred_coordinates],
+            "k": [-value for value in self.black_king_preferred_coordinates]
+        }
+        #Positional part of the evaluation, kept up to date by doMove and undoMove like the material score.
+        self.positionalScore = self.calculatePositionalScore()
+        #The board list the incremental scores and key were calculated for, see syncState.
+        self.syncedBoard = self.board
+        #When True, every move and undo checks the incremental scores and key against a full recalculation.
+        self.debug = False
+        #When False, setBoard, resetBoard and handleMove do not print, so the output can be used for a protocol.
+        self.verbose = True
 
 
     @staticmethod
@@ -212,10 +803,114 @@ class ChessEngine: # pylint: disable=C0302
 
         return score
 
-    def makeMove(self, move): # pylint: disable=R0915
+    def calculatePositionalScore(self):
+        """
+        Calculates the positional score from scratch by adding up the piece-square table values of all pieces.
+        doMove and undoMove keep the score up to date incrementally, so this is only needed when a new position is set up.
+
+        Returns:
+            float: positive values mean white pieces stand on better squares.
+        """
+        score = 0
+        for r, row in enumerate(self.board):
+            for c, piece in enumerate(row):
+                if piece != " ":
+                    score += self.pieceSquareTables[piece][r * 8 + c]
+        return score
+
+    def syncState(self):
+        """
+        Recalculates the material score, positional score and Zobrist key if self.board has been replaced with
+        a new list directly instead of through setBoard or doMove.
+        """
+        if self.board is not self.syncedBoard:
+            self.syncedBoard = self.board
+            self.score = self.calculateScore()
+            self.positionalScore = self.calculatePositionalScore()
+            self.zobristKey = self.calculateHash()
+            self.pawnKey = self.calculatePawnKey()
+
+    def checkIncrementalState(self):
+        """
+        Compares the incrementally updated material score, positional score and Zobrist keys to a full recalculation.
+        Used in debug mode.
+
+        Raises:
+            AssertionError: If any of them differs from the recalculated value.
+        """
+        if self.score != self.calculateScore():
+            raise AssertionError(f"Material score {self.score} does not match the board")
+        positional = self.calculatePositionalScore()
+        if abs(self.positionalScore - positional) > 1e-6:
+            raise AssertionError(f"Positional score {self.positionalScore} does not match the board ({positional})")
+        if self.zobristKey != self.calculateHash():
+            raise AssertionError("Zobrist key does not match the board")
+        if self.pawnKey != self.calculatePawnKey():
+            raise AssertionError("Pawn key does not match the board")
+
+    def castlingHash(self):
+        """
+        Calculates the part of the Zobrist key that comes from the castling rights.
+
+        Returns:
+            int: XOR of the keys of the castling rights that are still available.
+        """
+        key = 0
+        if self.whiteCastleKingside:
+            key ^= ZOBRIST_CASTLING[0]
+        if self.whiteCastleQueenside:
+            key ^= ZOBRIST_CASTLING[1]
+        if self.blackCastleKingside:
+            key ^= ZOBRIST_CASTLING[2]
+        if self.blackCastleQueenside:
+            key ^= ZOBRIST_CASTLING[3]
+        return key
+
+    def calculateHash(self):
+        """
+        Calculates the Zobrist key of the current position from scratch. doMove and undoMove keep the key
+        up to date incrementally, so this is only needed when a new position is set up.
+
+        Returns:
+            int: The 64-bit Zobrist key of the position.
+        """
+        key = self.castlingHash()
+        if self.turn == "black":
+            key ^= ZOBRIST_BLACK_TO_MOVE
+        for r, row in enumerate(self.board):
+            for c, piece in enumerate(row):
+                if piece != " ":
+                    key ^= ZOBRIST_PIECES[piece][r * 8 + c]
+        return key
+
+    def calculatePawnKey(self):
+        """
+        Calculates the pawn key, the Zobrist key of the pawns alone, from scratch. doMove and undoMove keep it
+        up to date incrementally.
+
+        Returns:
+            int: XOR of the keys of the pawns on their squares.
+        """
+        key = 0
+        for r, row in enumerate(self.board):
+            for c, piece in enumerate(row):
+                if piece in ("P", "p"):
+                    key ^= ZOBRIST_PIECES[piece][r * 8 + c]
+        return key
+
+    def setHashSize(self, sizeMB):
+        """
+        Resizes the transposition table and the pawn hash table with it, clearing their contents.
+
+        Args:
+            sizeMB (int): Size of the transposition table in megabytes.
+        """
+        self.tt.resize(sizeMB)
+        self.pawnTable.resize(max(PawnHashTable.DEFAULT_SIZE, self.tt.size // PawnHashTable.TT_ENTRIES_PER_ENTRY))
+
+    def makeMove(self, move):
         """
-        Executes a move, updates the game state including castling rights and material score based on the
-        move received.
+        Executes a move given as a Move object, updates the game state including castling rights and material score.
 
         Args:
             move (Move): The move to execute, containing start/end positions, piece moved, and optional promotion.
@@ -223,75 +918,90 @@ class ChessEngine: # pylint: disable=C0302
         Returns:
             str: The move in UCI notation (e.g., 'e2e4').
         """
-        captured_value = 0
-        move.whiteCastleKingside = self.whiteCastleKingside
-        move.whiteCastleQueenside = self.whiteCastleQueenside
-        move.blackCastleKingside = self.blackCastleKingside
-        move.blackCastleQueenside = self.blackCastleQueenside
-        if move.pieceCaptured != " ":
-            captured_value = {"p": 1, "n": 3, "b": 3, "r": 5, "q": 9, "k": 0}.get(move.pieceCaptured.lower(), 0)
-            self.score += captured_value if self.turn == "white" else -captured_value
-            if move.pieceCaptured.lower() == "r":
-                if move.pieceCaptured.lower():
-                    if (move.endRow, move.endCol) == (0, 0):
-                        self.blackCastleQueenside = False
-                    elif (move.endRow, move.endCol) == (0, 7):
-                        self.blackCastleKingside = False
-                else:
-                    if (move.endRow, move.endCol) == (7, 0):
-                        self.whiteCastleQueenside = False
-                    elif (move.endRow, move.endCol) == (7, 7):
-                        self.whiteCastleKingside = False
-
-        if move.promotionChoice:
-            promotion_value = {"q": 9, "r": 5, "n": 3, "b": 3}.get(move.promotionChoice.lower(), 0)
-            pawn_value = 1
-            if self.turn == "white":
-                self.score += (promotion_value - pawn_value)
-            else:
-                self.score -= (promotion_value - pawn_value)
-
-        self.board[move.startRow][move.startCol] = " "
-        self.board[move.endRow][move.endCol] = move.promotionChoice if move.promotionChoice else move.pieceMoved
-        self.moves.append(move)
-        self.turn = "black" if self.turn == "white" else "white"
+        self.syncState()
+        self.doMove(move.encode())
+        return move.getUCI()
 
-        if move.isCastle:
-            self.board[move.rookStart[0]][move.rookStart[1]] = " "
-            self.board[move.rookEnd[0]][move.rookEnd[1]] = move.rookMoved
-            if move.pieceMoved == "K":
-                self.whiteCastleKingside = False
-                self.whiteCastleQueenside = False
-            else:
-                self.blackCastleKingside = False
-                self.blackCastleQueenside = False
+    def doMove(self, move): # pylint: disable=R0915
+        """
+        Executes an encoded move and updates the game state: board, turn, king locations, castling rights, material score
+        and Zobrist keys. The state that cannot be worked out from the move is pushed to the undo stack.
 
-        if move.pieceMoved.upper() == "K":
-            if move.pieceMoved.isupper():
-                self.wKingLocation = (move.endRow, move.endCol)
-            else:
-                self.bKingLocation = (move.endRow, move.endCol)
+        Args:
+            move (int): The encoded move to execute.
+        """
+        board = self.board
+        start = move & 63
+        end = (move >> 6) & 63
+        startRow, startCol = start >> 3, start & 7
+        endRow, endCol = end >> 3, end & 7
+        piece = board[startRow][startCol]
+        captured = board[endRow][endCol]
+        white = self.turn == "white"
+        tables = self.pieceSquareTables
+        self.undoStack.append((captured, (self.whiteCastleKingside, self.whiteCastleQueenside,
+                                          self.blackCastleKingside, self.blackCastleQueenside),
+                               self.zobristKey, self.pawnKey, self.score, self.positionalScore))
+        self.moves.append(move)
 
-        if move.pieceMoved.upper() == "K":
-            if move.pieceMoved == "K":
+        key = self.zobristKey ^ self.castlingHash() ^ ZOBRIST_BLACK_TO_MOVE ^ ZOBRIST_PIECES[piece][start]
+        positional = self.positionalScore - tables[piece][start]
+        if piece in ("P", "p"):
+            self.pawnKey ^= ZOBRIST_PIECES[piece][start]
+        if captured != " ":
+            key ^= ZOBRIST_PIECES[captured][end]
+            positional -= tables[captured][end]
+            if captured in ("P", "p"):
+                self.pawnKey ^= ZOBRIST_PIECES[captured][end]
+            captured_value = self.PIECE_VALUES[captured.upper()]
+            self.score += captured_value if white else -captured_value
+
+        promotion = (move >> PROMOTION_SHIFT) & 7
+        if promotion:
+            newPiece = PROMOTION_PIECES[promotion] if white else PROMOTION_PIECES[promotion].lower()
+            promotion_gain = self.PIECE_VALUES[PROMOTION_PIECES[promotion]] - 1
+            self.score += promotion_gain if white else -promotion_gain
+        else:
+            newPiece = piece
+            if piece in ("P", "p"):
+                self.pawnKey ^= ZOBRIST_PIECES[piece][end]
+        board[startRow][startCol] = " "
+        board[endRow][endCol] = newPiece
+        key ^= ZOBRIST_PIECES[newPiece][end]
+        positional += tables[newPiece][end]
+
+        if move & CASTLE_FLAG:
+            rookStart, rookEnd = (7, 5) if endCol == 6 else (0, 3)
+            rook = board[startRow][rookStart]
+            board[startRow][rookStart] = " "
+            board[startRow][rookEnd] = rook
+            key ^= ZOBRIST_PIECES[rook][startRow * 8 + rookStart] ^ ZOBRIST_PIECES[rook][startRow * 8 + rookEnd]
+            positional += tables[rook][startRow * 8 + rookEnd] - tables[rook][startRow * 8 + rookStart]
+        self.positionalScore = positional
+
+        if piece == "K":
+            self.wKingLocation = (endRow, endCol)
+            self.whiteCastleKingside = False
+            self.whiteCastleQueenside = False
+        elif piece == "k":
+            self.bKingLocation = (endRow, endCol)
+            self.blackCastleKingside = False
+            self.blackCastleQueenside = False
+        #A move from or to a rook corner means the rook has moved or been captured.
+        for square in (start, end):
+            if square == 63:
                 self.whiteCastleKingside = False
+            elif square == 56:
                 self.whiteCastleQueenside = False
-            else:
+            elif square == 7:
                 self.blackCastleKingside = False
+            elif square == 0:
                 self.blackCastleQueenside = False
-        elif move.pieceMoved.upper() == "R":
-            if move.pieceMoved == "R":
-                if (move.startRow, move.startCol) == (7, 0):
-                    self.whiteCastleQueenside = False
-                elif (move.startRow, move.startCol) == (7, 7):
-                    self.whiteCastleKingside = False
-            else:
-                if (move.startRow, move.startCol) == (0, 0):
-                    self.blackCastleQueenside = False
-                elif (move.startRow, move.startCol) == (0, 7):
-                    self.blackCastleKingside = False
-        return move.getUCI()
 
+        self.turn = "black" if white else "white"
+        self.zobristKey = key ^ self.castlingHash()
+        if self.debug:
+            self.checkIncrementalState()
 
     def handleMove(self, move_uci):
         """
@@ -316,52 +1026,42 @@ class ChessEngine: # pylint: disable=C0302
             promotion = move_uci[4].upper() if self.turn == "white" else move_uci[4].lower()
         move = Move((start_row, start_col), (end_row, end_col), self.board, promotionChoice=promotion)
         self.makeMove(move)
-        print(f"Received move: {move}")
+        if self.verbose:
+            print(f"Received move: {move}")
 
     def undoMove(self):
         """
-        Undos the last made move, reverses the made changes in the board and game state.
+        Undos the last made move, reverses the made changes in the board and game state. The scores and the keys
+        are restored from the undo stack, so the floating point positional score does not drift over many moves.
         """
         if not self.moves:
             return
         move = self.moves.pop()
-        self.whiteCastleKingside = move.whiteCastleKingside
-        self.whiteCastleQueenside = move.whiteCastleQueenside
-        self.blackCastleKingside = move.blackCastleKingside
-        self.blackCastleQueenside = move.blackCastleQueenside
-
-        if move.pieceCaptured != " ":
-            captured_value = {"p": 1, "n": 3, "b": 3, "r": 5, "q": 9, "k": 0}.get(move.pieceCaptured.lower(), 0)
-            if move.pieceMoved.isupper():
-                self.score -= captured_value
-            else:
-                self.score += captured_value
-        if move.promotionChoice:
-            promotion_value = {"q": 9, "r": 5, "n": 3, "b": 3}.get(move.promotionChoice.lower(), 0)
-            pawn_value = 1
-            if move.pieceMoved.isupper():
-                self.score -= (promotion_value - pawn_value)
-            else:
-                self.score += (promotion_value - pawn_value)
-
-        self.board[move.startRow][move.startCol] = move.pieceMoved
-        self.board[move.endRow][move.endCol] = move.pieceCaptured
+        captured, castling, self.zobristKey, self.pawnKey, self.score, self.positionalScore = self.undoStack.pop()
+        (self.whiteCastleKingside, self.whiteCastleQueenside,
+         self.blackCastleKingside, self.blackCastleQueenside) = castling
+        board = self.board
+        start = move & 63
+        end = (move >> 6) & 63
+        startRow, startCol = start >> 3, start & 7
+        endRow, endCol = end >> 3, end & 7
+        piece = board[endRow][endCol]
+        if move & PROMOTION_MASK:
+            piece = "P" if piece.isupper() else "p"
+        board[startRow][startCol] = piece
+        board[endRow][endCol] = captured
         self.turn = "white" if self.turn == "black" else "black"
-        if move.pieceMoved.upper() == "K":
-            if move.pieceMoved.isupper():
-                self.wKingLocation = (move.startRow, move.startCol)
-            else:
-                self.bKingLocation = (move.startRow, move.startCol)
-
-        if move.isCastle:
-            self.board[move.rookStart[0]][move.rookStart[1]] = move.rookMoved
-            self.board[move.rookEnd[0]][move.rookEnd[1]] = move.rookCaptured
-            if move.pieceMoved.isupper():
-                self.wKingLocation = (move.startRow, move.startCol)
-            else:
-                self.bKingLocation = (move.startRow, move.startCol)
-
-
+        if piece == "K":
+            self.wKingLocation = (startRow, startCol)
+        elif piece == "k":
+            self.bKingLocation = (startRow, startCol)
+
+        if move & CASTLE_FLAG:
+            rookStart, rookEnd = (7, 5) if endCol == 6 else (0, 3)
+            board[startRow][rookStart] = board[startRow][rookEnd]
+            board[startRow][rookEnd] = " "
+        if self.debug:
+            self.checkIncrementalState()
 
     def setBoard(self, fen):
         """
@@ -401,184 +1101,900 @@ class ChessEngine: # pylint: disable=C0302
                 raise ValueError(f"Invalid FEN: rank {rank} does not have 8 squares")
             self.board.append(row)
 
-        if active_color == 'w':
-            self.turn = 'white'
-        elif active_color == 'b':
-            self.turn = 'black'
+        if active_color == 'w':
+            self.turn = 'white'
+        elif active_color == 'b':
+            self.turn = 'black'
+        else:
+            raise ValueError(f"Invalid active color: {active_color}")
+
+
+        if castling == '-':
+            self.whiteCastleKingside = False
+            self.whiteCastleQueenside = False
+            self.blackCastleKingside = False
+            self.blackCastleQueenside = False
+        else:
+            self.whiteCastleKingside = 'K' in castling
+            self.whiteCastleQueenside = 'Q' in castling
+            self.blackCastleKingside = 'k' in castling
+            self.blackCastleQueenside = 'q' in castling
+
+        self.score = self.calculateScore()
+        self.positionalScore = self.calculatePositionalScore()
+        self.zobristKey = self.calculateHash()
+        self.pawnKey = self.calculatePawnKey()
+        self.syncedBoard = self.board
+
+        self.moves = []
+        self.undoStack = []
+        self.ordering.clear()
+
+        if self.verbose:
+            print(f"Set board to FEN: {fen}")
+
+    def getFen(self):
+        """
+        Writes the current position as a FEN string. En passant is not implemented and move counters are not
+        tracked, so those fields are always "- 0 1".
+
+        Returns:
+            str: The position in FEN.
+        """
+        return positionToFen(self.board, self.turn == "white", (
+            self.whiteCastleKingside, self.whiteCastleQueenside, self.blackCastleKingside, self.blackCastleQueenside
+        ))
+
+    def resetBoard(self):
+        """
+        Resets board and game state to the starting position. Search results of the previous game are cleared.
+        """
+        self.board = ChessEngine.initialize()
+        self.turn = "white"
+        self.wKingLocation = (7, 4)
+        self.bKingLocation = (0, 4)
+        self.whiteCastleKingside = True
+        self.whiteCastleQueenside = True
+        self.blackCastleKingside = True
+        self.blackCastleQueenside = True
+        self.score = self.calculateScore()
+        self.positionalScore = self.calculatePositionalScore()
+        self.zobristKey = self.calculateHash()
+        self.pawnKey = self.calculatePawnKey()
+        self.syncedBoard = self.board
+        self.moves = []
+        self.undoStack = []
+        self.tt.clear()
+        self.ordering.clear()
+        if self.verbose:
+            print("Board reset!")
+
+    def bestMove(self, depth=3, timeLimit=None, nodeLimit=None, resume=None):
+        """
+        Calculates best move for the AI using iterative deepening. The position is searched with minimax to depth 1, 2, 3...
+        until the given depth is reached or the time or node budget runs out. An iteration that is cut short is thrown
+        away and the best move of the last completed iteration is returned. A position in the opening book is not searched.
+
+        Args:
+            depth (int): The maximum search depth for the minimax algorithm.
+            timeLimit (float): Time budget in seconds, defaults to self.moveTime.
+            nodeLimit (int): Budget of searched nodes, defaults to self.nodeBudget.
+            resume (tuple): (zobristKey, rootMove, completedDepth, rootScore) of an earlier search of this position,
+                eg. Ponder.resume. Its iterations are kept and the search continues from the next depth. Ignored
+                if it is None, of another position or did not complete an iteration.
+
+        Returns:
+            Move: The best move or None if no valid moves exist.
+        """
+        self.syncState()
+        timeLimit = self.moveTime if timeLimit is None else timeLimit
+        nodeLimit = self.nodeBudget if nodeLimit is None else nodeLimit
+        start = time.perf_counter()
+        self.deadline = start + timeLimit if timeLimit is not None else None
+        self.nodeLimit = nodeLimit
+        self.resetStats()
+        self.stopSearch = False
+        self.completedDepth = 0
+        self.rootScore = 0
+        self.rootMove = None
+        resumed = resume is not None and resume[0] == self.zobristKey and resume[2] > 0
+        if self.book is not None and not resumed:
+            book_move = self.book.pickMove(self)
+            if book_move is not None:
+                return Move.fromCode(book_move, self.board)
+        if not resumed:
+            self.tt.newSearch()
+
+        root_moves = self.legalMoves()
+        if not root_moves:
+            return None
+        best_move = root_moves[0]
+        first_depth = 1
+        if resumed:
+            _, best_move, self.completedDepth, self.rootScore = resume
+            self.rootMove = best_move
+            #The earlier search would have stopped at a mate or with a single legal move.
+            first_depth = depth + 1 if abs(self.rootScore) >= 9999 or len(root_moves) == 1 else self.completedDepth + 1
+        root_ply = len(self.moves)
+        for current_depth in range(first_depth, depth + 1):
+            try:
+                score, move = self.aspirationSearch(current_depth, self.rootScore)
+            except SearchTimeout:
+                while len(self.moves) > root_ply:
+                    self.undoMove()
+                break
+            if move is not None:
+                best_move = move
+            self.completedDepth = current_depth
+            self.rootScore = score
+            self.rootMove = best_move
+            self.iterationNodes.append(self.nodes + self.qNodes)
+            self.searchTime = time.perf_counter() - start
+            if self.infoCallback is not None:
+                self.infoCallback(self.searchStats())
+            if abs(score) >= 9999 or len(root_moves) == 1:
+                break
+            #The next iteration takes several times longer, so it is not started if it could not finish.
+            if self.deadline is not None and time.perf_counter() - start > (self.deadline - start) / 2:
+                break
+        self.deadline = None
+        self.nodeLimit = None
+        self.searchTime = time.perf_counter() - start
+        return Move.fromCode(best_move, self.board)
+
+    def resetStats(self):
+        """
+        Sets the counters of searchStats back to zero for a new search.
+        """
+        self.nodes = 0
+        self.qNodes = 0
+        self.generatedMoves = 0
+        self.searchedMoves = 0
+        self.ttHits = 0
+        self.cutoffs = 0
+        self.firstMoveCutoffs = 0
+        self.nullMoveCutoffs = 0
+        self.lmrReductions = 0
+        self.lmrResearches = 0
+        self.pvsResearches = 0
+        self.aspirationFailLows = 0
+        self.aspirationFailHighs = 0
+        self.seePrunes = 0
+        self.futilityPrunes = 0
+        self.razorCuts = 0
+        self.pawnHashProbes = 0
+        self.pawnHashHits = 0
+        self.iterationNodes = []
+        self.searchTime = 0.0
+        for phase in self.phaseTimes:
+            self.phaseTimes[phase] = 0.0
+
+    def checkLimits(self):
+        """
+        Stops the search by raising SearchTimeout when the time or node budget is used up or a stop was requested.
+        The clock and the shared stop flag are only checked every 256 nodes.
+
+        Raises:
+            SearchTimeout: If the search has to stop.
+        """
+        nodes = self.nodes + self.qNodes
+        if self.stopSearch:
+            raise SearchTimeout()
+        if self.nodeLimit is not None and nodes >= self.nodeLimit:
+            raise SearchTimeout()
+        if nodes & 255 == 0:
+            if self.deadline is not None and time.perf_counter() >= self.deadline:
+                raise SearchTimeout()
+            if self.stopFlag is not None and self.stopFlag.value:
+                raise SearchTimeout()
+
+    def aspirationSearch(self, depth, previousScore):
+        """
+        Searches the root for one iteration of bestMove. From ASPIRATION_MIN_DEPTH on, the search starts with a
+        narrow window of self.aspirationWindow around the score of the previous iteration, which cuts off more of
+        the tree while the score stays inside it. A score outside the window is only a bound, so the window is
+        widened on the side that failed and the root is searched again.
+
+        Args:
+            depth (int): The depth of the iteration.
+            previousScore (float): Score of the previous iteration, from white's point of view.
+
+        Returns:
+            tuple: (score, best_move), the score from white's point of view and the move encoded as an int.
+
+        Raises:
+            SearchTimeout: If the budget of the search runs out.
+        """
+        white = self.turn == "white"
+        if not self.aspirationWindow or depth < self.ASPIRATION_MIN_DEPTH or abs(previousScore) >= 9999:
+            return self.minimax(depth, white)
+        guess = previousScore if white else -previousScore
+        below = above = self.aspirationWindow
+        while True:
+            alpha, beta = guess - below, guess + above
+            score, move = self.negamax(depth, alpha, beta)
+            if score <= alpha:
+                self.aspirationFailLows += 1
+                below = below * self.ASPIRATION_GROWTH if below < self.ASPIRATION_MAX_WINDOW else float("inf")
+            elif score >= beta:
+                self.aspirationFailHighs += 1
+                above = above * self.ASPIRATION_GROWTH if above < self.ASPIRATION_MAX_WINDOW else float("inf")
+            else:
+                return (score if white else -score), move
+
+    def minimax(self, depth, maximizingPlayer, alpha=float("-inf"), beta=float("inf"), ply=0): # pylint: disable=R0913,R0917
+        """
+        Searches the position with negamax and gives the result from white's point of view. maximizingPlayer
+        must be True when white is to move.
+
+        Args:
+            depth (int): The depth the algorithm searches.
+            maximizingPlayer (bool): True if maximizing (White), False if minimizing (Black).
+            alpha (float): Best score for the maximizer along the current path.
+            beta (float): Best score for the minimizer along the current path.
+            ply (int): Distance from the root of the search.
+
+        Returns:
+            tuple: (best_score, best_move), the move is encoded as an int.
+
+        Raises:
+            SearchTimeout: If the budget of the search runs out.
+        """
+        if maximizingPlayer:
+            return self.negamax(depth, alpha, beta, ply)
+        score, move = self.negamax(depth, -beta, -alpha, ply)
+        return -score, move
+
+    def negamax(self, depth, alpha, beta, ply=0, allowNull=True): # pylint: disable=R0911,R0912,R0913,R0914,R0915,R0917
+        """
+        Principal variation search with alpha-beta pruning. Scores are from the point of view of the player in turn.
+        The first move is searched with the full window and the rest with a zero window around alpha, searching
+        again with the full window only when a move turns out better. Null-move pruning (see nullMoveScore),
+        late move reductions of quiet moves late in the order and razoring and futility pruning near the leaves
+        (see frontierPruning) are used when self.nullMove, self.lateMoveReductions, self.razoring and
+        self.futilityPruning are on. Results are stored in the transposition table. A stored result that was
+        searched at least as deep is used directly or to narrow the window. Moves come from stagedMoves, so a
+        cutoff stops generating them. When the depth is used up, the position is resolved with the quiescence search.
+
+        Args:
+            depth (int): The depth the algorithm searches.
+            alpha (float): Score the player in turn already has elsewhere.
+            beta (float): Score the opponent already has elsewhere, negated.
+            ply (int): Distance from the root of the search.
+            allowNull (bool): False right after a null move, so that two null moves are not made in a row.
+
+        Returns:
+            tuple: (best_score, best_move), the move is encoded as an int.
+
+        Raises:
+            SearchTimeout: If the budget of the search runs out.
+        """
+        if depth <= 0:
+            return self.quiescence(alpha, beta), None
+        self.nodes += 1
+        self.checkLimits()
+        hash_move = None
+        entry = self.tt.probe(self.zobristKey)
+        if entry is not None:
+            self.ttHits += 1
+            _, entry_depth, flag, entry_score, hash_move, _ = entry
+            if entry_depth >= depth:
+                if flag == TranspositionTable.EXACT:
+                    return entry_score, hash_move
+                if flag == TranspositionTable.LOWERBOUND:
+                    alpha = max(alpha, entry_score)
+                else:
+                    beta = min(beta, entry_score)
+                if beta <= alpha:
+                    return entry_score, hash_move
+        pv_node = beta - alpha > 2 * self.PVS_WINDOW
+        if self.nullMove and allowNull and ply > 0 and not pv_node and depth >= self.NULL_MOVE_MIN_DEPTH:
+            score = self.nullMoveScore(depth, beta, ply)
+            if score is not None:
+                return score, None
+        futility_bound = None
+        if depth <= self.FRONTIER_DEPTH and not pv_node and max(abs(alpha), abs(beta)) < 9999 and not self.isInCheck():
+            score, futility_bound = self.frontierPruning(depth, alpha, beta)
+            if score is not None:
+                return score, None
+
+        moves = self.stagedMoves(ply, hash_move)
+        if ply == 0:
+            #Every root move is searched anyway, so the root order is fixed before the first one is searched.
+            moves = list(moves)
+        #In check, every move is an evasion and none is reduced.
+        reduce = self.lateMoveReductions and ply > 0 and depth >= self.lmrMinDepth and not self.isInCheck()
+        window_alpha, window_beta = alpha, beta
+        presearched, split_alpha = {}, None
+        searched, pruned, best_move = 0, 0, None
+        best_value = float("-inf")
+        for searched, move in enumerate(moves, 1):
+            self.doMove(move)
+            if futility_bound is not None and searched > 1 and not move & (CAPTURE_FLAG | PROMOTION_MASK) \
+                    and not self.isInCheck():
+                #The skipped move is assumed to score at most the futility bound.
+                self.undoMove()
+                best_value = max(best_value, futility_bound)
+                pruned += 1
+                continue
+            if searched == 1:
+                value = -self.negamax(depth - 1, -beta, -alpha, ply + 1)[0]
+            elif alpha == split_alpha and move in presearched:
+                #Searched by rootSplit with the same window, so it scores the same as here.
+                value = presearched[move]
+            else:
+                reduction = 0
+                if reduce and searched > self.lmrMinMoves and not move & (CAPTURE_FLAG | PROMOTION_MASK) \
+                        and not self.isInCheck():
+                    reduction = 1 if searched <= 2 * self.lmrMinMoves or depth < 6 else 2
+                    self.lmrReductions += 1
+                value = -self.negamax(depth - 1 - reduction, -alpha - self.PVS_WINDOW, -alpha, ply + 1)[0]
+                if value > alpha and reduction:
+                    self.lmrResearches += 1
+                    value = -self.negamax(depth - 1, -alpha - self.PVS_WINDOW, -alpha, ply + 1)[0]
+                if alpha < value < beta:
+                    self.pvsResearches += 1
+                    value = -self.negamax(depth - 1, -beta, -alpha, ply + 1)[0]
+            self.undoMove()
+            if value > best_value:
+                best_value = value
+                best_move = move
+            alpha = max(alpha, value)
+            if alpha >= beta:
+                self.ordering.addCutoff(move, ply, depth)
+                break
+            if ply == 0 and searched == 1 and self.rootSplit is not None:
+                presearched, split_alpha = self.rootSplit(depth, alpha, beta, moves[1:]), alpha # pylint: disable=E1102
+        self.futilityPrunes += pruned
+        self.searchedMoves += searched - pruned
+        if not searched:
+            return (self.terminalScore() if self.turn == "white" else -self.terminalScore()), None
+
+        if best_value <= window_alpha:
+            flag = TranspositionTable.UPPERBOUND
+        elif best_value >= window_beta:
+            #The loop stopped at a cutoff, searched is the number of the move that caused it.
+            flag = TranspositionTable.LOWERBOUND
+            self.cutoffs += 1
+            self.firstMoveCutoffs += searched == 1
+        else:
+            flag = TranspositionTable.EXACT
+        self.tt.store(self.zobristKey, depth, flag, best_value, best_move)
+        return best_value, best_move
+
+    def frontierPruning(self, depth, alpha, beta):
+        """
+        Razoring and futility pruning at a node near the leaves, not in check and outside the principal variation.
+        Razoring: when the static evaluation is RAZOR_MARGINS below alpha, the node is resolved with the quiescence
+        search, and if that cannot reach alpha either, its score is returned. Futility pruning: when even the static
+        evaluation plus FUTILITY_MARGINS does not reach alpha, no quiet move can plausibly raise the score to alpha,
+        so quiet moves that do not give check are skipped after the first move.
+
+        Args:
+            depth (int): Remaining depth of the node, at most FRONTIER_DEPTH.
+            alpha (float): Alpha of the node, from the point of view of the player in turn.
+            beta (float): Beta of the node, from the point of view of the player in turn.
+
+        Returns:
+            tuple: (score, bound), the score to return from the node or None if it has to be searched, and the
+            static evaluation plus the futility margin if quiet moves can be skipped, else None.
+
+        Raises:
+            SearchTimeout: If the budget of the search runs out.
+        """
+        static = self.staticEvaluation() if self.turn == "white" else -self.staticEvaluation()
+        if self.razoring and static + self.RAZOR_MARGINS[depth] <= alpha:
+            score = self.quiescence(alpha, beta)
+            if score <= alpha:
+                self.razorCuts += 1
+                return score, None
+        bound = static + self.FUTILITY_MARGINS[depth]
+        return None, bound if self.futilityPruning and bound <= alpha else None
+
+    def nullMoveScore(self, depth, beta, ply):
+        """
+        Null-move pruning: if the player in turn would still have at least beta after passing the move to the
+        opponent, a real move is assumed to do even better and the node is cut off. The pass is searched with a
+        reduced depth, self.nullMoveReduction plus one more when the remaining depth is large. It is not tried when
+        the static evaluation is already below beta, in check, or when the player has only pawns left, where
+        passing can be the best move (zugzwang).
+
+        Args:
+            depth (int): Remaining depth of the node.
+            beta (float): Beta of the node, from the point of view of the player in turn.
+            ply (int): Distance from the root of the search.
+
+        Returns:
+            float: The score to cut off with, or None if the node has to be searched.
+
+        Raises:
+            SearchTimeout: If the budget of the search runs out.
+        """
+        white = self.turn == "white"
+        if (self.staticEvaluation() if white else -self.staticEvaluation()) < beta:
+            return None
+        pieces = "NBRQ" if white else "nbrq"
+        if not any(piece in pieces for row in self.board for piece in row if piece != " ") or self.isInCheck():
+            return None
+        reduction = self.nullMoveReduction + (depth > self.NULL_MOVE_DEEP_DEPTH)
+        root_ply = len(self.moves)
+        self.doNullMove()
+        try:
+            score = -self.negamax(depth - 1 - reduction, -beta, -beta + self.PVS_WINDOW, ply + 1, False)[0]
+        except SearchTimeout:
+            #The moves made after the null move are taken back first, so the pass is undone in the right position.
+            while len(self.moves) > root_ply:
+                self.undoMove()
+            self.undoNullMove()
+            raise
+        self.undoNullMove()
+        if score < beta:
+            return None
+        self.nullMoveCutoffs += 1
+        #A mate found after passing is not proven, so only beta is returned for it.
+        return beta if score >= 9999 else score
+
+    def doNullMove(self):
+        """
+        Passes the turn to the opponent without moving, for null-move pruning. Only the turn and the key change.
+        """
+        self.turn = "white" if self.turn == "black" else "black"
+        self.zobristKey ^= ZOBRIST_BLACK_TO_MOVE
+
+    def undoNullMove(self):
+        """
+        Takes back a pass made with doNullMove.
+        """
+        self.turn = "white" if self.turn == "black" else "black"
+        self.zobristKey ^= ZOBRIST_BLACK_TO_MOVE
+
+    def quiescence(self, alpha, beta, qply=0):
+        """
+        Searches only captures and promotions until the position is quiet, so that the search does not stop in the
+        middle of an exchange, with the window and the score from the point of view of the player in turn. The side
+        to move can also stand pat, taking the static evaluation instead of capturing. Captures that could not bring
+        the score near alpha even with DELTA_MARGIN are skipped, and so are captures that lose material by static
+        exchange evaluation. In check there is no standing pat and all evasions are searched.
+
+        Args:
+            alpha (float): Score the player in turn already has elsewhere.
+            beta (float): Score the opponent already has elsewhere, negated.
+            qply (int): Number of captures made since the end of the main search.
+
+        Returns:
+            float: The score of the position for the player in turn.
+
+        Raises:
+            SearchTimeout: If the budget of the search runs out.
+        """
+        self.qNodes += 1
+        self.checkLimits()
+        stand_pat = self.staticEvaluation() if self.turn == "white" else -self.staticEvaluation()
+        if qply >= self.MAX_QUIESCENCE_PLY:
+            return stand_pat
+        in_check = self.isInCheck()
+        if in_check:
+            #Checkmated unless an evasion is found.
+            best_value = -9999
         else:
-            raise ValueError(f"Invalid active color: {active_color}")
+            if stand_pat >= beta:
+                return stand_pat
+            alpha = max(alpha, stand_pat)
+            best_value = stand_pat
+
+        board = self.board
+        for move in self.stagedMoves(MoveOrdering.MAX_PLY, capturesOnly=True):
+            if not in_check:
+                end = (move >> 6) & 63
+                gain = self.PIECE_VALUES[board[end >> 3][end & 7].upper()] if move & CAPTURE_FLAG else 0
+                promotion = (move >> PROMOTION_SHIFT) & 7
+                if promotion:
+                    gain += self.PIECE_VALUES[PROMOTION_PIECES[promotion]] - 1
+                if stand_pat + gain + self.DELTA_MARGIN <= alpha:
+                    continue
+                if self.losesMaterial(move):
+                    self.seePrunes += 1
+                    continue
+            self.doMove(move)
+            value = -self.quiescence(-beta, -alpha, qply + 1)
+            self.undoMove()
+            best_value = max(best_value, value)
+            alpha = max(alpha, value)
+            if alpha >= beta:
+                break
+        return best_value
 
+    def stagedMoves(self, ply, hashMove=None, capturesOnly=False):
+        """
+        Generates the legal moves for minimax in stages, each one only when the moves before it did
+        not cause a cutoff: the hash move, promotions and captures that do not give up material, the
+        killer moves, quiet moves by history and last the captures that lose material by static
+        exchange evaluation. The hash move and killers are checked by generating the moves of their
+        piece only, and captures and quiet moves are generated separately, so a node that cuts early
+        never generates its quiet moves. When in check, all evasions are generated and ordered at
+        once. The counts of minimax are added to self.generatedMoves, minimax adds the moves it
+        searched to self.searchedMoves.
 
-        if castling == '-':
-            self.whiteCastleKingside = False
-            self.whiteCastleQueenside = False
-            self.blackCastleKingside = False
-            self.blackCastleQueenside = False
-        else:
-            self.whiteCastleKingside = 'K' in castling
-            self.whiteCastleQueenside = 'Q' in castling
-            self.blackCastleKingside = 'k' in castling
-            self.blackCastleQueenside = 'q' in castling
+        Args:
+            ply (int): Distance from the root of the search.
+            hashMove (int): Best move stored in the transposition table or None.
+            capturesOnly (bool): Only generate the promotions and captures, sorted by MVV-LVA, for the quiescence
+                search. The evasions are still all generated in check.
 
-        self.score = self.calculateScore()
+        Yields:
+            int: The next legal move to search.
+        """
+        check, pins = self.checkAndPins()
+        if check:
+            moves = self.legalMoves()
+            if not capturesOnly:
+                self.generatedMoves += len(moves)
+            yield from self.ordering.orderMoves(moves, self.board, ply, hashMove)
+            return
+        if capturesOnly:
+            yield from self.ordering.orderCaptures(self.pieceMovesFrom(None, CAPTURES, pins), self.board)
+            return
+        tactical = CAPTURE_FLAG | PROMOTION_MASK
+        if hashMove is not None:
+            moves = self.pieceMovesFrom(hashMove & 63, CAPTURES if hashMove & tactical else QUIETS, pins)
+            self.generatedMoves += len(moves)
+            if hashMove in moves:
+                yield hashMove
+            else:
+                hashMove = None
+
+        captures = self.pieceMovesFrom(None, CAPTURES, pins)
+        self.generatedMoves += len(captures)
+        captures = [move for move in captures if move != hashMove]
+        winning, losing = self.ordering.splitCaptures(captures, self.board, self.losesMaterial)
+        yield from winning
+
+        searched = {hashMove}
+        if ply < MoveOrdering.MAX_PLY:
+            for killer in list(self.ordering.killers[ply]):
+                if killer is None or killer in searched:
+                    continue
+                moves = self.pieceMovesFrom(killer & 63, QUIETS, pins)
+                self.generatedMoves += len(moves)
+                if killer in moves:
+                    searched.add(killer)
+                    yield killer
+        quiets = self.pieceMovesFrom(None, QUIETS, pins)
+        self.generatedMoves += len(quiets)
+        quiets = [move for move in quiets if move not in searched]
+        yield from self.ordering.orderQuiets(quiets)
+        yield from losing
+
+    def checkAndPins(self):
+        """
+        Finds if the player in turn is in check and the pins pieceMovesFrom needs for stagedMoves.
 
-        self.moves = []
+        Returns:
+            tuple: (is_in_check, pins), the pins as listed by pinsAndChecks.
+        """
+        check, pins, _ = self.pinsAndChecks()
+        return check, pins
 
-        print(f"Set board to FEN: {fen}")
+    def pieceMovesFrom(self, square, kind, pins):
+        """
+        Generates the moves of one kind for stagedMoves, when the player in turn is not in check. The search of
+        earlier moves changes the check and pin state of the engine, so it is set back before generating.
 
-    def resetBoard(self):
+        Args:
+            square (int): Square of the piece to generate the moves of, None for all pieces.
+            kind (int): ALL_MOVES, CAPTURES or QUIETS.
+            pins (list): The pins of the position from pinsAndChecks.
+
+        Returns:
+            list: The moves encoded as ints.
         """
-        Resets board to the starting position.
+        #The generators remove the pins they use, so each call works on a copy.
+        self.check, self.pins = False, list(pins)
+        if square is None:
+            moves = self.possibleMoves(kind)
+        else:
+            moves = []
+            piece = self.board[square >> 3][square & 7]
+            if piece != " " and piece.isupper() == (self.turn == "white"):
+                self.pieceMoves[piece.upper()](square >> 3, square & 7, moves, kind)
+        return moves
+
+    def moveGenerationStats(self):
         """
-        self.board = ChessEngine.initialize()
-        print("Board reset!")
+        Compares the moves minimax generated with the moves it searched in the last search.
 
-    def bestMove(self, depth=3):
+        Returns:
+            dict: {"nodes", "generated", "searched", "generatedPerNode", "searchedPerNode"}.
         """
-        Calculates best move for the AI using minimax algorithm in depth of 3.
+        nodes = max(self.nodes, 1)
+        return {"nodes": self.nodes, "generated": self.generatedMoves, "searched": self.searchedMoves,
+                "generatedPerNode": self.generatedMoves / nodes, "searchedPerNode": self.searchedMoves / nodes}
 
-        Args:
-            depth (int): The search depth for the minimax algorithm.
+    def searchStats(self):
+        """
+        Collects the statistics of the last search, or of the search so far when called from infoCallback.
 
         Returns:
-            Move: The best move or None if no valid moves exist.
+            dict: depth, score (pawns, white's point of view), nodes (minimax), qNodes (quiescence), totalNodes,
+            time (seconds), nps, cutoffs, firstMoveCutoffRate (share of cutoffs made by the first move searched),
+            ttHitRate (share of minimax nodes found in the transposition table), branchingFactor (total nodes of
+            the last iteration divided by those of the one before, 0.0 before two iterations), generatedPerNode,
+            searchedPerNode, nullMoveCutoffs, lmrReductions, lmrResearches (reduced moves searched again at full
+            depth), pvsResearches (zero window searches searched again with the full window), aspirationFailLows and
+            aspirationFailHighs (root searches that scored below or above the aspiration window for the player in
+            turn and were searched again with it widened), seePrunes (captures skipped in the quiescence search
+            because they lose material), futilityPrunes (quiet moves skipped by futility pruning), razorCuts (nodes
+            cut off by razoring), pawnHashHitRate (share of pawn structure evaluations found in the pawn hash table),
+            phaseTimes (seconds by SEARCH_PHASES, zero unless profiling) and pv (UCI moves).
         """
-        _, best_move = self.minimax(depth, self.turn == "white")
-        return best_move
+        total = self.nodes + self.qNodes
+        iterations = [later - earlier for earlier, later in zip([0] + self.iterationNodes, self.iterationNodes)]
+        generation = self.moveGenerationStats()
+        return {
+            "depth": self.completedDepth,
+            "score": self.rootScore,
+            "nodes": self.nodes,
+            "qNodes": self.qNodes,
+            "totalNodes": total,
+            "time": self.searchTime,
+            "nps": total / self.searchTime if self.searchTime > 0 else 0.0,
+            "cutoffs": self.cutoffs,
+            "firstMoveCutoffRate": self.firstMoveCutoffs / self.cutoffs if self.cutoffs else 0.0,
+            "ttHitRate": self.ttHits / self.nodes if self.nodes else 0.0,
+            "branchingFactor": iterations[-1] / iterations[-2] if len(iterations) > 1 and iterations[-2] else 0.0,
+            "generatedPerNode": generation["generatedPerNode"],
+            "searchedPerNode": generation["searchedPerNode"],
+            "nullMoveCutoffs": self.nullMoveCutoffs,
+            "lmrReductions": self.lmrReductions,
+            "lmrResearches": self.lmrResearches,
+            "pvsResearches": self.pvsResearches,
+            "aspirationFailLows": self.aspirationFailLows,
+            "aspirationFailHighs": self.aspirationFailHighs,
+            "seePrunes": self.seePrunes,
+            "futilityPrunes": self.futilityPrunes,
+            "razorCuts": self.razorCuts,
+            "pawnHashHitRate": self.pawnHashHits / self.pawnHashProbes if self.pawnHashProbes else 0.0,
+            "phaseTimes": dict(self.phaseTimes),
+            "pv": [moveToUCI(move) for move in self.principalVariation()],
+        }
 
-    def minimax(self, depth, maximizingPlayer, alpha=float("-inf"), beta=float("inf")):
+    def principalVariation(self, maxLength=MAX_PV_LENGTH):
         """
-        Implements the minimax algorithm with alpha-beta pruning to evaluate moves.
+        Reads the expected line of play from the best moves stored in the transposition table.
 
         Args:
-            depth (int): The depth the algorithm searches.
-            maximizingPlayer (bool): True if maximizing (White), False if minimizing (Black).
-            alpha (float): Best score for the maximizer along the current path.
-            beta (float): Best score for the minimizer along the current path.
+            maxLength (int): The most moves to read.
 
         Returns:
-            tuple: (best_score, best_move).
+            list: The moves encoded as ints, starting from the current position.
         """
-        valid_moves = self.validMoves()
-        if depth == 0 or not valid_moves:
-            return self.evaluateBoard(), None
-        if maximizingPlayer:
-            max_value = float("-inf")
-            best_move = None
-            for move in valid_moves:
-                self.makeMove(move)
-                value, _ = self.minimax(depth-1, False, alpha, beta)
-                self.undoMove()
-                if value > max_value:
-                    max_value = value
-                    best_move = move
-                alpha = max(alpha, max_value)
-                if beta <= alpha:
-                    break
-            return max_value, best_move
-
-        min_value = float("inf")
-        best_move = None
-        for move in valid_moves:
-            self.makeMove(move)
-            value, _ = self.minimax(depth-1, True, alpha, beta)
-            self.undoMove()
-            if value < min_value:
-                min_value = value
-                best_move = move
-            beta = min(beta, min_value)
-            if beta <= alpha:
+        pv = []
+        seen = set()
+        while len(pv) < maxLength and self.zobristKey not in seen:
+            seen.add(self.zobristKey)
+            entry = self.tt.probe(self.zobristKey)
+            if entry is None or entry[4] is None or entry[4] not in self.legalMoves():
                 break
-        return min_value, best_move
+            pv.append(entry[4])
+            self.doMove(entry[4])
+        for _ in pv:
+            self.undoMove()
+        return pv
+
+    def setProfiling(self, enabled):
+        """
+        Turns the phase timers on or off. While on, the methods of SEARCH_PHASES are replaced on this engine by
+        wrappers that add their time to self.phaseTimes, so the timers cost nothing while off.
+
+        Args:
+            enabled (bool): True to time the search phases.
+        """
+        for phase, names in SEARCH_PHASES.items():
+            for name in names:
+                self.__dict__.pop(name, None)
+                if enabled:
+                    setattr(self, name, _timedMethod(getattr(self, name), self.phaseTimes, phase))
+        self.profiling = enabled
 
     def evaluateBoard(self):
         """
-        Evaluates the board position based on material difference and position of the pieces.
+        Evaluates the board position based on material difference and position of the pieces, detecting checkmate
+        and stalemate. The search does its own terminal detection from the moves it generates and calls
+        staticEvaluation directly.
 
         Returns:
             float: Positive scores are advantage for white, negative are advantage for Black.
         """
-        valid_moves = self.validMoves()
-        if not valid_moves:
-            if self.isInCheck():
-                #When the player in turn is in checkmate
-                return -9999 if self.turn == "white" else 9999
-            #When there is a stalemate
-            return 0
-        material_score = self.score
-
-        positional_score = 0
-        for r in range(8):
-            for c in range(8):
-                piece = self.board[r][c]
-                if piece == " ":
+        self.syncState()
+        if not self.legalMoves():
+            return self.terminalScore()
+        return self.staticEvaluation()
+
+    def staticEvaluation(self):
+        """
+        Evaluates the position from the material, positional and pawn structure scores only, without generating moves.
+
+        Returns:
+            float: Positive scores are advantage for white, negative are advantage for Black.
+        """
+        return self.score + self.positionalScore + self.pawnScore()
+
+    def pawnScore(self):
+        """
+        Scores the pawn structure and the pawn shields of the kings. The evaluation of the pawns is looked up in
+        the pawn hash table by the pawn key and only calculated with evaluatePawns when it is not there. It holds
+        a shield score for every file a king could stand on, so the kings can move without changing the key.
+        A shield counts while its king is on one of its first two rows.
+
+        Returns:
+            float: Positive scores are advantage for white, negative are advantage for Black.
+        """
+        self.pawnHashProbes += 1
+        evaluation = self.pawnTable.probe(self.pawnKey)
+        if evaluation is None:
+            evaluation = self.evaluatePawns()
+            self.pawnTable.store(self.pawnKey, evaluation)
+        else:
+            self.pawnHashHits += 1
+        score, white_shield, black_shield = evaluation
+        row, col = self.wKingLocation
+        if row >= 6:
+            score += white_shield[col]
+        row, col = self.bKingLocation
+        if row <= 1:
+            score -= black_shield[col]
+        return score
+
+    def evaluatePawns(self):
+        """
+        Evaluates the pawns from scratch: a bonus for passed pawns growing as they advance, penalties for isolated,
+        doubled and backward pawns, and the shield each side would have with its king on each file. A backward
+        pawn has no pawns of its own beside or behind it on the neighbouring files and an enemy pawn guarding the
+        square in front of it.
+
+        Returns:
+            tuple: (score, white_shield, black_shield), the score from white's point of view without the shields,
+            and the shield bonus of each side by the file of its king.
+        """
+        files = {True: [[] for _ in range(8)], False: [[] for _ in range(8)]}
+        for r in range(1, 7):
+            for c, piece in enumerate(self.board[r]):
+                if piece in ("P", "p"):
+                    files[piece == "P"][c].append(r)
+        score = 0.0
+        shields = {}
+        for white, sign, forward, home in ((True, 1, -1, 7), (False, -1, 1, 0)):
+            own, enemy = files[white], files[not white]
+            for c, rows in enumerate(own):
+                if not rows:
                     continue
-                index = r * 8 + c
-                if piece == "P":
-                    positional_score += self.white_pawn_preferred_coordinates[index]
-                elif piece == "p":
-                    positional_score -= self.black_pawn_preferred_coordinates[index]
-                elif piece == "N":
-                    positional_score += self.white_knight_preferred_coordinates[index]
-                elif piece == "n":
-                    positional_score -= self.black_knight_preferred_coordinates[index]
-                elif piece == "B":
-                    positional_score += self.white_bishop_preferred_coordinates[index]
-                elif piece == "b":
-                    positional_score -= self.black_bishop_preferred_coordinates[index]
-                elif piece == "R":
-                    positional_score += self.white_rook_preferred_coordinates[index]
-                elif piece == "r":
-                    positional_score -= self.black_rook_preferred_coordinates[index]
-                elif piece == "Q":
-                    positional_score += self.white_queen_preferred_coordinates[index]
-                elif piece == "q":
-                    positional_score -= self.black_queen_preferred_coordinates[index]
-                elif piece == "K":
-                    positional_score += self.white_king_preferred_coordinates[index]
-                elif piece == "k":
-                    positional_score -= self.black_king_preferred_coordinates[index]
-
-        total_score = material_score+positional_score
-
-        return total_score if self.turn == "white" else -total_score
+                neighbours = [r for f in (c - 1, c + 1) if 0 <= f < 8 for r in own[f]]
+                score -= sign * self.DOUBLED_PAWN_PENALTY * (len(rows) - 1)
+                for r in rows:
+                    if not neighbours:
+                        score -= sign * self.ISOLATED_PAWN_PENALTY
+                    #Rows are ahead of the pawn when they are further in its direction of movement.
+                    if not any((er - r) * forward > 0 for f in (c - 1, c, c + 1) if 0 <= f < 8 for er in enemy[f]):
+                        score += sign * self.PASSED_PAWN_BONUS[(r - home - forward) * forward]
+                    elif (neighbours and all((nr - r) * forward > 0 for nr in neighbours)
+                          and any(r + 2 * forward in enemy[f] for f in (c - 1, c + 1) if 0 <= f < 8)):
+                        score -= sign * self.BACKWARD_PAWN_PENALTY
+            shield = []
+            for c in range(8):
+                bonus = 0.0
+                for f in (c - 1, c, c + 1):
+                    if 0 <= f < 8:
+                        if home + forward in own[f]:
+                            bonus += self.SHIELD_BONUS[0]
+                        elif home + 2 * forward in own[f]:
+                            bonus += self.SHIELD_BONUS[1]
+                shield.append(bonus)
+            shields[white] = tuple(shield)
+        return score, shields[True], shields[False]
+
+    def terminalScore(self):
+        """
+        Scores a position where the player in turn has no legal moves. Uses self.check set by legalMoves.
 
+        Returns:
+            int: -9999 or 9999 when white or black is checkmated, 0 for a stalemate.
+        """
+        if self.check:
+            #When the player in turn is in checkmate
+            return -9999 if self.turn == "white" else 9999
+        #When there is a stalemate
+        return 0
 
     def validMoves(self):
         """
-        Generates all legal moves for the current player, accounting for checks and pins.
+        Generates all legal moves for the current player as Move objects.
 
         Returns:
             list: A list of valid moves that are allowed by the rules.
         """
-        moves = []
+        self.syncState()
+        return [Move.fromCode(move, self.board) for move in self.legalMoves()]
+
+    def legalMoves(self):
+        """
+        Generates all legal moves for the current player, accounting for checks and pins.
+
+        Returns:
+            list: The legal moves encoded as ints.
+        """
         self.check, self.pins, self.checks = self.pinsAndChecks()
+        if not self.check:
+            return self.possibleMoves()
+        return self.evasionMoves()
+
+    def evasionMoves(self):
+        """
+        Generates the legal moves when the player in turn is in check, set up by legalMoves. Instead of filtering
+        every possible move, only king steps to squares that are not attacked are generated and, against a single
+        checker, the captures of the checking piece and the moves onto the squares between it and the king.
+        A pinned piece can never stop a check, so pinned pieces are left out.
+
+        Returns:
+            list: The legal moves encoded as ints.
+        """
         kingRow, kingCol = self.wKingLocation if self.turn == "white" else self.bKingLocation
+        moves = []
+        self.getKingMoves(kingRow, kingCol, moves)
+        if len(self.checks) > 1:
+            return moves
+        checkSquare = self.checks[0][0] * 8 + self.checks[0][1]
+        pinned = {pin[0] * 8 + pin[1] for pin in self.pins}
+        self.movesToSquare(checkSquare, pinned, moves)
+        for square in BETWEEN[kingRow * 8 + kingCol][checkSquare]:
+            self.movesToSquare(square, pinned, moves)
+        return moves
 
-        if self.check:
-            if len(self.checks) == 1:
-                moves = self.possibleMoves()
-                check = self.checks[0]
-                checkRow, checkCol = check[0], check[1]
-                checkingPiece = self.board[checkRow][checkCol]
-                validSquares = []
-                if checkingPiece.upper() == "N":
-                    validSquares = [(checkRow, checkCol)]
-                else:
-                    for i in range(1, 8):
-                        validSquare = (kingRow + check[2] * i, kingCol + check[3] * i)
-                        validSquares.append(validSquare)
-                        if validSquare[0] == checkRow and validSquare[1] == checkCol:
-                            break
-                for i in range(len(moves) - 1, -1, -1):
-                    if moves[i].pieceMoved.upper() != "K":
-                        if (moves[i].endRow, moves[i].endCol) not in validSquares:
-                            moves.remove(moves[i])
-            else:
-                moves = [move for move in self.possibleMoves() if move.pieceMoved.upper() == "K"]
+    def movesToSquare(self, target, pinned, moves):
+        """
+        Generates the moves of the current player's pieces other than the king that end on one square, by looking
+        from the square for the pieces that reach it. Used by evasionMoves.
+
+        Args:
+            target (int): Square index r * 8 + c, a capture if an enemy piece stands on it.
+            pinned (set): Squares of the pinned pieces, which are skipped.
+            moves (list): List to append the moves to.
+        """
+        board = self.board
+        white = self.turn == "white"
+        pawn, knight, rook, bishop, queen = ("P", "N", "R", "B", "Q") if white else ("p", "n", "r", "b", "q")
+        capture = CAPTURE_FLAG if board[target >> 3][target & 7] != " " else 0
+        starts = []
+        if capture:
+            for r, c in (WHITE_PAWN_ATTACKERS if white else BLACK_PAWN_ATTACKERS)[target]:
+                if board[r][c] == pawn:
+                    starts.append(r * 8 + c)
         else:
-            moves = self.possibleMoves()
-        return moves
+            step = 8 if white else -8
+            behind = target + step
+            if 0 <= behind < 64:
+                piece = board[behind >> 3][behind & 7]
+                if piece == pawn:
+                    starts.append(behind)
+                elif piece == " " and target >> 3 == (4 if white else 3):
+                    if board[(behind + step) >> 3][(behind + step) & 7] == pawn:
+                        starts.append(behind + step)
+        for r, c in KNIGHT_ATTACKS[target]:
+            if board[r][c] == knight:
+                starts.append(r * 8 + c)
+        for rays, slider in ((ROOK_RAYS, rook), (BISHOP_RAYS, bishop)):
+            for ray in rays[target]:
+                for r, c in ray:
+                    piece = board[r][c]
+                    if piece != " ":
+                        if piece in (slider, queen):
+                            starts.append(r * 8 + c)
+                        break
+        promotions = PROMOTION_ORDER if target >> 3 == (0 if white else 7) else (0,)
+        for start in starts:
+            if start in pinned:
+                continue
+            for promotion in promotions if board[start >> 3][start & 7] == pawn else (0,):
+                moves.append(start | target << 6 | promotion | capture)
 
     #Finds all possible pins and checks based on the locations of the pieces.
     def pinsAndChecks(self):
@@ -675,7 +2091,6 @@ class ChessEngine: # pylint: disable=C0302
     def underAttack(self, r, c):
         """
         Determines if a square is under attack by the opponent.
-        Uses pseudo-legal moves without king castling checks to avoid recursion.
 
         Args:
             r (int): Row of the square.
@@ -684,65 +2099,162 @@ class ChessEngine: # pylint: disable=C0302
         Returns:
             bool: Is True if the square is attacked.
         """
-        current_turn = self.turn
-        self.turn = "black" if current_turn == "white" else "white"
-        enemyMoves = self.allPseudoLegalMoves()
-        self.turn = current_turn
-        return any(move.endRow == r and move.endCol == c for move in enemyMoves)
+        return self.isSquareAttacked(r, c, self.turn == "black")
 
-    def possibleMoves(self):
+    def isSquareAttacked(self, r, c, byWhite):
         """
-        Generates all possible moves for the current player, ignoring checks.
+        Determines if a square is attacked by the pieces of one side. Knights, kings and pawns are looked up from
+        the precomputed attack tables and rooks, bishops and queens by walking the rays out from the square,
+        so no moves are generated.
+
+        Args:
+            r (int): Row of the square.
+            c (int): Column of the square.
+            byWhite (bool): True to look for white attackers, False for black ones.
 
         Returns:
-            list: A list of possible moves.
+            bool: Is True if the square is attacked.
         """
-        moves = []
-        for r, row in enumerate(self.board):
-            for c, piece in enumerate(row):
-                if self.turn == "white" and piece.isupper():
-                    self.pieceMoves[piece](r, c, moves)
-                elif self.turn == "black" and piece.islower():
-                    self.pieceMoves[piece.upper()](r, c, moves)
-        return moves
+        board = self.board
+        square = r * 8 + c
+        if byWhite:
+            knight, king, rook, bishop, queen = "N", "K", "R", "B", "Q"
+            pawn, pawnSquares = "P", WHITE_PAWN_ATTACKERS[square]
+        else:
+            knight, king, rook, bishop, queen = "n", "k", "r", "b", "q"
+            pawn, pawnSquares = "p", BLACK_PAWN_ATTACKERS[square]
+        for tr, tc in KNIGHT_ATTACKS[square]:
+            if board[tr][tc] == knight:
+                return True
+        for tr, tc in pawnSquares:
+            if board[tr][tc] == pawn:
+                return True
+        for tr, tc in KING_ATTACKS[square]:
+            if board[tr][tc] == king:
+                return True
+        for ray in ROOK_RAYS[square]:
+            for tr, tc in ray:
+                piece = board[tr][tc]
+                if piece != " ":
+                    if piece in (rook, queen):
+                        return True
+                    break
+        for ray in BISHOP_RAYS[square]:
+            for tr, tc in ray:
+                piece = board[tr][tc]
+                if piece != " ":
+                    if piece in (bishop, queen):
+                        return True
+                    break
+        return False
+
+    def staticExchange(self, move):
+        """
+        Static exchange evaluation: the material won or lost by a capture or promotion when both sides go on
+        capturing on its end square with their least valuable piece, each side stopping when capturing further
+        would lose. The attackers are found with the leaper tables and by walking the rays out from the square,
+        where a slider behind another attacker on the same ray (an x-ray) joins once the piece in front of it has
+        captured. Pins and checks are not taken into account.
+
+        Args:
+            move (int): The encoded move, made by the player in turn.
+
+        Returns:
+            float: The material balance of the exchange for the player making the move, in pawns.
+        """
+        board = self.board
+        start, end = move & 63, (move >> 6) & 63
+        piece = board[start >> 3][start & 7]
+        values = self.SEE_VALUES
+        gain = [values[board[end >> 3][end & 7].upper()] if move & CAPTURE_FLAG else 0]
+        attacker = values[piece.upper()]
+        promotion = (move >> PROMOTION_SHIFT) & 7
+        if promotion:
+            attacker = values[PROMOTION_PIECES[promotion]]
+            gain[0] += attacker - 1
+        knights = {True: 0, False: 0}
+        for r, c in KNIGHT_ATTACKS[end]:
+            if board[r][c] in ("N", "n") and r * 8 + c != start:
+                knights[board[r][c] == "N"] += 1
+        #Each ray holds its attackers nearest last, so the one that may capture next is always at the end.
+        rays = []
+        for ray_table, sliders in ((ROOK_RAYS, "RQ"), (BISHOP_RAYS, "BQ")):
+            for ray in ray_table[end]:
+                attackers = []
+                for distance, (r, c) in enumerate(ray):
+                    other = board[r][c]
+                    if other == " " or r * 8 + c == start:
+                        continue
+                    kind = other.upper()
+                    #A pawn attacks diagonally forwards, so a white one from the row below the square.
+                    pawn = kind == "P" and sliders == "BQ" and (r > end >> 3) == other.isupper()
+                    if kind not in sliders and (distance or not (pawn or kind == "K")):
+                        break
+                    attackers.append((values[kind], other.isupper()))
+                if attackers:
+                    rays.append(attackers[::-1])
+        side = not piece.isupper()
+        depth = 0
+        while True:
+            depth += 1
+            #The gain if the piece that just captured is taken in turn.
+            gain.append(attacker - gain[depth - 1])
+            best = values["N"] if knights[side] else None
+            best_ray = None
+            for ray in rays:
+                if ray and ray[-1][1] == side and (best is None or ray[-1][0] < best):
+                    best, best_ray = ray[-1][0], ray
+            if best is None:
+                break
+            if best_ray is None:
+                knights[side] -= 1
+            else:
+                best_ray.pop()
+            attacker = best
+            side = not side
+        #Going back through the exchange, each side takes the last capture only if it does not lose by it.
+        for i in range(depth - 1, 0, -1):
+            gain[i - 1] = -max(-gain[i - 1], gain[i])
+        return gain[0]
+
+    def losesMaterial(self, move):
+        """
+        Tells if a capture or promotion loses material by static exchange evaluation. Capturing a piece that is
+        worth at least as much as the capturing one cannot lose, so the exchange is only evaluated for the rest.
+
+        Args:
+            move (int): The encoded move, made by the player in turn.
 
-    def allPseudoLegalMoves(self):
+        Returns:
+            bool: True if the exchange on the end square loses material.
         """
-        Generate all pseudo-legal moves for the current player,
-        but for king moves, *do not* check castling or call underAttack().
-        This is used for checking squares under attack to avoid recursion.
+        if not move & PROMOTION_MASK:
+            start, end = move & 63, (move >> 6) & 63
+            board = self.board
+            if self.PIECE_VALUES[board[end >> 3][end & 7].upper()] >= self.PIECE_VALUES[board[start >> 3][start & 7].upper()]:
+                return False
+        return self.staticExchange(move) < 0
+
+    def possibleMoves(self, kind=ALL_MOVES):
+        """
+        Generates all possible moves for the current player, ignoring checks.
+
+        Args:
+            kind (int): ALL_MOVES, CAPTURES (captures and promotions) or QUIETS (the other moves).
+
+        Returns:
+            list: A list of possible moves encoded as ints.
         """
         moves = []
         for r, row in enumerate(self.board):
             for c, piece in enumerate(row):
                 if self.turn == "white" and piece.isupper():
-                    if piece.upper() == 'K':
-                        # King moves without castling and without underAttack checks
-                        self.getKingPseudoMovesNoCheck(r, c, moves)
-                    else:
-                        self.pieceMoves[piece.upper()](r, c, moves)
+                    self.pieceMoves[piece](r, c, moves, kind)
                 elif self.turn == "black" and piece.islower():
-                    if piece.upper() == 'K':
-                        self.getKingPseudoMovesNoCheck(r, c, moves)
-                    else:
-                        self.pieceMoves[piece.upper()](r, c, moves)
+                    self.pieceMoves[piece.upper()](r, c, moves, kind)
         return moves
 
-    def getKingPseudoMovesNoCheck(self, r, c, moves):
-        """
-        Generate king moves for underAttack without castling and without recursive underAttack calls.
-        """
-        rowMoves = (-1, -1, -1, 0, 0, 1, 1, 1)
-        colMoves = (-1, 0, 1, -1, 1, -1, 0, 1)
-        for i in range(8):
-            endRow = r + rowMoves[i]
-            endCol = c + colMoves[i]
-            if 0 <= endRow < 8 and 0 <= endCol < 8:
-                endPiece = self.board[endRow][endCol]
-                if endPiece == " " or (self.turn == "white" and endPiece.islower()) or (self.turn == "black" and endPiece.isupper()):
-                    moves.append(Move((r, c), (endRow, endCol), self.board))
-
-    def getPawnMoves(self, r, c, moves):
+    def getPawnMoves(self, r, c, moves, kind=ALL_MOVES):
         """
         Generates all possible pawn moves, including promotions but not en passant.
 
@@ -750,6 +2262,7 @@ class ChessEngine: # pylint: disable=C0302
             r (int): Row of the pawn.
             c (int): Column of the pawn.
             moves (list): List to append valid moves for a pawn.
+            kind (int): ALL_MOVES, CAPTURES or QUIETS.
         """
         piecePinned = False
         pinDirection = ()
@@ -760,67 +2273,71 @@ class ChessEngine: # pylint: disable=C0302
                 self.pins.remove(self.pins[i])
                 break
 
-        promotion_pieces = ["Q", "R", "N", "B"] if self.turn == "white" else ["q", "r", "n", "b"]
-
+        start = r * 8 + c
         # White pawn moves
         if self.turn == "white":
             if self.board[r - 1][c] == " " and (not piecePinned or pinDirection == (-1, 0)):
-                if r-1==0:
-                    for piece in promotion_pieces:
-                        moves.append(Move((r, c), (r-1, c), self.board, promotionChoice=piece))
-                else:
-                    moves.append(Move((r, c), (r - 1, c), self.board))
+                if r - 1 == 0:
+                    if kind != QUIETS:
+                        for promotion in PROMOTION_ORDER:
+                            moves.append(start | (start - 8) << 6 | promotion)
+                elif kind != CAPTURES:
+                    moves.append(start | (start - 8) << 6)
                     if r == 6 and self.board[r - 2][c] == " ":
-                        moves.append(Move((r, c), (r - 2, c), self.board))
+                        moves.append(start | (start - 16) << 6)
 
+            if kind == QUIETS:
+                return
             if c - 1 >= 0 and self.board[r - 1][c - 1].islower() and (
                 not piecePinned or pinDirection == (-1, -1)
             ):
                 if r - 1 == 0:
-                    for piece in promotion_pieces:
-                        moves.append(Move((r, c), (r-1, c-1), self.board, promotionChoice=piece))
+                    for promotion in PROMOTION_ORDER:
+                        moves.append(start | (start - 9) << 6 | promotion | CAPTURE_FLAG)
                 else:
-                    moves.append(Move((r, c), (r - 1, c - 1), self.board))
+                    moves.append(start | (start - 9) << 6 | CAPTURE_FLAG)
             if c + 1 <= 7 and self.board[r - 1][c + 1].islower() and (
                 not piecePinned or pinDirection == (-1, 1)
             ):
                 if r - 1 == 0:
-                    for piece in promotion_pieces:
-                        moves.append(Move((r, c), (r - 1, c + 1), self.board, promotionChoice=piece))
+                    for promotion in PROMOTION_ORDER:
+                        moves.append(start | (start - 7) << 6 | promotion | CAPTURE_FLAG)
                 else:
-                    moves.append(Move((r, c), (r - 1, c + 1), self.board))
+                    moves.append(start | (start - 7) << 6 | CAPTURE_FLAG)
 
         # Black pawn moves
         else:
             if self.board[r + 1][c] == " " and (not piecePinned or pinDirection == (1, 0)):
                 if r + 1 == 7:
-                    for piece in promotion_pieces:
-                        moves.append(Move((r, c), (r + 1, c), self.board, promotionChoice=piece))
-                else:
-                    moves.append(Move((r, c), (r + 1, c), self.board))
+                    if kind != QUIETS:
+                        for promotion in PROMOTION_ORDER:
+                            moves.append(start | (start + 8) << 6 | promotion)
+                elif kind != CAPTURES:
+                    moves.append(start | (start + 8) << 6)
                     if r == 1 and self.board[r + 2][c] == " ":
-                        moves.append(Move((r, c), (r + 2, c), self.board))
+                        moves.append(start | (start + 16) << 6)
 
+            if kind == QUIETS:
+                return
             if c - 1 >= 0 and self.board[r + 1][c - 1].isupper() and (
                 not piecePinned or pinDirection == (1, -1)
             ):
                 if r + 1 == 7:
-                    for piece in promotion_pieces:
-                        moves.append(Move((r, c), (r + 1, c - 1), self.board, promotionChoice=piece))
+                    for promotion in PROMOTION_ORDER:
+                        moves.append(start | (start + 7) << 6 | promotion | CAPTURE_FLAG)
                 else:
-                    moves.append(Move((r, c), (r + 1, c - 1), self.board))
+                    moves.append(start | (start + 7) << 6 | CAPTURE_FLAG)
 
             if c + 1 <= 7 and self.board[r + 1][c + 1].isupper() and (
                 not piecePinned or pinDirection == (1, 1)
             ):
                 if r + 1 == 7:
-                    for piece in promotion_pieces:
-                        moves.append(Move((r, c), (r + 1, c + 1), self.board, promotionChoice=piece))
+                    for promotion in PROMOTION_ORDER:
+                        moves.append(start | (start + 9) << 6 | promotion | CAPTURE_FLAG)
                 else:
-                    moves.append(Move((r, c), (r + 1, c + 1), self.board))
-
+                    moves.append(start | (start + 9) << 6 | CAPTURE_FLAG)
 
-    def getRookMoves(self, r, c, moves):
+    def getRookMoves(self, r, c, moves, kind=ALL_MOVES):
         """
         Generates all possible rook moves.
 
@@ -828,6 +2345,7 @@ class ChessEngine: # pylint: disable=C0302
             r (int): Row of the rook.
             c (int): Column of the rook.
             moves (list): List to append valid rook moves.
+            kind (int): ALL_MOVES, CAPTURES or QUIETS.
         """
         piecePinned = False
         pinDirection = ()
@@ -837,27 +2355,31 @@ class ChessEngine: # pylint: disable=C0302
                 pinDirection = (self.pins[i][2], self.pins[i][3])
                 break
 
+        start = r * 8 + c
         directions = ((-1, 0), (0, -1), (1, 0), (0, 1))
         for d in directions:
+            if piecePinned and pinDirection != d and pinDirection != (-d[0], -d[1]):
+                continue
             for i in range(1, 8):
                 endRow = r + d[0] * i
                 endCol = c + d[1] * i
                 if 0 <= endRow < 8 and 0 <= endCol < 8:
-                    if not piecePinned or pinDirection == d or pinDirection == (-d[0], -d[1]):
-                        endPiece = self.board[endRow][endCol]
-                        if endPiece == " ":
-                            moves.append(Move((r, c), (endRow, endCol), self.board))
-                        elif (self.turn == "white" and endPiece.islower()) or (
-                            self.turn == "black" and endPiece.isupper()
-                        ):
-                            moves.append(Move((r, c), (endRow, endCol), self.board))
-                            break
-                        else:
-                            break
+                    endPiece = self.board[endRow][endCol]
+                    if endPiece == " ":
+                        if kind != CAPTURES:
+                            moves.append(start | (endRow * 8 + endCol) << 6)
+                    elif (self.turn == "white" and endPiece.islower()) or (
+                        self.turn == "black" and endPiece.isupper()
+                    ):
+                        if kind != QUIETS:
+                            moves.append(start | (endRow * 8 + endCol) << 6 | CAPTURE_FLAG)
+                        break
+                    else:
+                        break
                 else:
                     break
 
-    def getKnightMoves(self, r, c, moves):
+    def getKnightMoves(self, r, c, moves, kind=ALL_MOVES):
         """
         Generates all possible knight moves.
 
@@ -865,28 +2387,23 @@ class ChessEngine: # pylint: disable=C0302
             r (int): Row of the knight.
             c (int): Column of the knight.
             moves (list): List to append valid knight moves.
+            kind (int): ALL_MOVES, CAPTURES or QUIETS.
         """
-        piecePinned = False
-        for i in range(len(self.pins) - 1, -1, -1):
-            if self.pins[i][0] == r and self.pins[i][1] == c:
-                piecePinned = True
-                break
-
-        knightMoves = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
-        for m in knightMoves:
-            endRow = r + m[0]
-            endCol = c + m[1]
-            if 0 <= endRow < 8 and 0 <= endCol < 8:
-                endPiece = self.board[endRow][endCol]
-                if not piecePinned and (
-                    endPiece == " " or
-                    (self.turn == "white" and endPiece.islower()) or
-                    (self.turn == "black" and endPiece.isupper())
-                ):
-                    moves.append(Move((r, c), (endRow, endCol), self.board))
-
-
-    def getBishopMoves(self, r, c, moves):
+        for pin in self.pins:
+            if pin[0] == r and pin[1] == c:
+                return
+
+        start = r * 8 + c
+        for endRow, endCol in KNIGHT_ATTACKS[start]:
+            endPiece = self.board[endRow][endCol]
+            if endPiece == " ":
+                if kind != CAPTURES:
+                    moves.append(start | (endRow * 8 + endCol) << 6)
+            elif (self.turn == "white" and endPiece.islower()) or (self.turn == "black" and endPiece.isupper()):
+                if kind != QUIETS:
+                    moves.append(start | (endRow * 8 + endCol) << 6 | CAPTURE_FLAG)
+
+    def getBishopMoves(self, r, c, moves, kind=ALL_MOVES):
         """
         Generates all possible bishop moves.
 
@@ -894,6 +2411,7 @@ class ChessEngine: # pylint: disable=C0302
             r (int): Row of the bishop.
             c (int): Column of the bishop.
             moves (list): List to append valid bishop moves.
+            kind (int): ALL_MOVES, CAPTURES or QUIETS.
         """
         piecePinned = False
         pinDirection = ()
@@ -902,28 +2420,32 @@ class ChessEngine: # pylint: disable=C0302
                 piecePinned = True
                 pinDirection = (self.pins[i][2], self.pins[i][3])
                 break
+
+        start = r * 8 + c
         directions = ((-1, -1), (-1, 1), (1, -1), (1, 1))
         for d in directions:
+            if piecePinned and pinDirection != d and pinDirection != (-d[0], -d[1]):
+                continue
             for i in range(1, 8):
                 endRow = r + d[0] * i
                 endCol = c + d[1] * i
                 if 0 <= endRow < 8 and 0 <= endCol < 8:
-                    if not piecePinned or pinDirection == d or pinDirection == (-d[0], -d[1]):
-                        endPiece = self.board[endRow][endCol]
-                        if endPiece == " ":
-                            moves.append(Move((r, c), (endRow, endCol), self.board))
-                        elif (self.turn == "white" and endPiece.islower()) or (
-                            self.turn == "black" and endPiece.isupper()
-                        ):
-                            moves.append(Move((r, c), (endRow, endCol), self.board))
-                            break
-                        else:
-                            break
+                    endPiece = self.board[endRow][endCol]
+                    if endPiece == " ":
+                        if kind != CAPTURES:
+                            moves.append(start | (endRow * 8 + endCol) << 6)
+                    elif (self.turn == "white" and endPiece.islower()) or (
+                        self.turn == "black" and endPiece.isupper()
+                    ):
+                        if kind != QUIETS:
+                            moves.append(start | (endRow * 8 + endCol) << 6 | CAPTURE_FLAG)
+                        break
+                    else:
+                        break
                 else:
                     break
 
-
-    def getQueenMoves(self, r, c, moves):
+    def getQueenMoves(self, r, c, moves, kind=ALL_MOVES):
         """
         Generates all possible queen moves by combining rook and bishop moves.
 
@@ -931,12 +2453,13 @@ class ChessEngine: # pylint: disable=C0302
             r (int): Row of the queen.
             c (int): Column of the queen.
             moves (list): List to append valid queen moves.
+            kind (int): ALL_MOVES, CAPTURES or QUIETS.
         """
-        self.getRookMoves(r, c, moves)
-        self.getBishopMoves(r, c, moves)
+        self.getRookMoves(r, c, moves, kind)
+        self.getBishopMoves(r, c, moves, kind)
 
 
-    def getKingMoves(self, r, c, moves): # pylint: disable=R0915
+    def getKingMoves(self, r, c, moves, kind=ALL_MOVES):
         """
         Generates all possible king moves, including castling.
 
@@ -944,76 +2467,45 @@ class ChessEngine: # pylint: disable=C0302
             r (int): Row of the king.
             c (int): Column of the king.
             moves (list): List to append valid king moves.
+            kind (int): ALL_MOVES, CAPTURES or QUIETS.
         """
-        rowMoves = (-1, -1, -1, 0, 0, 1, 1, 1)
-        colMoves = (-1, 0, 1, -1, 1, -1, 0, 1)
-        for i in range(8):
-            endRow = r + rowMoves[i]
-            endCol = c + colMoves[i]
-            if 0 <= endRow < 8 and 0 <= endCol < 8:
-                endPiece = self.board[endRow][endCol]
-                if endPiece == " " or (
-                    self.turn == "white" and endPiece.islower() or
-                    self.turn == "black" and endPiece.isupper()
-                ):
-                    originalKingLoc = (
-                        self.wKingLocation if self.turn == "white" else self.bKingLocation
-                    )
-                    if self.turn == "white":
-                        self.wKingLocation = (endRow, endCol)
-                    else:
-                        self.bKingLocation = (endRow, endCol)
-                    inCheck = self.pinsAndChecks()[0]
-                    if not inCheck:
-                        moves.append(Move((r, c), (endRow, endCol), self.board))
-                    if self.turn == "white":
-                        self.wKingLocation = originalKingLoc
-                    else:
-                        self.bKingLocation = originalKingLoc
+        start = r * 8 + c
+        #The king is lifted off the board while its targets are tested, so it does not block a ray through its square.
+        king = self.board[r][c]
+        self.board[r][c] = " "
+        for endRow, endCol in KING_ATTACKS[start]:
+            endPiece = self.board[endRow][endCol]
+            isCapture = endPiece != " "
+            if kind == (QUIETS if isCapture else CAPTURES):
+                continue
+            if not isCapture or (
+                self.turn == "white" and endPiece.islower() or
+                self.turn == "black" and endPiece.isupper()
+            ):
+                if not self.isSquareAttacked(endRow, endCol, self.turn == "black"):
+                    moves.append(start | (endRow * 8 + endCol) << 6 | (CAPTURE_FLAG if isCapture else 0))
+        self.board[r][c] = king
+        if kind == CAPTURES:
+            return
         if self.turn == "white" and not self.check:
             if self.whiteCastleKingside and self.board[7][7] == "R":
                 if self.board[7][5] == " " and self.board[7][6] == " ":
                     if not self.underAttack(7, 4) and not self.underAttack(7, 5) and not self.underAttack(7, 6):
-                        move = Move((7, 4), (7, 6), self.board)
-                        move.isCastle = True
-                        move.rookStart = (7, 7)
-                        move.rookEnd = (7, 5)
-                        move.rookMoved = "R"
-                        move.rookCaptured = " "
-                        moves.append(move)
+                        moves.append(60 | 62 << 6 | CASTLE_FLAG)
             if self.whiteCastleQueenside and self.board[7][0] == "R":
                 if self.board[7][1] == " " and self.board[7][2] == " " and self.board[7][3] == " ":
                     if not self.underAttack(7, 4) and not self.underAttack(7, 3) and not self.underAttack(7, 2):
-                        move = Move((7, 4), (7, 2), self.board)
-                        move.isCastle = True
-                        move.rookStart = (7, 0)
-                        move.rookEnd = (7, 3)
-                        move.rookMoved = "R"
-                        move.rookCaptured = " "
-                        moves.append(move)
+                        moves.append(60 | 58 << 6 | CASTLE_FLAG)
 
         elif self.turn == "black" and not self.check:
             if self.blackCastleKingside and self.board[0][7] == "r":
                 if self.board[0][5] == " " and self.board[0][6] == " ":
                     if not self.underAttack(0, 4) and not self.underAttack(0, 5) and not self.underAttack(0, 6):
-                        move = Move((0, 4), (0, 6), self.board)
-                        move.isCastle = True
-                        move.rookStart = (0, 7)
-                        move.rookEnd = (0, 5)
-                        move.rookMoved = "r"
-                        move.rookCaptured = " "
-                        moves.append(move)
+                        moves.append(4 | 6 << 6 | CASTLE_FLAG)
             if self.blackCastleQueenside and self.board[0][0] == "r":
                 if self.board[0][1] == " " and self.board[0][2] == " " and self.board[0][3] == " ":
                     if not self.underAttack(0, 4) and not self.underAttack(0, 3) and not self.underAttack(0, 2):
-                        move = Move((0, 4), (0, 2), self.board)
-                        move.isCastle = True
-                        move.rookStart = (0, 0)
-                        move.rookEnd = (0, 3)
-                        move.rookMoved = "r"
-                        move.rookCaptured = " "
-                        moves.append(move)
-
+                        moves.append(4 | 2 << 6 | CASTLE_FLAG)
 
 class Move:
     """Represents a chess move with start and end positions, capturing, and special move flags."""
@@ -1071,6 +2563,41 @@ class Move:
             return self.moveID == other.moveID
         return False
 
+    def encode(self):
+        """
+        Encodes the move as an int in the format used inside the search.
+
+        Returns:
+            int: The encoded move.
+        """
+        move = self.startRow * 8 + self.startCol | (self.endRow * 8 + self.endCol) << 6
+        if self.promotionChoice:
+            move |= PROMOTION_PIECES.index(self.promotionChoice.upper()) << PROMOTION_SHIFT
+        if self.isCastle:
+            move |= CASTLE_FLAG
+        if self.pieceCaptured != " ":
+            move |= CAPTURE_FLAG
+        return move
+
+    @classmethod
+    def fromCode(cls, move, board):
+        """
+        Creates a Move object from an encoded move.
+
+        Args:
+            move (int): The encoded move.
+            board (list): The board the move is made on.
+
+        Returns:
+            Move: The move with the pieces read from the board.
+        """
+        start = move & 63
+        end = (move >> 6) & 63
+        promotion = PROMOTION_PIECES[(move >> PROMOTION_SHIFT) & 7]
+        if promotion and board[start >> 3][start & 7].islower():
+            promotion = promotion.lower()
+        return cls((start >> 3, start & 7), (end >> 3, end & 7), board, promotionChoice=promotion or None)
+
     def getUCI(self):
         """
         Converts the move to UCI notation.
@@ -1104,28 +2631,193 @@ class Move:
         return self.getUCI()
 
 
+def createEngine(backend="mailbox", hashSizeMB=TranspositionTable.DEFAULT_SIZE_MB):
+    """
+    Creates an engine with the chosen board representation. Both have the same API and play the same moves.
+
+    Args:
+        backend (str): "mailbox" for the 8x8 list board, "bitboard" for move generation from bitboards.
+        hashSizeMB (int): Size of the transposition table in megabytes.
+
+    Returns:
+        ChessEngine: The engine.
+
+    Raises:
+        ValueError: If the backend is unknown.
+    """
+    if backend == "mailbox":
+        return ChessEngine(hashSizeMB)
+    if backend == "bitboard":
+        from bitboard import BitboardEngine # pylint: disable=import-outside-toplevel
+        return BitboardEngine(hashSizeMB)
+    raise ValueError(f"Unknown backend: {backend}")
+
+class Ponder:
+    """
+    Searches on the opponent's time. After the engine has moved, the expected reply (the best move stored in the
+    transposition table for the new position) is made and the position after it is searched on a background
+    thread until the opponent's move arrives. The search fills the transposition table and move ordering tables.
+    On a hit the position is already on the board and resume holds the best move, depth and score of the
+    iterations the ponder search completed, so bestMove given it continues from the next depth. On a miss the
+    expected reply is taken back and the result is discarded. If there is no expected reply, the position itself
+    is searched.
+    """
+    def __init__(self, engine):
+        """
+        Args:
+            engine (ChessEngine): The engine to ponder with. Its stopFlag is used to stop the ponder search.
+        """
+        self.engine = engine
+        self.stopFlag = multiprocessing.RawValue("b", 0)
+        engine.stopFlag = self.stopFlag
+        self.thread = None
+        #The reply the ponder search assumes, made on the board while pondering, or None.
+        self.expectedMove = None
+        #Best move and completed depth of the last ponder search.
+        self.result = None
+        self.depth = 0
+        #The resume argument of bestMove after a ponder hit, None otherwise.
+        self.resume = None
+        self.hits = 0
+        self.misses = 0
+
+    def isRunning(self):
+        """
+        Returns:
+            bool: True if a ponder search has been started and not stopped yet.
+        """
+        return self.thread is not None
+
+    def start(self):
+        """
+        Starts pondering on the engine's current position, the opponent being in turn.
+        """
+        self.cancel()
+        engine = self.engine
+        engine.syncState()
+        entry = engine.tt.probe(engine.zobristKey)
+        legal_moves = engine.legalMoves()
+        if not legal_moves:
+            return
+        self.expectedMove = entry[4] if entry is not None and entry[4] in legal_moves else None
+        if self.expectedMove is not None:
+            engine.doMove(self.expectedMove)
+        self.result = None
+        self.depth = 0
+        self.resume = None
+        self.stopFlag.value = 0
+        self.thread = threading.Thread(target=self.search, daemon=True)
+        self.thread.start()
+
+    def search(self):
+        """
+        The ponder search, run on the background thread until it is stopped.
+        """
+        self.result = self.engine.bestMove(MAX_SEARCH_DEPTH, timeLimit=math.inf, nodeLimit=math.inf)
+        self.depth = self.engine.completedDepth
+
+    def stop(self):
+        """
+        Stops the ponder search and waits for it to unwind.
+        """
+        if self.thread is not None:
+            self.stopFlag.value = 1
+            self.thread.join()
+            self.stopFlag.value = 0
+            self.thread = None
+
+    def opponentMoved(self, moveUci):
+        """
+        Stops pondering when the opponent's move arrives and makes the move on the board.
+
+        Args:
+            moveUci (str): The opponent's move in UCI notation.
+
+        Returns:
+            bool: True if the move was the expected reply.
+        """
+        self.stop()
+        expected = self.expectedMove
+        self.expectedMove = None
+        if expected is not None and moveToUCI(expected) == moveUci:
+            self.hits += 1
+            engine = self.engine
+            self.resume = (engine.zobristKey, engine.rootMove, engine.completedDepth, engine.rootScore)
+            return True
+        if expected is not None:
+            self.engine.undoMove()
+        self.misses += 1
+        self.result = None
+        self.engine.handleMove(moveUci)
+        return False
+
+    def cancel(self):
+        """
+        Stops pondering and takes back the expected reply, used when the position is changed some other way.
+        """
+        self.stop()
+        if self.expectedMove is not None:
+            self.engine.undoMove()
+            self.expectedMove = None
+        self.result = None
+        self.resume = None
+
+
+#Upper limit for iterative deepening when the search is only limited by time.
+MAX_SEARCH_DEPTH = 64
+#Thinking time per move in seconds when the PLAY: command does not give one.
+DEFAULT_MOVE_TIME = 2.0
+#Think on the opponent's time between MOVE: replies and the next PLAY:.
+PONDERING = True
+#Opening book the main loop plays from when the file exists, built with python src/book.py build.
+OPENING_BOOK = os.path.join(os.path.dirname(os.path.abspath(__file__)), "book.bin")
+
 def main():
     """
     The main function is used for interaction between the AI platform.
     Code is copied from the example code from stupid-chess-ai: https://github.com/game-ai-platform-team/stupid-chess-ai/tree/main.
     """
     ai = ChessEngine()
+    ai.moveTime = DEFAULT_MOVE_TIME
+    if os.path.exists(OPENING_BOOK):
+        from book import OpeningBook # pylint: disable=import-outside-toplevel
+        ai.book = OpeningBook(OPENING_BOOK)
+    ponder = Ponder(ai)
 
     while True:
         command = input()
+        if command.strip() == "uci":
+            #Chess GUIs and tournament managers speak UCI, which is handled by uci.py from here on.
+            from uci import UCI # pylint: disable=import-outside-toplevel
+            front_end = UCI()
+            front_end.handleCommand(command)
+            front_end.run()
+            return
         time.sleep(random.randrange(1, 10) / 100)
+        if command.startswith("MOVE:"):
+            move = command.removeprefix("MOVE:")
+            if ponder.isRunning():
+                ponder.opponentMoved(move)
+            else:
+                ai.handleMove(move)
+            continue
+        resume = ponder.resume
+        ponder.cancel()
         if command.startswith("BOARD:"):
             ai.setBoard(command.removeprefix("BOARD:"))
         elif command.startswith("PLAY:"):
-            best_move = ai.bestMove(depth=3)
+            #An optional budget in milliseconds can be given, eg. PLAY:500
+            budget = command.removeprefix("PLAY:").strip()
+            time_limit = int(budget) / 1000 if budget.isdigit() else None
+            #After a ponder hit the search continues from the iterations completed while pondering.
+            best_move = ai.bestMove(depth=MAX_SEARCH_DEPTH, timeLimit=time_limit, resume=resume)
             if best_move is not None:
                 ai.makeMove(best_move)
                 print(f"MOVE:{best_move.getUCI()}")
+                if PONDERING:
+                    ponder.start()
             else:
                 print("No valid moves!")
-        elif command.startswith("MOVE:"):
-            move = command.removeprefix("MOVE:")
-            ai.handleMove(move)
         elif command.startswith("RESET:"):
             ai.resetBoard()
         else:
@@ -0,0 +1,577 @@
+import argparse
+import math
+import multiprocessing
+import os
+import pickle
+import struct
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+from chessengine import MAX_SEARCH_DEPTH, SearchTimeout, TranspositionTable, createEngine
+
+#Engine options copied to the workers, so that they prune and reduce the same way as the calling engine.
+SEARCH_OPTIONS = ("nullMove", "nullMoveReduction", "lateMoveReductions", "lmrMinDepth", "lmrMinMoves",
+                  "futilityPruning", "razoring")
+#Default position of the speed-up report, Kiwipete has many root moves with subtrees of similar size.
+DEFAULT_FEN = "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1"
+
+#Entries of the shared transposition table are three 64-bit words: check, score and info (see SharedTranspositionTable).
+ENTRY_WORDS = struct.Struct("<QQQ")
+SCORE_BITS = struct.Struct("<d")
+WORD_BITS = struct.Struct("<Q")
+#The age of the current search is kept in a header word before the entries.
+HEADER_BYTES = 8
+
+#State of a worker process: its own engine, the root it was seeded from and the search state it was last given.
+_worker = {}
+
+
+class SharedTranspositionTable:
+    """
+    A transposition table in multiprocessing.shared_memory that several processes read and write without locks.
+    It has the same probe/store interface and replacement rules as TranspositionTable.
+
+    Each entry is three words: the score as float bits, an info word packing the move, depth, flag and age, and a
+    check word that is the key XOR the other two. A probe only accepts an entry whose words XOR back to the key,
+    so an entry torn by two processes writing it at the same time reads as a miss instead of a wrong result.
+    """
+    MOVE_BITS = 17
+    DEPTH_SHIFT = 17
+    FLAG_SHIFT = 25
+    AGE_SHIFT = 27
+    ENTRY_BYTES = ENTRY_WORDS.size
+
+    def __init__(self, sizeMB=TranspositionTable.DEFAULT_SIZE_MB, name=None):
+        """
+        Creates a table, or attaches to the table of another process.
+
+        Args:
+            sizeMB (int): Memory used by the entries in megabytes, must be the same in all processes.
+            name (str): Name of the shared memory block to attach to, None creates a new one.
+        """
+        self.size = max(1, int(sizeMB * 1024 * 1024) // self.ENTRY_BYTES)
+        self.owner = name is None
+        length = HEADER_BYTES + self.size * self.ENTRY_BYTES
+        self.memory = shared_memory.SharedMemory(name=name, create=self.owner, size=length if self.owner else 0)
+        self.name = self.memory.name
+        self.age = 0
+        if self.owner:
+            self.clear()
+
+    def close(self):
+        """
+        Detaches from the shared memory. The process that created the table also frees it.
+        """
+        self.memory.close()
+        if self.owner:
+            self.memory.unlink()
+
+    def clear(self):
+        """
+        Removes all entries from the table and resets the age.
+        """
+        length = HEADER_BYTES + self.size * self.ENTRY_BYTES
+        self.memory.buf[:length] = bytes(length)
+        self.age = 0
+
+    def advanceAge(self):
+        """
+        Starts a new search for all processes using the table. Called once per search by the process running it.
+        """
+        age = (WORD_BITS.unpack_from(self.memory.buf, 0)[0] + 1) & 0xFFFF
+        WORD_BITS.pack_into(self.memory.buf, 0, age)
+
+    def newSearch(self):
+        """
+        Reads the age of the current search from the shared header, so entries of earlier searches can be replaced
+        first. Called by ChessEngine.bestMove in every process.
+        """
+        self.age = WORD_BITS.unpack_from(self.memory.buf, 0)[0]
+
+    def probe(self, key):
+        """
+        Looks up the entry of a position.
+
+        Args:
+            key (int): Zobrist key of the position.
+
+        Returns:
+            tuple: (key, depth, flag, score, move, age) or None if the position is not in the table.
+        """
+        check, scoreBits, info = ENTRY_WORDS.unpack_from(self.memory.buf, HEADER_BYTES + (key % self.size) * self.ENTRY_BYTES)
+        if check ^ scoreBits ^ info != key or not info:
+            return None
+        move = info & ((1 << self.MOVE_BITS) - 1)
+        score = SCORE_BITS.unpack(WORD_BITS.pack(scoreBits))[0]
+        return (key, (info >> self.DEPTH_SHIFT) & 0xFF, (info >> self.FLAG_SHIFT) & 3, score, move or None,
+                info >> self.AGE_SHIFT)
+
+    def store(self, key, depth, flag, score, move):
+        """
+        Stores a search result using depth-preferred replacement.
+
+        Args:
+            key (int): Zobrist key of the position.
+            depth (int): The depth the position was searched to.
+            flag (int): EXACT, LOWERBOUND or UPPERBOUND.
+            score (float): The score found by the search.
+            move (int): The best move found as an encoded move or None.
+        """
+        offset = HEADER_BYTES + (key % self.size) * self.ENTRY_BYTES
+        check, oldScoreBits, oldInfo = ENTRY_WORDS.unpack_from(self.memory.buf, offset)
+        sameKey = check ^ oldScoreBits ^ oldInfo == key
+        if (oldInfo and not sameKey and oldInfo >> self.AGE_SHIFT == self.age
+                and depth < (oldInfo >> self.DEPTH_SHIFT) & 0xFF):
+            return
+        if move is None and sameKey:
+            move = oldInfo & ((1 << self.MOVE_BITS) - 1)
+        info = (move or 0) | min(depth, 0xFF) << self.DEPTH_SHIFT | flag << self.FLAG_SHIFT | self.age << self.AGE_SHIFT
+        scoreBits = WORD_BITS.unpack(SCORE_BITS.pack(score))[0]
+        ENTRY_WORDS.pack_into(self.memory.buf, offset, key ^ scoreBits ^ info, scoreBits, info)
+
+
+def _initWorker(backend):
+    """
+    Creates the engine of a worker process. Called once when the process starts.
+
+    Args:
+        backend (str): Board representation of the engine.
+    """
+    #The engine's own table is replaced by a copy of the calling engine's, so it is created as small as possible.
+    _worker["engine"] = createEngine(backend, 0)
+    _worker["engine"].verbose = False
+    _worker["root"] = None
+    _worker["state"] = (None, None)
+
+
+def _initHelper(tableName, hashSizeMB, stopFlag, backend):
+    """
+    Creates the engine of a Lazy SMP helper process, using the shared transposition table and stop flag.
+
+    Args:
+        tableName (str): Name of the shared memory block of the table.
+        hashSizeMB (int): Size of the shared table in megabytes.
+        stopFlag (multiprocessing.RawValue): Set by the main process when the search is over.
+        backend (str): Board representation of the engine.
+    """
+    #The engine's own table is replaced by the shared one, so it is created as small as possible.
+    engine = createEngine(backend, 0)
+    engine.tt = SharedTranspositionTable(hashSizeMB, name=tableName)
+    engine.stopFlag = stopFlag
+    engine.verbose = False
+    _worker["engine"] = engine
+    _worker["root"] = None
+
+
+def _seedRoot(engine, root):
+    """
+    Sets up the root position in a worker engine unless it is already there. Keeping the engine between tasks
+    keeps its transposition table and move ordering tables.
+
+    Args:
+        engine (ChessEngine): The engine of the worker.
+        root (tuple): (fen, score, positionalScore) of the root position. The scores are copied so that they match
+            the incrementally updated ones of the calling engine exactly.
+    """
+    if _worker["root"] != root:
+        engine.setBoard(root[0])
+        engine.score, engine.positionalScore = root[1], root[2]
+        _worker["root"] = root
+
+
+def _loadState(state):
+    """
+    Reads the search state of the calling engine from the file written by ParallelSearch.splitRoot, unless the
+    worker already has it.
+
+    Args:
+        state (tuple): (split, path, tableSize): the number of the split, the file holding the state and the size
+            of the calling engine's table.
+
+    Returns:
+        tuple: (age, entries, killers, history, options) with entries being the full list of table entries.
+    """
+    split, path, tableSize = state
+    if _worker["state"][0] != split:
+        with open(path, "rb") as file:
+            age, stored, killers, history, options = pickle.load(file)
+        entries = [None] * tableSize
+        for index, entry in stored:
+            entries[index] = entry
+        _worker["state"] = (split, (age, entries, killers, history, options))
+    return _worker["state"][1]
+
+
+def _searchRootMove(root, state, move, depth, alpha, beta): # pylint: disable=R0913,R0917
+    """
+    Searches one root move in a worker the way ChessEngine.negamax searches a root move after the first one:
+    with a zero window at alpha, and again with the full window if the move turns out better. The worker starts
+    every move from the calling engine's transposition table and move ordering tables, so the result does not
+    depend on which worker gets the move or what it searched before.
+
+    Args:
+        root (tuple): (fen, score, positionalScore) of the root position.
+        state (tuple): (split, path, tableSize) of the search state, see _loadState.
+        move (int): The encoded root move.
+        depth (int): Depth of the search including the root move.
+        alpha (float): Alpha of the root, from the point of view of the player in turn.
+        beta (float): Beta of the root, from the point of view of the player in turn.
+
+    Returns:
+        tuple: (move, score, nodes), the score from the point of view of the player in turn.
+    """
+    engine = _worker["engine"]
+    _seedRoot(engine, root)
+    age, entries, killers, history, options = _loadState(state)
+    engine.tt.size, engine.tt.entries, engine.tt.age = len(entries), list(entries), age
+    engine.ordering.killers = [list(pair) for pair in killers]
+    engine.ordering.history = list(history)
+    for option, value in options.items():
+        setattr(engine, option, value)
+    engine.nodes = 0
+    engine.qNodes = 0
+    engine.deadline = None
+    engine.nodeLimit = None
+    engine.stopSearch = False
+    engine.doMove(move)
+    try:
+        score = -engine.negamax(depth - 1, -alpha - engine.PVS_WINDOW, -alpha, ply=1)[0]
+        if alpha < score < beta:
+            score = -engine.negamax(depth - 1, -beta, -alpha, ply=1)[0]
+    finally:
+        engine.undoMove()
+    return move, score, engine.nodes + engine.qNodes
+
+
+def _helperSearch(root, depthOffset):
+    """
+    Runs iterative deepening on the root position in a Lazy SMP helper until the stop flag is set. The results
+    only reach the main search through the shared transposition table.
+
+    Args:
+        root (tuple): (fen, score, positionalScore) of the root position.
+        depthOffset (int): Added to the depth of every iteration, so that helpers spread over different depths.
+
+    Returns:
+        int: Number of nodes searched.
+    """
+    engine = _worker["engine"]
+    _seedRoot(engine, root)
+    engine.nodes = 0
+    engine.qNodes = 0
+    engine.deadline = None
+    engine.nodeLimit = None
+    engine.stopSearch = False
+    engine.tt.newSearch()
+    root_ply = len(engine.moves)
+    try:
+        for current_depth in range(1 + depthOffset, MAX_SEARCH_DEPTH + 1):
+            engine.minimax(current_depth, engine.turn == "white")
+    except SearchTimeout:
+        while len(engine.moves) > root_ply:
+            engine.undoMove()
+    return engine.nodes + engine.qNodes
+
+
+class ParallelSearch:
+    """
+    Splits the last iteration of the search over root moves between persistent worker processes.
+
+    The search is ChessEngine.bestMove, so the iterations before the last one, the aspiration windows and the
+    root move order are the same as in the serial search. In the last iteration the root searches the first move
+    itself (young brothers wait), then hands the other moves to the workers together with a copy of its
+    transposition table and move ordering tables, written to a temporary file. Each worker searches its move with the same zero window and
+    re-search as the serial root. The root then goes through the moves in order and uses a worker's score while
+    its alpha is still the one the workers were given; a move after one that raised alpha is searched again
+    by the root. Every score the root uses is searched with the same window as in the serial search and from the
+    tables the serial search has after the first move, so the move and score are those of the serial search.
+    """
+    def __init__(self, workers=None, backend="mailbox"):
+        """
+        Args:
+            workers (int): Number of worker processes, defaults to the number of CPUs.
+            backend (str): Board representation of the worker engines.
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.backend = backend
+        self.executor = None
+        #Nodes searched by the workers in the last search.
+        self.workerNodes = 0
+        #Number of root splits so far, tells the workers when their copy of the search state is out of date.
+        self.splits = 0
+
+    def start(self):
+        """
+        Starts the worker processes, if they are not running yet, and waits until all of them are ready.
+        """
+        if self.executor is not None:
+            return
+        self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_initWorker,
+                                            initargs=(self.backend,))
+        for future in [self.executor.submit(os.getpid) for _ in range(self.workers)]:
+            future.result()
+
+    def close(self):
+        """
+        Stops the worker processes.
+        """
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+
+    def search(self, engine, depth):
+        """
+        Finds the best move of the engine's position at a fixed depth. The engine's time and node budgets are
+        not used.
+
+        Args:
+            engine (ChessEngine): The engine holding the position, it is left in the same position.
+            depth (int): Depth of the search.
+
+        Returns:
+            Move: The best move or None if no valid moves exist.
+        """
+        self.start()
+        self.workerNodes = 0
+
+        def split(splitDepth, alpha, beta, moves):
+            return self.splitRoot(engine, splitDepth, alpha, beta, moves) if splitDepth == depth else {}
+
+        engine.rootSplit = split
+        try:
+            return engine.bestMove(depth, timeLimit=math.inf, nodeLimit=math.inf)
+        finally:
+            engine.rootSplit = None
+
+    def splitRoot(self, engine, depth, alpha, beta, moves): # pylint: disable=R0913,R0917
+        """
+        Searches root moves in the workers, called by the root of ChessEngine.negamax after its first move.
+
+        Args:
+            engine (ChessEngine): The engine at the root, its tables are copied to the workers.
+            depth (int): Depth of the root.
+            alpha (float): Alpha of the root after the first move, from the point of view of the player in turn.
+            beta (float): Beta of the root.
+            moves (list): The encoded root moves after the first one.
+
+        Returns:
+            dict: The score of every move for the window (alpha, beta).
+        """
+        if not moves:
+            return {}
+        stored = [(index, entry) for index, entry in enumerate(engine.tt.entries) if entry is not None]
+        options = {option: getattr(engine, option) for option in SEARCH_OPTIONS}
+        with tempfile.NamedTemporaryFile(suffix=".state", delete=False) as file:
+            pickle.dump((engine.tt.age, stored, engine.ordering.killers, engine.ordering.history, options), file,
+                        pickle.HIGHEST_PROTOCOL)
+        try:
+            root = (engine.getFen(), engine.score, engine.positionalScore)
+            self.splits += 1
+            state = (self.splits, file.name, engine.tt.size)
+            futures = [self.executor.submit(_searchRootMove, root, state, move, depth, alpha, beta) for move in moves]
+            scores = {}
+            for future in futures:
+                move, score, nodes = future.result()
+                scores[move] = score
+                self.workerNodes += nodes
+        finally:
+            os.remove(file.name)
+        return scores
+
+
+class LazySMP:
+    """
+    Lazy SMP search: helper processes search the same root position as the main search, at depths offset by 0 or 1,
+    and share their results only through a SharedTranspositionTable. The main search runs ChessEngine.bestMove
+    as usual and finds more of the tree already in the table, so it gets deeper in the same time. The helpers
+    are stopped when the main search returns. The result depends on timing, so it is not reproducible.
+    """
+    def __init__(self, threads=None, hashSizeMB=TranspositionTable.DEFAULT_SIZE_MB, backend="mailbox"):
+        """
+        Args:
+            threads (int): Number of searching processes including the main one, defaults to the number of CPUs.
+            hashSizeMB (int): Size of the shared transposition table in megabytes.
+            backend (str): Board representation of the helper engines.
+        """
+        self.threads = threads or os.cpu_count() or 1
+        self.hashSizeMB = hashSizeMB
+        self.backend = backend
+        self.table = None
+        self.stopFlag = multiprocessing.RawValue("b", 0)
+        self.executor = None
+        #{"nodes", "mainNodes", "helperNodes", "time", "nps", "depth"} of the last search.
+        self.stats = {}
+
+    def start(self):
+        """
+        Creates the shared table and starts the helper processes, if they are not running yet.
+        """
+        if self.table is None:
+            self.table = SharedTranspositionTable(self.hashSizeMB)
+        if self.executor is None and self.threads > 1:
+            self.executor = ProcessPoolExecutor(max_workers=self.threads - 1, initializer=_initHelper,
+                                                initargs=(self.table.name, self.hashSizeMB, self.stopFlag, self.backend))
+            for future in [self.executor.submit(os.getpid) for _ in range(self.threads - 1)]:
+                future.result()
+
+    def close(self):
+        """
+        Stops the helper processes and frees the shared table.
+        """
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+        if self.table is not None:
+            self.table.close()
+            self.table = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+
+    def search(self, engine, depth=MAX_SEARCH_DEPTH, timeLimit=None, nodeLimit=None):
+        """
+        Finds the best move of the engine's position with the helpers running alongside. The arguments are the
+        same as in ChessEngine.bestMove, the node limit only counts the nodes of the main search.
+
+        Args:
+            engine (ChessEngine): The engine holding the position.
+            depth (int): The maximum search depth.
+            timeLimit (float): Time budget in seconds, defaults to engine.moveTime.
+            nodeLimit (int): Budget of searched nodes, defaults to engine.nodeBudget.
+
+        Returns:
+            Move: The best move or None if no valid moves exist.
+        """
+        self.start()
+        engine.syncState()
+        self.table.advanceAge()
+        self.stopFlag.value = 0
+        root = (engine.getFen(), engine.score, engine.positionalScore)
+        helpers = [self.executor.submit(_helperSearch, root, helper % 2) for helper in range(self.threads - 1)] \
+            if self.executor is not None else []
+        own_table = engine.tt
+        engine.tt = self.table
+        start = time.perf_counter()
+        try:
+            move = engine.bestMove(depth, timeLimit, nodeLimit)
+        finally:
+            engine.tt = own_table
+            self.stopFlag.value = 1
+        helper_nodes = sum(future.result() for future in helpers)
+        elapsed = time.perf_counter() - start
+        main_nodes = engine.nodes + engine.qNodes
+        nodes = main_nodes + helper_nodes
+        self.stats = {"nodes": nodes, "mainNodes": main_nodes, "helperNodes": helper_nodes, "time": elapsed,
+                      "nps": nodes / elapsed if elapsed > 0 else 0.0, "depth": engine.completedDepth}
+        return move
+
+
+def _engineAt(fen):
+    """
+    Returns:
+        ChessEngine: A new engine set to the position without printing it.
+    """
+    engine = createEngine()
+    engine.verbose = False
+    engine.setBoard(fen)
+    return engine
+
+
+def runScaling(fen, depth, workerCounts, out=sys.stdout):
+    """
+    Searches a position serially and with each number of workers, and reports the speed-up over the serial search.
+    Worker processes are started before the clock starts.
+
+    Args:
+        fen (str): The position in FEN.
+        depth (int): Depth of the search.
+        workerCounts (list): Numbers of workers to try.
+        out (file): Where the report is written.
+
+    Returns:
+        list: {"workers": int, "time": float, "speedup": float, "move": str, "match": bool} for every worker count,
+            workers 0 being the serial search.
+    """
+    def timedSearch(search):
+        engine = _engineAt(fen)
+        start = time.perf_counter()
+        move = search(engine)
+        return time.perf_counter() - start, move.getUCI() if move is not None else None
+
+    serial_time, serial_move = timedSearch(lambda engine: engine.bestMove(depth, timeLimit=math.inf, nodeLimit=math.inf))
+    print(f"serial: {serial_time:.3f} s, move {serial_move}", file=out)
+    results = [{"workers": 0, "time": serial_time, "speedup": 1.0, "move": serial_move, "match": True}]
+    for workers in workerCounts:
+        with ParallelSearch(workers) as pool:
+            elapsed, move = timedSearch(lambda engine, pool=pool: pool.search(engine, depth))
+        speedup = serial_time / elapsed if elapsed > 0 else 0.0
+        match = move == serial_move
+        print(f"workers {workers}: {elapsed:.3f} s, speed-up {speedup:.2f}, move {move}"
+              f"{'' if match else ' (DIFFERS FROM SERIAL)'}", file=out)
+        results.append({"workers": workers, "time": elapsed, "speedup": speedup, "move": move, "match": match})
+    return results
+
+
+def runLazySMP(fen, timeLimit, threadCounts, hashSizeMB=TranspositionTable.DEFAULT_SIZE_MB, out=sys.stdout):
+    """
+    Searches a position for a fixed time with each number of threads and reports the depth reached and the nodes
+    per second across all helpers. Helper processes are started before the clock starts.
+
+    Args:
+        fen (str): The position in FEN.
+        timeLimit (float): Time budget of each search in seconds.
+        threadCounts (list): Numbers of threads to try.
+        hashSizeMB (int): Size of the shared transposition table in megabytes.
+        out (file): Where the report is written.
+
+    Returns:
+        list: The stats of LazySMP.search with "threads" and "move" added, for every thread count.
+    """
+    results = []
+    for threads in threadCounts:
+        engine = _engineAt(fen)
+        with LazySMP(threads, hashSizeMB) as smp:
+            move = smp.search(engine, timeLimit=timeLimit)
+        result = dict(smp.stats, threads=threads, move=move.getUCI() if move is not None else None)
+        print(f"threads {threads}: depth {result['depth']}, {result['nodes']} nodes, {result['nps']:.0f} NPS, "
+              f"move {result['move']}", file=out)
+        results.append(result)
+    return results
+
+
+def main():
+    """
+    Command line entry point, eg. python src/parallel.py --depth 4 --workers 1,2,4,8
+    or python src/parallel.py --lazy-smp --time 5 --workers 1,2,4,8
+    """
+    parser = argparse.ArgumentParser(description="Measure the speed-up of the parallel searches.")
+    parser.add_argument("--fen", default=DEFAULT_FEN, help="Position to search (default: Kiwipete)")
+    parser.add_argument("--depth", type=int, default=4, help="Depth of the root split search")
+    parser.add_argument("--workers", default="1,2,4", help="Comma separated numbers of workers or threads to try")
+    parser.add_argument("--lazy-smp", action="store_true", help="Report Lazy SMP depth and NPS instead")
+    parser.add_argument("--time", type=float, default=5.0, help="Time per Lazy SMP search in seconds")
+    parser.add_argument("--hash", type=int, default=TranspositionTable.DEFAULT_SIZE_MB, help="Lazy SMP hash size in MB")
+    args = parser.parse_args()
+    counts = [int(count) for count in args.workers.split(",")]
+    if args.lazy_smp:
+        runLazySMP(args.fen, args.time, counts, args.hash)
+        return
+    results = runScaling(args.fen, args.depth, counts)
+    sys.exit(0 if all(result["match"] for result in results) else 1)
+
+if __name__ == "__main__":
+    main()
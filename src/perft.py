@@ -0,0 +1,148 @@
+import argparse
+import sys
+import time
+
+from chessengine import createEngine, moveToUCI
+
+#Standard perft test positions with their known node counts by depth. The engine has no en passant, so counts
+#are only listed for depths where the published numbers contain no en passant captures, or, when they only
+#happen at the last ply, with those captures subtracted.
+#Source: https://www.chessprogramming.org/Perft_Results
+REFERENCE_POSITIONS = [
+    ("initial", "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+     {1: 20, 2: 400, 3: 8902, 4: 197281}),
+    #2039 nodes at depth 2 include one en passant capture.
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     {1: 48, 2: 2038}),
+    #2812 nodes at depth 3 include two en passant captures.
+    ("position3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+     {1: 14, 2: 191, 3: 2810}),
+    #9467 nodes at depth 3 include four en passant captures.
+    ("position4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+     {1: 6, 2: 264, 3: 9463}),
+    ("position5", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+     {1: 44, 2: 1486, 3: 62379}),
+]
+
+
+def perft(engine, depth):
+    """
+    Counts the leaf nodes of the legal move tree of the current position to the given depth.
+
+    Args:
+        engine (ChessEngine): The engine holding the position.
+        depth (int): Number of plies to walk.
+
+    Returns:
+        int: Number of leaf nodes.
+    """
+    if depth == 0:
+        return 1
+    moves = engine.legalMoves()
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        engine.doMove(move)
+        nodes += perft(engine, depth - 1)
+        engine.undoMove()
+    return nodes
+
+
+def divide(engine, depth):
+    """
+    Counts the perft nodes separately under every root move, used to find the move where a count goes wrong.
+
+    Args:
+        engine (ChessEngine): The engine holding the position.
+        depth (int): Number of plies to walk, including the root move.
+
+    Returns:
+        dict: Node count for each root move in UCI notation.
+    """
+    counts = {}
+    for move in engine.legalMoves():
+        engine.doMove(move)
+        counts[moveToUCI(move)] = perft(engine, depth - 1)
+        engine.undoMove()
+    return counts
+
+
+def runPerft(fen, depth, showDivide=False, out=sys.stdout, backend="mailbox"): # pylint: disable=R0913,R0917
+    """
+    Runs perft on a position and reports the node count, wall time and nodes per second.
+
+    Args:
+        fen (str): The position in FEN.
+        depth (int): Number of plies to walk.
+        showDivide (bool): Also print the node count under every root move.
+        out (file): Where the report is written.
+        backend (str): Board representation of the engine, "mailbox" or "bitboard".
+
+    Returns:
+        dict: {"nodes": int, "time": float, "nps": float}.
+    """
+    engine = createEngine(backend)
+    engine.verbose = False
+    engine.setBoard(fen)
+    start = time.perf_counter()
+    if showDivide:
+        counts = divide(engine, depth)
+        nodes = sum(counts.values())
+    else:
+        nodes = perft(engine, depth)
+    elapsed = time.perf_counter() - start
+    if showDivide:
+        for uci, count in counts.items():
+            print(f"{uci}: {count}", file=out)
+    nps = nodes / elapsed if elapsed > 0 else 0.0
+    print(f"Nodes: {nodes}", file=out)
+    print(f"Time: {elapsed:.3f} s", file=out)
+    print(f"NPS: {nps:.0f}", file=out)
+    return {"nodes": nodes, "time": elapsed, "nps": nps}
+
+
+def runSuite(maxDepth, out=sys.stdout, backend="mailbox"):
+    """
+    Runs perft on all reference positions up to maxDepth and compares the counts to the known ones.
+
+    Args:
+        maxDepth (int): Deepest depth to check.
+        out (file): Where the report is written.
+        backend (str): Board representation of the engine, "mailbox" or "bitboard".
+
+    Returns:
+        bool: True if all counts match.
+    """
+    passed = True
+    for name, fen, counts in REFERENCE_POSITIONS:
+        for depth, expected in counts.items():
+            if depth > maxDepth:
+                continue
+            print(f"{name} depth {depth}", file=out)
+            result = runPerft(fen, depth, out=out, backend=backend)
+            if result["nodes"] != expected:
+                print(f"FAILED: expected {expected} nodes", file=out)
+                passed = False
+    return passed
+
+
+def main():
+    """
+    Command line entry point, eg. python src/perft.py --depth 4 --divide or python src/perft.py --suite 3
+    """
+    parser = argparse.ArgumentParser(description="Count move generator nodes and measure its speed.")
+    parser.add_argument("--fen", default=REFERENCE_POSITIONS[0][1], help="Position to count (default: initial position)")
+    parser.add_argument("--depth", type=int, default=3, help="Number of plies to walk")
+    parser.add_argument("--divide", action="store_true", help="Print the node count under every root move")
+    parser.add_argument("--suite", type=int, metavar="DEPTH",
+                        help="Check all reference positions up to DEPTH against the known counts")
+    parser.add_argument("--backend", choices=("mailbox", "bitboard"), default="mailbox",
+                        help="Board representation to generate moves with")
+    args = parser.parse_args()
+    if args.suite is not None:
+        sys.exit(0 if runSuite(args.suite, backend=args.backend) else 1)
+    runPerft(args.fen, args.depth, showDivide=args.divide, backend=args.backend)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import json
+import pytest
+from batch import CHECKPOINT_SUFFIX, parseEpd, runBatch, writeCheckpoint
+
+POSITIONS = """# Test positions
+6k1/5ppp/8/8/8/8/8/R5K1 w - - bm Ra8#; id "mate";
+rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1
+
+r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1
+8/8/8/8/8/8/8/9 w - -
+7k/5Q2/6K1/8/8/8/8/8 b - -
+"""
+
+def read(path):
+    with open(path, encoding="utf-8") as file:
+        return [json.loads(line) for line in file]
+
+def withoutTime(results):
+    return [{key: value for key, value in result.items() if key != "time"} for result in results]
+
+@pytest.fixture
+def positions(tmp_path):
+    path = tmp_path / "positions.epd"
+    path.write_text(POSITIONS)
+    return str(path)
+
+#Testing that FEN and EPD lines are split into the position and the operations.
+def test_parse_epd():
+    assert parseEpd('6k1/8/8/8/8/8/8/R5K1 w - - bm Ra8#; id "WAC 1";') == \
+        ("6k1/8/8/8/8/8/8/R5K1 w - -", {"bm": "Ra8#", "id": "WAC 1"})
+    assert parseEpd("8/8/8/8/8/8/8/K6k b - - 12 40") == ("8/8/8/8/8/8/8/K6k b - - 12 40", {})
+    with pytest.raises(ValueError):
+        parseEpd("8/8/8 w")
+
+#Testing that the results come in input order with the searched fields, EPD operations and errors.
+def test_run_batch(positions, tmp_path):
+    out = str(tmp_path / "results.jsonl")
+    stats = runBatch(positions, out, depth=2, workers=2)
+    results = read(out)
+    assert stats["positions"] == 5 and stats["errors"] == 1
+    assert [result["line"] for result in results] == [2, 3, 5, 6, 7]
+    assert results[0]["id"] == "mate"
+    assert results[0]["bm"] == ["a1a8"] and results[0]["solved"]
+    assert results[0]["score"] == 999900
+    assert set(results[1]) == {"line", "fen", "bestmove", "score", "depth", "nodes", "time"}
+    assert results[1]["depth"] == 2 and results[1]["nodes"] > 0
+    assert "error" in results[3]
+    assert results[4]["bestmove"] is None
+
+#Testing that a run resumes from the checkpoint and drops results written after it.
+def test_run_batch_resume(positions, tmp_path):
+    out = str(tmp_path / "results.jsonl")
+    runBatch(positions, out, depth=2, workers=1)
+    full = read(out)
+    with open(out, "rb") as file:
+        lines = file.readlines()
+    with open(positions, "rb") as file:
+        offset = sum(len(file.readline()) for _ in range(3))
+    #A run stopped after the second result, with part of the third written.
+    with open(out, "wb") as file:
+        file.write(b"".join(lines[:2]) + lines[2][:10])
+    writeCheckpoint(out + CHECKPOINT_SUFFIX, {"inputOffset": offset, "outputOffset": len(b"".join(lines[:2])), "line": 3})
+    stats = runBatch(positions, out, depth=2, workers=2, resume=True)
+    assert stats["positions"] == 3
+    assert withoutTime(read(out)) == withoutTime(full)
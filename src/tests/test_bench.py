@@ -0,0 +1,36 @@
+import copy
+import io
+import pytest
+from bench import BENCH_POSITIONS, compareResults, runBench
+
+@pytest.fixture(scope="module")
+def results():
+    return runBench(perftDepth=1, searchDepth=2, out=io.StringIO())
+
+#Testing that a run reports every part of the suite for every position.
+def test_run_bench(results):
+    names = [name for _, name, _ in BENCH_POSITIONS]
+    assert list(results["perft"]["positions"]) == names
+    assert results["perft"]["positions"]["initial"] == 20
+    assert results["evaluation"]["nps"] > 0
+    assert set(results["search"]["positions"]["initial"]) == {"nodes", "move", "pawnHashHitRate"}
+    assert 0 < results["search"]["pawnHashHitRate"] < 1
+    assert results["search"]["nodes"] == sum(result["nodes"] for result in results["search"]["positions"].values())
+
+#Testing that a run passes against itself and fails on slower speeds, grown node counts and other settings.
+def test_compare_results(results):
+    assert not compareResults(results, results)
+    slower = copy.deepcopy(results)
+    slower["search"]["nps"] = results["search"]["nps"] * 0.8
+    assert compareResults(results, slower)[0].startswith("search speed dropped 20.0%")
+    assert not compareResults(results, slower, npsThreshold=0.25)
+    assert not compareResults(results, slower, npsThreshold=None)
+    grown = copy.deepcopy(results)
+    grown["search"]["positions"]["kiwipete"]["nodes"] *= 2
+    assert "search nodes of kiwipete grew 100.0%" in [failure.split(":")[0] for failure in compareResults(results, grown)]
+    changed = copy.deepcopy(results)
+    changed["perft"]["positions"]["initial"] = 21
+    assert compareResults(results, changed) == ["perft node counts changed"]
+    deeper = copy.deepcopy(results)
+    deeper["config"]["searchDepth"] = 3
+    assert compareResults(results, deeper)[0].startswith("Baseline was run with")
@@ -0,0 +1,124 @@
+import io
+import random
+import pytest
+from bitboard import START_FEN, BitboardEngine, BitboardPosition, bishopAttacks, rookAttacks
+from chessengine import CAPTURE_FLAG, CAPTURES, CASTLE_FLAG, PROMOTION_MASK, QUIETS, ChessEngine, createEngine
+from perft import REFERENCE_POSITIONS, divide, perft, runPerft
+
+#Testing that createEngine picks the backend and rejects unknown ones.
+def test_create_engine():
+    assert isinstance(createEngine("bitboard"), BitboardEngine)
+    assert type(createEngine("mailbox")) is ChessEngine # pylint: disable=C0123
+    with pytest.raises(ValueError):
+        createEngine("0x88")
+
+#Testing that a FEN is written back the same way it was read.
+@pytest.mark.parametrize("fen", [START_FEN] + [position[1] for position in REFERENCE_POSITIONS])
+def test_fen_round_trip(fen):
+    fields = fen.split()
+    expected = " ".join(fields[:3]) + " - 0 1"
+    assert BitboardPosition(fen).getFen() == expected
+    engine = ChessEngine()
+    engine.setBoard(fen)
+    assert engine.getFen() == expected
+
+#Testing sliding attacks stopping at the first blocker in every direction.
+def test_sliding_attacks():
+    #Rook on d4 (row 4, column 3) with blockers on d6 and f4.
+    occupied = 1 << (2 * 8 + 3) | 1 << (4 * 8 + 5)
+    attacks = rookAttacks(4 * 8 + 3, occupied)
+    assert attacks & 1 << (2 * 8 + 3)
+    assert not attacks & 1 << (1 * 8 + 3)
+    assert attacks & 1 << (4 * 8 + 5)
+    assert not attacks & 1 << (4 * 8 + 6)
+    assert attacks & 1 << (7 * 8 + 3)
+    assert attacks & 1 << (4 * 8 + 0)
+    assert bin(bishopAttacks(0, 0)).count("1") == 7
+
+#Testing the bitboard backend against the known perft counts.
+@pytest.mark.parametrize("name,fen,counts", REFERENCE_POSITIONS, ids=[position[0] for position in REFERENCE_POSITIONS])
+def test_bitboard_perft(name, fen, counts):
+    position = BitboardPosition(fen)
+    for depth in (1, 2, 3):
+        if depth in counts:
+            assert perft(position, depth) == counts[depth], name
+    assert position.getFen().split()[:3] == fen.split()[:3]
+
+#Testing that both backends agree move by move on Kiwipete, where castling, pins and promotions meet.
+def test_backends_divide_match():
+    fen = REFERENCE_POSITIONS[1][1]
+    mailbox = createEngine("mailbox")
+    bitboard = createEngine("bitboard")
+    mailbox.setBoard(fen)
+    bitboard.setBoard(fen)
+    assert divide(bitboard, 2) == divide(mailbox, 2)
+    assert runPerft(fen, 2, out=io.StringIO(), backend="bitboard")["nodes"] == 2038
+
+#Testing that both backends generate the same legal moves along random games.
+def test_backends_match_in_random_games():
+    rng = random.Random(7)
+    for _ in range(5):
+        mailbox = createEngine("mailbox")
+        bitboard = createEngine("bitboard")
+        for _ in range(60):
+            moves = mailbox.legalMoves()
+            assert sorted(bitboard.legalMoves()) == sorted(moves)
+            assert bitboard.check == mailbox.check
+            if not moves:
+                break
+            move = rng.choice(moves)
+            mailbox.doMove(move)
+            bitboard.doMove(move)
+            assert bitboard.position.getFen() == mailbox.getFen()
+        while bitboard.moves:
+            bitboard.undoMove()
+        assert bitboard.position.getFen() == START_FEN
+
+#Testing that the bitboard engine's staged moves come from the bitboards and are its legal moves, with pinned pieces,
+#promotions and castling, and along random games.
+@pytest.mark.parametrize("fen", [position[1] for position in REFERENCE_POSITIONS]
+                         + ["4k3/8/8/8/1b6/8/3N4/4K2R w K - 0 1", "4k3/1P6/8/8/8/8/4r3/4K3 w - - 0 1"])
+def test_bitboard_staged_moves(fen, monkeypatch):
+    engine = createEngine("bitboard")
+    engine.setBoard(fen)
+    def mailboxGeneration(*_):
+        raise AssertionError("mailbox move generation used")
+    for name in ("pinsAndChecks", "possibleMoves", "evasionMoves"):
+        monkeypatch.setattr(engine, name, mailboxGeneration)
+    staged = list(engine.stagedMoves(0))
+    assert len(staged) == len(set(staged))
+    assert set(staged) == set(engine.legalMoves())
+    rng = random.Random(3)
+    for _ in range(40):
+        moves = engine.legalMoves()
+        if not moves:
+            break
+        assert set(engine.stagedMoves(1)) == set(moves)
+        engine.doMove(rng.choice(moves))
+
+#Testing that the bitboard generation by kind splits the legal moves into captures and promotions, and the rest.
+def test_bitboard_moves_by_kind():
+    position = BitboardPosition("r3k3/1P6/8/8/1b6/8/3N4/R3K2R w KQq - 0 1")
+    suspects = position.pinSuspects()
+    captures = position.legalMoves(CAPTURES, suspects=suspects)
+    quiets = position.legalMoves(QUIETS, suspects=suspects)
+    assert sorted(captures + quiets) == sorted(position.legalMoves())
+    assert all(move & (CAPTURE_FLAG | PROMOTION_MASK) for move in captures)
+    assert not any(move & (CAPTURE_FLAG | PROMOTION_MASK) for move in quiets)
+    assert any(move & CASTLE_FLAG for move in quiets)
+    #The knight on d2 is pinned, so it has no moves.
+    assert not position.legalMoves(fromMask=1 << (6 * 8 + 3), suspects=suspects)
+
+#Testing that the public move path keeps the bitboards and their history, and that a direct board edit rebuilds them.
+def test_bitboard_sync_state():
+    engine = createEngine("bitboard")
+    for uci in ["e2e4", "e7e5", "g1f3"]:
+        engine.makeMove(next(move for move in engine.validMoves() if move.getUCI() == uci))
+        engine.evaluateBoard()
+    assert len(engine.position.history) == 3
+    engine.undoMove()
+    assert engine.position.getFen() == engine.getFen()
+    engine.board[6][3] = " "
+    assert "d1d3" in [move.getUCI() for move in engine.validMoves()]
+    assert engine.position.squares[51] == " "
+    assert not engine.position.history
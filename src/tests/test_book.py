@@ -0,0 +1,156 @@
+import io
+import time
+import pytest
+from book import ENTRY, OpeningBook, buildBook, polyglotKey, polyglotMove, readGames, sanToMove
+from chessengine import ChessEngine, moveToUCI
+from uci import UCI
+
+PGN = """[Event "Test"]
+[Result "1-0"]
+
+1. e4 e5 2. Nf3 {main line} Nc6 (2... d6 3. d4) 3. Bb5 a6 $1 4. Ba4 Nf6 5. O-O 1-0
+
+[Event "Test"]
+[Result "1/2-1/2"]
+
+1. e4 c5 2. Nf3 d6 1/2-1/2
+
+[Event "Test"]
+[Result "0-1"]
+
+1. d4 d5 2. c4 e6 0-1
+
+1. e4 e5 2. Nc3 0-1
+"""
+
+@pytest.fixture
+def book_path(tmp_path):
+    pgn = tmp_path / "games.pgn"
+    pgn.write_text(PGN)
+    path = tmp_path / "book.bin"
+    stats = buildBook([str(pgn)], str(path))
+    assert stats["games"] == 4
+    return str(path)
+
+def engine():
+    chess = ChessEngine()
+    chess.verbose = False
+    return chess
+
+#Testing the Polyglot keys against the published values, including the en passant file and lost castling rights.
+@pytest.mark.parametrize("moves, key", [
+    ([], 0x463B96181691FC9C),
+    (["e4"], 0x823C9B50FD114196),
+    (["e4", "d5"], 0x0756B94461C50FB0),
+    (["e4", "d5", "e5", "f5"], 0x22A48B5A8E47FF78),
+    (["e4", "d5", "e5", "f5", "Ke2"], 0x652A607CA3F242C1),
+    (["e4", "d5", "e5", "f5", "Ke2", "Kf7"], 0x00FDD303C946BDD9),
+    (["a4", "b5", "h4", "b4", "c4"], 0x3C8123EA7B067637),
+])
+def test_polyglot_key(moves, key):
+    chess = engine()
+    for san in moves:
+        chess.doMove(sanToMove(chess, san))
+    assert polyglotKey(chess) == key
+
+#Testing that a book written with the standard keys is read, as one from another program would be.
+def test_read_polyglot_book(tmp_path):
+    chess = engine()
+    path = tmp_path / "other.bin"
+    path.write_bytes(ENTRY.pack(0x463B96181691FC9C, 3 | 3 << 3 | 3 << 6 | 1 << 9, 5, 0)
+                     + ENTRY.pack(0x463B96181691FC9C, polyglotMove(sanToMove(chess, "e4")), 10, 0))
+    with OpeningBook(str(path)) as book:
+        assert {moveToUCI(move): weight for move, weight in book.bookMoves(chess)} == {"d2d4": 5, "e2e4": 10}
+
+#Testing that moves are converted to the Polyglot format, castling as the king taking its rook.
+def test_polyglot_move():
+    chess = engine()
+    e2e4 = sanToMove(chess, "e4")
+    assert polyglotMove(e2e4) == 4 | 3 << 3 | 4 << 6 | 1 << 9
+    chess.setBoard("r3k2r/8/8/8/8/8/8/R3K2R w KQkq - 0 1")
+    assert polyglotMove(sanToMove(chess, "O-O")) == 7 | 4 << 6
+    assert polyglotMove(sanToMove(chess, "O-O-O")) == 0 | 4 << 6
+    chess.setBoard("8/P6k/8/8/8/8/8/K7 w - - 0 1")
+    assert polyglotMove(sanToMove(chess, "a8=N")) == 0 | 7 << 3 | 0 << 6 | 6 << 9 | 1 << 12
+
+#Testing SAN with captures, disambiguation, promotion and check marks.
+def test_san_to_move():
+    chess = engine()
+    chess.setBoard("4k3/1P6/8/3p4/4P3/8/4K3/R6R w - - 0 1")
+    assert moveToUCI(sanToMove(chess, "exd5")) == "e4d5"
+    assert moveToUCI(sanToMove(chess, "Rad1")) == "a1d1"
+    assert moveToUCI(sanToMove(chess, "Rhf1")) == "h1f1"
+    assert moveToUCI(sanToMove(chess, "b8=Q+")) == "b7b8q"
+    assert moveToUCI(sanToMove(chess, "b8R")) == "b7b8r"
+    with pytest.raises(ValueError):
+        sanToMove(chess, "Rd1")
+    with pytest.raises(ValueError):
+        sanToMove(chess, "Nf3")
+
+#Testing that comments, variations, annotations and move numbers are skipped.
+def test_read_games():
+    games = list(readGames(PGN))
+    assert [result for result, _ in games] == ["1-0", "1/2-1/2", "0-1", "0-1"]
+    assert games[0][1] == ["e4", "e5", "Nf3", "Nc6", "Bb5", "a6", "Ba4", "Nf6", "O-O"]
+
+#Testing that the built book is sorted and weighs moves by result.
+def test_build_and_probe(book_path):
+    with open(book_path, "rb") as file:
+        data = file.read()
+    keys = [ENTRY.unpack_from(data, i)[0] for i in range(0, len(data), ENTRY.size)]
+    assert keys == sorted(keys)
+    chess = engine()
+    with OpeningBook(book_path, seed=1) as book:
+        moves = {moveToUCI(move): weight for move, weight in book.bookMoves(chess)}
+        #A win, a draw and a loss with e4, a loss with d4.
+        assert moves == {"e2e4": 3}
+        chess.setBoard("rnbqkbnr/pppppppp/8/8/3P4/8/PPP1PPPP/RNBQKBNR b KQkq - 0 1")
+        assert moveToUCI(book.pickMove(chess)) == "d7d5"
+        chess.setBoard("4k3/8/8/8/8/8/8/4K3 w - - 0 1")
+        assert book.pickMove(chess) is None
+
+#Testing that the weighted pick follows the weights.
+def test_weighted_pick(book_path):
+    chess = engine()
+    chess.setBoard("rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1")
+    with OpeningBook(book_path, seed=7) as book:
+        assert {moveToUCI(move): weight for move, weight in book.bookMoves(chess)} == {"e7e5": 2, "c7c5": 1}
+        picks = [moveToUCI(book.pickMove(chess)) for _ in range(300)]
+    assert 150 < picks.count("e7e5") < 250
+
+#Testing that bestMove plays from the book without searching and searches once out of it.
+def test_best_move_uses_book(book_path):
+    chess = engine()
+    with OpeningBook(book_path) as book:
+        chess.book = book
+        start = time.perf_counter()
+        move = chess.bestMove(4)
+        assert time.perf_counter() - start < 0.05
+        assert move.getUCI() == "e2e4"
+        assert chess.nodes == 0
+        chess.setBoard("4k3/8/8/8/8/8/8/R3K3 w - - 0 1")
+        assert chess.bestMove(1) is not None
+        assert chess.nodes > 0
+
+#Testing that an empty book has no moves.
+def test_empty_book(tmp_path):
+    path = tmp_path / "empty.bin"
+    path.write_bytes(b"")
+    with OpeningBook(str(path)) as book:
+        assert book.pickMove(engine()) is None
+
+#Testing the UCI book options.
+def test_uci_book_options(book_path):
+    front_end = UCI(out=io.StringIO())
+    try:
+        front_end.handleCommand(f"setoption name BookFile value {book_path}")
+        assert front_end.engine.book is front_end.book
+        front_end.handleCommand("setoption name OwnBook value false")
+        assert front_end.engine.book is None
+        front_end.handleCommand("setoption name OwnBook value true")
+        front_end.handleCommand("position startpos")
+        front_end.handleCommand("go depth 5")
+        front_end.waitForSearch()
+        assert front_end.out.getvalue().splitlines()[-1] == "bestmove e2e4"
+    finally:
+        front_end.close()
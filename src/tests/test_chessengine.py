@@ -1,9 +1,17 @@
+import time
 import pytest
-from chessengine import ChessEngine, Move
+from chessengine import (BETWEEN, CAPTURE_FLAG, CAPTURES, CASTLE_FLAG, QUIETS, ChessEngine, Move, PawnHashTable, Ponder,
+                         SearchTimeout, TranspositionTable, createEngine, moveToUCI)
+from perft import REFERENCE_POSITIONS
+
+#Every test runs on both board representations.
+@pytest.fixture(params=["mailbox", "bitboard"])
+def backend(request):
+    return request.param
 
 @pytest.fixture
-def engine():
-    return ChessEngine()
+def engine(backend):
+    return createEngine(backend)
 
 #Test that the board is setup correctly.
 def test_board_initialize(engine):
@@ -204,7 +212,7 @@ def test_possible_pawn_moves(engine):
     engine.board[5][5] = "p"
     moves = []
     engine.getPawnMoves(6, 4, moves)
-    uci_moves = [move.getUCI() for move in moves]
+    uci_moves = [moveToUCI(move) for move in moves]
     assert set(uci_moves) == {"e2e3", "e2e4", "e2f3"}
 
 #Testing that checking with a knight works correctly.
@@ -260,3 +268,576 @@ def test_make_best_move(engine):
     assert move in engine.validMoves()
     engine.makeMove(move)
     assert engine.board[3][5] == "P"
+
+#Testing that the incrementally updated Zobrist key matches a full recalculation after moves and undos.
+def test_zobrist_key_incremental(engine):
+    start_key = engine.zobristKey
+    for uci in ["e2e4", "e7e5", "g1f3", "b8c6", "f1c4", "g8f6"]:
+        engine.handleMove(uci)
+        assert engine.zobristKey == engine.calculateHash()
+    castle = Move((7, 4), (7, 6), engine.board)
+    engine.makeMove(castle)
+    assert not engine.whiteCastleKingside
+    assert engine.zobristKey == engine.calculateHash()
+    for _ in range(7):
+        engine.undoMove()
+    assert engine.zobristKey == start_key
+
+#Testing that the same position reached by different move orders has the same key.
+def test_zobrist_key_transposition(engine, backend):
+    for uci in ["g1f3", "g8f6", "b1c3"]:
+        engine.handleMove(uci)
+    other = createEngine(backend)
+    for uci in ["b1c3", "g8f6", "g1f3"]:
+        other.handleMove(uci)
+    assert engine.zobristKey == other.zobristKey
+    assert engine.zobristKey != createEngine(backend).zobristKey
+
+#Testing that the transposition table keeps the deeper entry when two positions share a slot.
+def test_transposition_table_replacement():
+    table = TranspositionTable(sizeMB=1)
+    assert table.size == 1024 * 1024 // TranspositionTable.ENTRY_BYTES
+    table.store(5, 4, TranspositionTable.EXACT, 1.5, None)
+    table.store(5 + table.size, 2, TranspositionTable.LOWERBOUND, 0.5, None)
+    assert table.probe(5)[1] == 4
+    assert table.probe(5 + table.size) is None
+    table.newSearch()
+    table.store(5 + table.size, 2, TranspositionTable.LOWERBOUND, 0.5, None)
+    assert table.probe(5) is None
+    assert table.probe(5 + table.size)[3] == 0.5
+
+#Testing that a search stores its result and best move for the root position.
+def test_search_stores_root_entry(engine):
+    move = engine.bestMove(depth=2)
+    entry = engine.tt.probe(engine.zobristKey)
+    assert entry is not None
+    assert entry[1] == 2
+    assert entry[4] == move.encode()
+
+#Testing that a hanging queen is taken at odd search depths too.
+def test_best_move_odd_depth(engine):
+    engine.setBoard("4k3/8/8/3q4/4P3/8/8/4K3 w - - 0 1")
+    assert engine.bestMove(depth=1).getUCI() == "e4d5"
+    assert engine.bestMove(depth=3).getUCI() == "e4d5"
+    assert engine.completedDepth == 3
+
+#Testing that iterative deepening stops on the node budget and keeps the board unchanged.
+def test_best_move_node_budget(engine):
+    board_before = [row[:] for row in engine.board]
+    move = engine.bestMove(depth=10, nodeLimit=200)
+    assert move in engine.validMoves()
+    assert engine.nodes <= 200
+    assert engine.completedDepth < 10
+    assert engine.board == board_before
+    assert engine.turn == "white"
+    assert not engine.moves
+
+#Testing that the time budget is respected and a move is returned even if no iteration completes.
+def test_best_move_time_budget(engine):
+    start = time.perf_counter()
+    move = engine.bestMove(depth=10, timeLimit=0.2)
+    assert time.perf_counter() - start < 2
+    assert move in engine.validMoves()
+    assert engine.bestMove(depth=2, nodeLimit=1) in engine.validMoves()
+    assert engine.completedDepth == 0
+
+#Testing that promotions come first and captures are ordered by most valuable victim, least valuable attacker.
+def test_move_ordering_mvv_lva(engine):
+    engine.setBoard("1q3r2/P7/8/8/8/8/1Q3R2/4K2k w - - 0 1")
+    moves = engine.ordering.orderMoves(engine.legalMoves(), engine.board, 0)
+    uci_moves = [moveToUCI(move) for move in moves]
+    assert uci_moves[:2] == ["a7a8q", "a7b8q"]
+    assert uci_moves[8:10] == ["b2b8", "f2f8"]
+
+#Testing that killer moves and history scores are recorded and cleared for a new game.
+def test_move_ordering_killers_history(engine):
+    ordering = engine.ordering
+    first = Move((6, 4), (4, 4), engine.board).encode()
+    second = Move((7, 6), (5, 5), engine.board).encode()
+    ordering.addCutoff(first, 2, 3)
+    ordering.addCutoff(second, 2, 3)
+    assert ordering.killers[2] == [second, first]
+    assert ordering.history[first & 4095] == 9
+    moves = ordering.orderMoves(engine.legalMoves(), engine.board, 2)
+    assert moves[0] == second and moves[1] == first
+    engine.resetBoard()
+    assert ordering.killers[2] == [None, None]
+    assert not any(ordering.history)
+
+#Testing that the quiescence search sees the recapture, so the queen does not take a defended pawn.
+def test_quiescence_avoids_horizon_capture(engine):
+    engine.setBoard("4k3/8/2p5/3p4/8/8/8/3QK3 w - - 0 1")
+    move = engine.bestMove(depth=1)
+    assert move.getUCI() != "d1d5"
+    assert engine.qNodes > 0
+
+#Testing that the quiescence search stands pat at the ply cap and resolves an exchange below it.
+def test_quiescence_stand_pat(engine):
+    engine.setBoard("4k3/8/2p5/3p4/8/8/8/3QK3 w - - 0 1")
+    static = engine.evaluateBoard()
+    assert engine.quiescence(float("-inf"), float("inf"), qply=ChessEngine.MAX_QUIESCENCE_PLY) == static
+    assert engine.quiescence(float("-inf"), float("inf")) == static
+    assert not engine.moves
+
+#Testing square attacks by every piece type, including x-ray blocking of sliding pieces.
+def test_is_square_attacked(engine):
+    engine.setBoard("4k3/8/8/3n4/8/2p5/1R6/4K2B w - - 0 1")
+    assert engine.isSquareAttacked(5, 3, False) is False
+    assert engine.isSquareAttacked(6, 1, False)
+    assert engine.isSquareAttacked(6, 3, False)
+    assert engine.isSquareAttacked(4, 1, False)
+    assert engine.isSquareAttacked(1, 4, False)
+    assert engine.isSquareAttacked(6, 7, True)
+    assert engine.isSquareAttacked(0, 1, True)
+    assert engine.isSquareAttacked(2, 1, True)
+    assert engine.isSquareAttacked(3, 3, True)
+    assert not engine.isSquareAttacked(2, 2, True)
+    assert engine.isSquareAttacked(6, 3, True)
+
+#Testing that castling through a square attacked by a pawn is not allowed.
+def test_castling_through_pawn_attack(engine):
+    engine.setBoard("4k3/8/8/8/8/8/4p3/4K2R w K - 0 1")
+    assert "e1g1" not in [move.getUCI() for move in engine.validMoves()]
+    engine.setBoard("4k3/8/8/8/8/8/p7/4K2R w K - 0 1")
+    assert "e1g1" in [move.getUCI() for move in engine.validMoves()]
+
+#Testing that moves convert between Move objects, encoded ints and UCI notation.
+def test_move_encoding(engine):
+    engine.setBoard("r3k3/1P6/8/8/8/8/8/4K2R w K - 0 1")
+    for uci in ["b7a8n", "b7b8q", "e1g1", "h1h8"]:
+        move = next(move for move in engine.validMoves() if move.getUCI() == uci)
+        code = move.encode()
+        assert moveToUCI(code) == uci
+        assert Move.fromCode(code, engine.board).encode() == code
+    assert Move((6, 1), (0, 0), engine.board).encode() & CAPTURE_FLAG
+    assert Move((7, 4), (7, 6), engine.board).encode() & CASTLE_FLAG
+
+#Testing that undoing encoded moves restores the whole state from the undo stack.
+def test_do_undo_encoded_moves(engine):
+    engine.setBoard("r3k2r/1P6/8/8/8/8/8/R3K2R w KQkq - 0 1")
+    board_before = [row[:] for row in engine.board]
+    key_before = engine.zobristKey
+    for move in engine.legalMoves():
+        engine.doMove(move)
+        assert engine.zobristKey == engine.calculateHash()
+        assert engine.score == engine.calculateScore()
+        engine.undoMove()
+        assert engine.board == board_before
+        assert engine.zobristKey == key_before
+        assert engine.whiteCastleKingside and engine.blackCastleQueenside
+        assert engine.wKingLocation == (7, 4)
+
+#Testing that capturing a rook in its corner removes the castling right of its owner.
+def test_castling_right_lost_on_rook_capture(engine):
+    engine.setBoard("r3k2r/8/8/8/8/8/8/R3K2R b KQkq - 0 1")
+    engine.handleMove("h8h1")
+    assert not engine.whiteCastleKingside
+    assert not engine.blackCastleKingside
+    assert engine.whiteCastleQueenside and engine.blackCastleQueenside
+
+#Testing that the incremental positional score matches a full recalculation through a search with debug checks on.
+def test_incremental_positional_score(engine):
+    engine.setBoard("r3k2r/1Pppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1")
+    start_score = engine.positionalScore
+    engine.debug = True
+    engine.bestMove(depth=2)
+    for uci in ["e1c1", "e8g8", "b7a8q"]:
+        engine.handleMove(uci)
+    assert engine.positionalScore == pytest.approx(engine.calculatePositionalScore())
+    for _ in range(3):
+        engine.undoMove()
+    assert engine.positionalScore == start_score
+
+#Testing that the debug check finds an incremental score that does not match the board.
+def test_debug_check_detects_mismatch(engine):
+    engine.debug = True
+    engine.positionalScore += 0.5
+    with pytest.raises(AssertionError):
+        engine.handleMove("e2e4")
+
+#Testing that the static evaluation reads only the incremental scores and does not generate moves.
+def test_static_evaluation_no_move_generation(engine, monkeypatch):
+    engine.setBoard("4k3/8/8/3q4/4P3/8/8/4K3 w - - 0 1")
+    expected = engine.evaluateBoard()
+    monkeypatch.setattr(engine, "legalMoves", lambda: pytest.fail("move generation in static evaluation"))
+    assert engine.staticEvaluation() == expected
+    assert engine.staticEvaluation() == engine.calculateScore() + engine.calculatePositionalScore() + engine.pawnScore()
+
+#Testing that the search detects checkmate itself and plays the mating move.
+def test_search_finds_mate_in_one(engine):
+    engine.setBoard("6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1")
+    assert engine.bestMove(depth=2).getUCI() == "a1a8"
+    engine.handleMove("a1a8")
+    assert engine.evaluateBoard() == 9999
+
+#Testing that a ponder hit keeps the expected reply on the board and lets the next search continue from the ponder depth.
+def test_ponder_hit(engine):
+    engine.setBoard("r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3")
+    engine.makeMove(engine.bestMove(depth=3))
+    ponder = Ponder(engine)
+    ponder.start()
+    expected = ponder.expectedMove
+    assert expected is not None
+    time.sleep(0.5)
+    assert ponder.opponentMoved(moveToUCI(expected))
+    assert not ponder.isRunning()
+    assert ponder.hits == 1
+    assert engine.moves[-1] == expected
+    ponder_depth = engine.completedDepth
+    assert ponder_depth >= 1
+    assert ponder.resume == (engine.zobristKey, engine.rootMove, ponder_depth, engine.rootScore)
+    #The completed iterations are kept without searching them again.
+    move = engine.bestMove(depth=ponder_depth, nodeLimit=0, resume=ponder.resume)
+    assert engine.completedDepth == ponder_depth
+    assert move == ponder.result
+    assert engine.nodes == 0
+    #The next iteration is the first one searched.
+    engine.bestMove(depth=ponder_depth + 1, resume=ponder.resume)
+    assert engine.completedDepth == ponder_depth + 1
+    assert len(engine.iterationNodes) == 1
+    #A resume of another position is ignored.
+    engine.bestMove(depth=1, resume=(engine.zobristKey ^ 1,) + ponder.resume[1:])
+    assert engine.completedDepth == 1
+    ponder.cancel()
+    assert ponder.resume is None
+
+#Testing that a ponder miss takes the expected reply back and makes the real move.
+def test_ponder_miss_and_cancel(engine):
+    engine.makeMove(engine.bestMove(depth=2))
+    after_move = engine.getFen()
+    ponder = Ponder(engine)
+    ponder.start()
+    time.sleep(0.1)
+    ponder.cancel()
+    assert engine.getFen() == after_move
+    replies = engine.legalMoves()
+    ponder.start()
+    other = next(move for move in replies if move != ponder.expectedMove)
+    assert not ponder.opponentMoved(moveToUCI(other))
+    assert ponder.misses == 1
+    assert ponder.result is None
+    assert engine.moves[-1] == other
+    assert len(engine.moves) == 2
+
+#Testing that the staged moves are the legal moves, each once, also in check and in positions with castling and en passant.
+@pytest.mark.parametrize("fen", [position[1] for position in REFERENCE_POSITIONS] + ["4k3/8/8/8/1b6/8/8/4K2R w K - 0 1"])
+def test_staged_moves_match_legal_moves(engine, fen):
+    engine.setBoard(fen)
+    staged = list(engine.stagedMoves(0))
+    assert len(staged) == len(set(staged))
+    assert set(staged) == set(engine.legalMoves())
+
+#Testing the stage order: hash move, winning captures, killers, quiet moves and last the losing captures.
+def test_staged_moves_order(engine):
+    engine.setBoard("4k3/2p5/3p4/1r6/8/2N5/8/3QK3 w - - 0 1")
+    killer = Move((7, 3), (3, 3), engine.board).encode()
+    hash_move = Move((7, 3), (7, 0), engine.board).encode()
+    engine.ordering.addCutoff(killer, 1, 1)
+    uci_moves = [moveToUCI(move) for move in engine.stagedMoves(1, hash_move)]
+    assert uci_moves[:3] == ["d1a1", "c3b5", "d1d5"]
+    assert uci_moves[-1] == "d1d6"
+    #A hash move that is not legal here is skipped.
+    assert moveToUCI(next(engine.stagedMoves(1, Move((6, 0), (4, 0), engine.board).encode()))) != "a2a4"
+
+#Testing that generating moves by kind splits them into captures and quiet moves.
+def test_piece_moves_by_kind(engine):
+    engine.setBoard("4k3/8/8/8/8/3p4/1P2P3/4K3 w - - 0 1")
+    captures, quiets = [], []
+    engine.getPawnMoves(6, 4, captures, CAPTURES)
+    engine.getPawnMoves(6, 4, quiets, QUIETS)
+    assert [moveToUCI(move) for move in captures] == ["e2d3"]
+    assert sorted(moveToUCI(move) for move in quiets) == ["e2e3", "e2e4"]
+    assert set(engine.possibleMoves(CAPTURES)) | set(engine.possibleMoves(QUIETS)) == set(engine.possibleMoves())
+
+#Testing that the search counts the moves it generated and searched.
+def test_move_generation_stats(engine):
+    engine.bestMove(3, timeLimit=60)
+    stats = engine.moveGenerationStats()
+    assert stats["nodes"] == engine.nodes
+    assert 0 < stats["searched"] <= stats["generated"]
+    assert stats["searchedPerNode"] == pytest.approx(stats["searched"] / engine.nodes)
+
+#Testing the between-squares table on a row, a diagonal and squares that are not on a line.
+def test_between_table():
+    assert BETWEEN[60][63] == (61, 62)
+    assert BETWEEN[0][63] == (9, 18, 27, 36, 45, 54)
+    assert BETWEEN[63][0] == (54, 45, 36, 27, 18, 9)
+    assert BETWEEN[60][61] == ()
+    assert BETWEEN[0][17] == ()
+
+#Testing that the evasions are the possible moves that leave the king safe: a double check, a pinned piece that cannot
+#block, a double pawn push that blocks, promotions capturing the checker and the king not stepping back along the ray.
+@pytest.mark.parametrize("fen", [
+    "4k3/8/8/8/8/5n2/4r3/4K3 w - - 0 1",
+    "4k3/8/8/b7/8/8/1PP5/4K2R w K - 0 1",
+    "4k3/8/8/b7/8/8/5P2/4K3 w - - 0 1",
+    "4r1k1/3P1N2/8/8/8/8/8/4K2R w - - 0 1",
+    "1r2k3/P7/8/8/8/8/8/1K6 w - - 0 1",
+    "3k4/3q4/8/8/8/8/8/3K4 w - - 0 1",
+    "r1bqkbnr/pppp1Qpp/2n5/4p3/2B1P3/8/PPPP1PPP/RNB1K1NR b KQkq - 0 4",
+])
+def test_evasion_moves(engine, fen):
+    engine.setBoard(fen)
+    expected = set()
+    for move in engine.possibleMoves():
+        engine.doMove(move)
+        engine.turn = "white" if engine.turn == "black" else "black"
+        if not engine.isInCheck():
+            expected.add(move)
+        engine.turn = "white" if engine.turn == "black" else "black"
+        engine.undoMove()
+    engine.setBoard(fen)
+    moves = engine.legalMoves()
+    assert engine.check
+    assert len(moves) == len(set(moves))
+    assert set(moves) == expected
+
+#Testing the search statistics, the principal variation and the info callback after every iteration.
+def test_search_stats(engine):
+    engine.setBoard("r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1")
+    iterations = []
+    engine.infoCallback = iterations.append
+    move = engine.bestMove(3, timeLimit=60)
+    stats = engine.searchStats()
+    assert [iteration["depth"] for iteration in iterations] == [1, 2, 3]
+    assert stats["totalNodes"] == stats["nodes"] + stats["qNodes"] == engine.iterationNodes[-1]
+    assert stats["nps"] > 0 and stats["time"] > 0
+    assert 0 < stats["firstMoveCutoffRate"] <= 1
+    assert 0 < stats["ttHitRate"] <= 1
+    assert stats["branchingFactor"] > 1
+    assert not any(stats["phaseTimes"].values())
+    assert stats["pv"][0] == move.getUCI()
+    assert 1 < len(stats["pv"]) <= 3
+    assert not engine.moves
+
+#Testing that the phase timers run only while profiling is on.
+def test_profiling(engine):
+    engine.setProfiling(True)
+    engine.bestMove(2, timeLimit=60)
+    times = engine.searchStats()["phaseTimes"]
+    assert set(times) == {"moveGeneration", "makeUndo", "evaluation"}
+    assert all(value > 0 for value in times.values())
+    engine.setProfiling(False)
+    assert "doMove" not in vars(engine)
+    engine.bestMove(2, timeLimit=60)
+    assert not any(engine.searchStats()["phaseTimes"].values())
+
+#Testing that the zero-window searches of the principal variation search do not change the score or the move.
+@pytest.mark.parametrize("depth", [1, 2, 3])
+def test_pvs_matches_full_window(engine, monkeypatch, depth):
+    engine.setBoard("r1b1k2r/ppppnppp/2n2q2/2b5/3NP3/2P1B3/PP3PPP/RN1QKB1R w KQkq - 0 1")
+    engine.nullMove = engine.lateMoveReductions = False
+    #Bounds stored by the zero-window searches are window dependent through the quiescence search, so nothing is stored.
+    monkeypatch.setattr(engine.tt, "store", lambda *entry: None)
+    key = engine.zobristKey
+    score, move = engine.negamax(depth, float("-inf"), float("inf"))
+    #With an infinite window every move is searched with the full window.
+    engine.PVS_WINDOW = float("inf")
+    assert engine.negamax(depth, float("-inf"), float("inf")) == (score, move)
+    assert engine.zobristKey == key and not engine.moves
+
+#Testing that null-move pruning and late move reductions are used and counted in a deeper search.
+def test_null_move_and_reductions(engine):
+    engine.setBoard("r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10")
+    move = engine.bestMove(5, timeLimit=600)
+    stats = engine.searchStats()
+    assert move in engine.validMoves()
+    assert stats["nullMoveCutoffs"] > 0
+    assert stats["lmrReductions"] > 0
+    assert stats["pvsResearches"] > 0
+    engine.nullMove = engine.lateMoveReductions = False
+    engine.tt.clear()
+    engine.bestMove(5, timeLimit=600)
+    assert engine.searchStats()["nullMoveCutoffs"] == engine.searchStats()["lmrReductions"] == 0
+    assert engine.searchStats()["totalNodes"] > stats["totalNodes"]
+
+#Testing that a null move only passes the turn and is taken back exactly.
+def test_null_move_do_undo(engine):
+    engine.setBoard("r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1")
+    key, moves = engine.zobristKey, sorted(move.getUCI() for move in engine.validMoves())
+    engine.doNullMove()
+    assert engine.turn == "black"
+    assert engine.zobristKey != key
+    assert "a6e2" in [move.getUCI() for move in engine.validMoves()]
+    engine.undoNullMove()
+    assert engine.turn == "white" and engine.zobristKey == key
+    assert sorted(move.getUCI() for move in engine.validMoves()) == moves
+
+#Testing that no null move is tried in check or with only pawns left, where passing could be best.
+def test_null_move_skipped(engine):
+    engine.setBoard("8/8/8/4k3/8/4K3/4P3/8 w - - 0 1")
+    assert engine.nullMoveScore(6, float("-inf"), 1) is None
+    engine.setBoard("4k3/8/8/8/8/8/3PPP2/3QK2r w - - 0 1")
+    assert engine.nullMoveScore(6, float("-inf"), 1) is None
+    engine.setBoard("4k3/8/8/8/8/8/3PPP2/3QK3 w - - 0 1")
+    assert engine.nullMoveScore(6, float("-inf"), 1) is not None
+    assert engine.turn == "white" and not engine.moves
+
+#Testing that the board is restored when the budget runs out during a search after a null move.
+def test_null_move_timeout(engine, monkeypatch):
+    engine.setBoard("4k3/8/8/8/8/8/3PPP2/3QK3 w - - 0 1")
+    board, key = [row[:] for row in engine.board], engine.zobristKey
+    calls = []
+    def stopLater():
+        calls.append(1)
+        if len(calls) > 3:
+            raise SearchTimeout()
+    monkeypatch.setattr(engine, "checkLimits", stopLater)
+    with pytest.raises(SearchTimeout):
+        engine.nullMoveScore(8, 1.0, 1)
+    assert engine.board == board and engine.zobristKey == key
+    assert engine.turn == "white" and not engine.moves
+
+#Testing that a root search outside the aspiration window is widened on the failing side until the score fits.
+@pytest.mark.parametrize("offset", [1.5, -1.5])
+def test_aspiration_search(engine, monkeypatch, offset):
+    engine.setBoard("r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 b - - 0 10")
+    #Bounds stored by the narrow searches are window dependent through the quiescence search, so nothing is stored.
+    monkeypatch.setattr(engine.tt, "store", lambda *entry: None)
+    engine.ASPIRATION_MIN_DEPTH, engine.aspirationWindow = 4, 0.25
+    #Black is in turn, so a guess too good for white fails high.
+    score, move = engine.minimax(4, False)
+    engine.resetStats()
+    assert engine.aspirationSearch(4, score + offset) == (score, move)
+    stats = engine.searchStats()
+    assert (stats["aspirationFailLows"], stats["aspirationFailHighs"]) == ((0, 2) if offset > 0 else (2, 0))
+    engine.resetStats()
+    assert engine.aspirationSearch(4, score) == (score, move)
+    assert engine.aspirationFailLows == engine.aspirationFailHighs == 0
+    assert engine.turn == "black" and not engine.moves
+
+#Testing the static exchange evaluation of captures and promotions, with x-rays behind both the moving piece and the defender.
+@pytest.mark.parametrize("fen, move, value", [
+    ("4k3/8/8/3p4/8/8/8/3QK3 w - - 0 1", "d1d5", 1),
+    ("4k3/8/2p5/3p4/8/8/8/3QK3 w - - 0 1", "d1d5", -8),
+    ("4k3/8/4p3/3n4/8/4N3/8/4K3 w - - 0 1", "e3d5", 0),
+    ("4k3/8/8/3r4/4p3/8/8/3QK3 w - - 0 1", "d1d5", 5),
+    ("4k3/8/3r4/3p4/8/8/3R4/3QK3 w - - 0 1", "d2d5", 1),
+    ("4k3/3r4/3r4/3p4/8/8/3R4/3QK3 w - - 0 1", "d2d5", -4),
+    ("1r2k3/P7/8/8/8/8/8/4K3 w - - 0 1", "a7a8q", -1),
+    ("1r2k3/P7/8/8/8/8/8/4K3 w - - 0 1", "a7b8q", 13),
+    ("4k3/8/8/8/2n5/8/3P4/4K3 b - - 0 1", "c4d2", -2),
+    ("4k3/8/8/b7/2n5/8/3P4/4K3 b - - 0 1", "c4d2", 1),
+])
+def test_static_exchange(engine, fen, move, value):
+    engine.setBoard(fen)
+    encoded = next(legal for legal in engine.legalMoves() if moveToUCI(legal) == move)
+    assert engine.staticExchange(encoded) == value
+    assert engine.losesMaterial(encoded) == (value < 0)
+
+#Testing that the quiescence search scores for the player in turn, generates only the captures outside check and
+#searches every evasion in check, finding mates.
+def test_quiescence_negamax(engine, monkeypatch):
+    engine.setBoard("4k3/8/8/3p4/8/8/8/3QK3 b - - 0 1")
+    monkeypatch.setattr(engine, "legalMoves", lambda: pytest.fail("all moves generated outside check"))
+    assert engine.quiescence(float("-inf"), float("inf")) == -engine.staticEvaluation()
+    monkeypatch.undo()
+    engine.setBoard("R5k1/5ppp/8/8/8/8/8/6K1 b - - 0 1")
+    assert engine.quiescence(float("-inf"), float("inf")) == -9999
+    engine.setBoard("R5k1/6pp/8/8/8/8/8/6K1 b - - 0 1")
+    assert engine.quiescence(float("-inf"), float("inf")) > -9999
+
+#Testing that the quiescence search skips captures that lose material and counts them.
+def test_quiescence_see_pruning(engine):
+    engine.setBoard("4k3/8/2p5/3p4/8/8/8/3QK3 w - - 0 1")
+    engine.resetStats()
+    assert engine.quiescence(float("-inf"), float("inf")) == engine.staticEvaluation()
+    assert engine.seePrunes == 1 and engine.qNodes == 1
+
+#Testing razoring and the futility bound at a frontier node far below alpha.
+def test_frontier_pruning(engine):
+    engine.setBoard("q3k3/8/8/8/8/8/3P4/4K3 w - - 0 1")
+    engine.resetStats()
+    score, bound = engine.frontierPruning(1, 0.0, 1e-6)
+    assert score is not None and score < -7 and bound is None
+    assert engine.razorCuts == 1
+    engine.razoring = False
+    score, bound = engine.frontierPruning(2, 0.0, 1e-6)
+    assert score is None and bound == pytest.approx(engine.staticEvaluation() + engine.FUTILITY_MARGINS[2])
+    assert engine.frontierPruning(2, -9.0, -9.0 + 1e-6) == (None, None)
+
+#Testing that frontier nodes are not pruned in check, in the principal variation or near mate scores.
+@pytest.mark.parametrize("fen, alpha, beta", [
+    ("q3k3/8/8/8/8/8/3P4/4K3 w - - 0 1", 9999 - 1e-6, 9999),
+    ("q3k3/8/8/8/8/8/3P4/4K3 w - - 0 1", 0.0, 1.0),
+    ("q3k3/8/8/8/8/8/3P4/4K2r w - - 0 1", 0.0, 1e-6),
+])
+def test_frontier_pruning_disabled(engine, fen, alpha, beta):
+    engine.setBoard(fen)
+    engine.resetStats()
+    engine.negamax(2, alpha, beta, ply=1)
+    assert engine.razorCuts == engine.futilityPrunes == 0
+
+#Testing that futility pruning and razoring are counted in a search and keep the move.
+def test_frontier_pruning_search(engine):
+    engine.setBoard("r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10")
+    move = engine.bestMove(4, timeLimit=600)
+    stats = engine.searchStats()
+    assert stats["futilityPrunes"] > 0 and stats["razorCuts"] > 0
+    engine.futilityPruning = engine.razoring = False
+    engine.tt.clear()
+    assert engine.bestMove(4, timeLimit=600) == move
+    assert engine.searchStats()["totalNodes"] > stats["totalNodes"]
+
+#Testing that the pawn key follows pawn moves, pawn captures and promotions, and ignores the other pieces.
+def test_pawn_key_incremental(engine):
+    engine.setBoard("4k3/1P6/8/3p4/4P3/5N2/8/4K3 w - - 0 1")
+    start_key = engine.pawnKey
+    engine.handleMove("f3g5")
+    assert engine.pawnKey == start_key
+    for uci in ["e8f8", "e4d5", "f8g8", "b7b8q"]:
+        engine.handleMove(uci)
+        assert engine.pawnKey == engine.calculatePawnKey()
+    assert engine.pawnKey != start_key
+    for _ in range(5):
+        engine.undoMove()
+    assert engine.pawnKey == start_key
+
+#Testing the pawn structure terms: passed, isolated, doubled and backward pawns and the shields by king file.
+@pytest.mark.parametrize("fen, score", [
+    ("4k3/8/8/8/8/8/PP6/4K3 w - - 0 1", 0),
+    ("4k3/8/8/8/8/8/P7/4K3 w - - 0 1", -ChessEngine.ISOLATED_PAWN_PENALTY),
+    ("4k3/p7/8/8/8/P7/P7/4K3 w - - 0 1", -ChessEngine.DOUBLED_PAWN_PENALTY - 2 * ChessEngine.ISOLATED_PAWN_PENALTY
+     + ChessEngine.ISOLATED_PAWN_PENALTY),
+    ("4k3/8/1P6/P7/8/8/8/4K3 w - - 0 1", ChessEngine.PASSED_PAWN_BONUS[3] + ChessEngine.PASSED_PAWN_BONUS[4]),
+    ("4k3/8/8/2p5/P7/1P6/8/4K3 w - - 0 1", ChessEngine.PASSED_PAWN_BONUS[2] - ChessEngine.BACKWARD_PAWN_PENALTY
+     + ChessEngine.ISOLATED_PAWN_PENALTY),
+    ("4k3/2p5/1p6/1P6/8/8/8/4K3 w - - 0 1", ChessEngine.BACKWARD_PAWN_PENALTY - ChessEngine.ISOLATED_PAWN_PENALTY),
+])
+def test_evaluate_pawns(engine, fen, score):
+    engine.setBoard(fen)
+    assert engine.evaluatePawns()[0] == pytest.approx(score)
+
+#Testing the pawn shields by king file and that they only count with the king on its first two rows.
+def test_pawn_shield(engine):
+    engine.setBoard("6k1/5ppp/8/8/8/6P1/5P1P/6K1 w - - 0 1")
+    _, white_shield, black_shield = engine.evaluatePawns()
+    assert white_shield[6] == pytest.approx(2 * ChessEngine.SHIELD_BONUS[0] + ChessEngine.SHIELD_BONUS[1])
+    assert black_shield[6] == pytest.approx(3 * ChessEngine.SHIELD_BONUS[0])
+    assert white_shield[0] == black_shield[0] == 0
+    assert engine.pawnScore() == pytest.approx(white_shield[6] - black_shield[6])
+    engine.setBoard("8/5ppp/8/6k1/8/6P1/5P1P/6K1 w - - 0 1")
+    assert engine.pawnScore() == pytest.approx(white_shield[6])
+
+#Testing that the pawn evaluation is read from the pawn hash table after the first time, also after king moves.
+def test_pawn_hash_table(engine, monkeypatch):
+    engine.setBoard("6k1/5ppp/8/8/8/6P1/5P1P/6K1 w - - 0 1")
+    engine.resetStats()
+    first = engine.pawnScore()
+    evaluated = []
+    monkeypatch.setattr(engine, "evaluatePawns", lambda: evaluated.append(1))
+    assert engine.pawnScore() == first
+    engine.handleMove("g1f1")
+    engine.pawnScore()
+    assert not evaluated
+    assert engine.pawnHashHits == 2 and engine.pawnHashProbes == 3
+    engine.resetStats()
+    monkeypatch.undo()
+    engine.bestMove(4, timeLimit=600)
+    assert engine.searchStats()["pawnHashHitRate"] > 0.8
+    #The table grows with the hash size, but not below its default size.
+    engine.setHashSize(64)
+    assert engine.pawnTable.size == engine.tt.size // PawnHashTable.TT_ENTRIES_PER_ENTRY > PawnHashTable.DEFAULT_SIZE
+    assert engine.pawnTable.probe(engine.pawnKey) is None
+    engine.setHashSize(1)
+    assert engine.pawnTable.size == PawnHashTable.DEFAULT_SIZE
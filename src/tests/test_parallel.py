@@ -0,0 +1,102 @@
+import io
+import math
+import pytest
+from chessengine import CASTLE_FLAG, ChessEngine, TranspositionTable
+from parallel import HEADER_BYTES, LazySMP, ParallelSearch, SharedTranspositionTable, runLazySMP, runScaling
+from perft import REFERENCE_POSITIONS
+
+@pytest.fixture(scope="module")
+def pool():
+    with ParallelSearch(2) as search:
+        yield search
+
+#Testing that the parallel search picks the same move with the same score as the serial search.
+@pytest.mark.parametrize("fen", [position[1] for position in REFERENCE_POSITIONS])
+@pytest.mark.parametrize("depth", [1, 2, 3, 4, 5])
+def test_parallel_matches_serial(pool, fen, depth):
+    serial = ChessEngine()
+    serial.setBoard(fen)
+    parallel = ChessEngine()
+    parallel.setBoard(fen)
+    expected = serial.bestMove(depth, timeLimit=math.inf, nodeLimit=math.inf)
+    move = pool.search(parallel, depth)
+    assert move == expected
+    assert parallel.rootScore == serial.rootScore
+    assert parallel.completedDepth == serial.completedDepth
+    assert parallel.getFen() == serial.getFen()
+    assert not parallel.moves
+
+#Testing the positions where the serial search stops early.
+def test_parallel_early_stops(pool):
+    engine = ChessEngine()
+    #Mate in one, Ra8#.
+    engine.setBoard("6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1")
+    assert pool.search(engine, 3).getUCI() == "a1a8"
+    #Only one legal move.
+    engine.setBoard("7k/8/8/8/8/8/6q1/7K w - - 0 1")
+    assert pool.search(engine, 3).getUCI() == "h1g2"
+    #No legal moves.
+    engine.setBoard("7k/5Q2/6K1/8/8/8/8/8 b - - 0 1")
+    assert pool.search(engine, 3) is None
+
+#Testing the speed-up report.
+def test_run_scaling():
+    out = io.StringIO()
+    results = runScaling(REFERENCE_POSITIONS[2][1], 2, [1], out=out)
+    assert [result["workers"] for result in results] == [0, 1]
+    assert all(result["match"] for result in results)
+    assert "speed-up" in out.getvalue()
+
+#Testing the shared table: stored entries read back, replacement by depth and age, and torn entries being misses.
+def test_shared_transposition_table():
+    table = SharedTranspositionTable(1)
+    other = SharedTranspositionTable(1, name=table.name)
+    try:
+        table.newSearch()
+        table.store(12345, 3, TranspositionTable.LOWERBOUND, 0.35, 60 | 62 << 6 | CASTLE_FLAG)
+        assert other.probe(12345) == (12345, 3, TranspositionTable.LOWERBOUND, 0.35, 60 | 62 << 6 | CASTLE_FLAG, 0)
+        assert other.probe(12345 + table.size) is None
+        #A shallower result of another position does not replace an entry of the current search.
+        other.store(12345 + table.size, 1, TranspositionTable.EXACT, -1.0, None)
+        assert table.probe(12345)[1] == 3
+        #The same position keeps its best move when stored without one.
+        other.store(12345, 2, TranspositionTable.EXACT, 9999, None)
+        assert table.probe(12345)[3:5] == (9999, 60 | 62 << 6 | CASTLE_FLAG)
+        #After the age advances, the old entry can be replaced.
+        table.advanceAge()
+        other.newSearch()
+        other.store(12345 + table.size, 1, TranspositionTable.EXACT, -1.0, None)
+        assert table.probe(12345) is None
+        assert table.probe(12345 + table.size)[3] == -1.0
+        #Changing one word of the entry makes it a miss.
+        offset = HEADER_BYTES + ((12345 + table.size) % table.size) * table.ENTRY_BYTES
+        table.memory.buf[offset + 8] ^= 1
+        assert table.probe(12345 + table.size) is None
+    finally:
+        other.close()
+        table.close()
+
+#Testing that Lazy SMP returns a legal move, leaves the engine as it was and counts the helpers' nodes.
+@pytest.mark.parametrize("threads", [1, 2])
+def test_lazy_smp(threads):
+    engine = ChessEngine()
+    engine.setBoard(REFERENCE_POSITIONS[1][1])
+    table = engine.tt
+    with LazySMP(threads, hashSizeMB=1) as smp:
+        move = smp.search(engine, depth=3)
+        stats = smp.stats
+    assert move in engine.validMoves()
+    assert engine.tt is table
+    assert not engine.moves
+    assert stats["depth"] == 3
+    assert stats["nodes"] == stats["mainNodes"] + stats["helperNodes"]
+    assert (stats["helperNodes"] > 0) == (threads > 1)
+    assert stats["nps"] > 0
+
+#Testing the Lazy SMP report.
+def test_run_lazy_smp():
+    out = io.StringIO()
+    results = runLazySMP(REFERENCE_POSITIONS[2][1], 0.2, [2], hashSizeMB=1, out=out)
+    assert results[0]["threads"] == 2
+    assert results[0]["move"] is not None
+    assert "NPS" in out.getvalue()
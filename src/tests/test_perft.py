@@ -0,0 +1,41 @@
+import io
+import pytest
+from chessengine import ChessEngine
+from perft import REFERENCE_POSITIONS, divide, perft, runPerft, runSuite
+
+@pytest.fixture
+def engine():
+    return ChessEngine()
+
+#Testing perft node counts from the starting position.
+def test_perft_initial_position(engine):
+    assert perft(engine, 1) == 20
+    assert perft(engine, 2) == 400
+    assert perft(engine, 3) == 8902
+    assert not engine.moves
+
+#Testing all reference positions against the known counts up to depth 2.
+@pytest.mark.parametrize("name,fen,counts", REFERENCE_POSITIONS, ids=[position[0] for position in REFERENCE_POSITIONS])
+def test_perft_reference_positions(engine, name, fen, counts):
+    engine.setBoard(fen)
+    for depth in (1, 2):
+        assert perft(engine, depth) == counts[depth], name
+
+#Testing that divide gives a count for every root move and the counts add up to perft.
+def test_divide(engine):
+    counts = divide(engine, 2)
+    assert len(counts) == 20
+    assert counts["e2e4"] == 20
+    assert sum(counts.values()) == perft(engine, 2)
+
+#Testing the perft report and the reference suite result, and that nothing is printed outside the report.
+def test_run_perft_report(capsys):
+    out = io.StringIO()
+    result = runPerft(REFERENCE_POSITIONS[0][1], 2, showDivide=True, out=out)
+    assert not capsys.readouterr().out
+    report = out.getvalue()
+    assert result["nodes"] == 400
+    assert "g1f3: 20" in report
+    assert "Nodes: 400" in report
+    assert "NPS:" in report
+    assert runSuite(1, out=io.StringIO())
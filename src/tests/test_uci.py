@@ -0,0 +1,107 @@
+import io
+import time
+import pytest
+from uci import MOVE_OVERHEAD, UCI, allocateTime
+
+@pytest.fixture
+def uci():
+    front_end = UCI(out=io.StringIO())
+    yield front_end
+    front_end.close()
+
+def output(uci):
+    return uci.out.getvalue().splitlines()
+
+#Testing the handshake and the options.
+def test_uci_handshake(uci):
+    uci.handleCommand("uci")
+    uci.handleCommand("isready")
+    lines = output(uci)
+    assert lines[0].startswith("id name")
+    assert "option name Hash type spin default 16 min 1 max 1024" in lines
+    assert lines[-2:] == ["uciok", "readyok"]
+    uci.handleCommand("setoption name Hash value 4")
+    uci.handleCommand("setoption name Threads value 3")
+    assert uci.engine.tt.size == 4 * 1024 * 1024 // uci.engine.tt.ENTRY_BYTES
+    assert uci.threads == 3
+    assert uci.handleCommand("quit") is False
+
+#Testing that the search options are listed and set the engine, with spin values clamped to their range.
+def test_uci_search_options(uci):
+    uci.handleCommand("uci")
+    lines = output(uci)
+    assert "option name NullMove type check default true" in lines
+    assert "option name LMRMinDepth type spin default 3 min 1 max 10" in lines
+    uci.handleCommand("setoption name NullMove value false")
+    uci.handleCommand("setoption name LMR value false")
+    uci.handleCommand("setoption name Razoring value false")
+    uci.handleCommand("setoption name NullMoveReduction value 9")
+    uci.handleCommand("setoption name LMRMinMoves value 5")
+    assert not uci.engine.nullMove and not uci.engine.lateMoveReductions and not uci.engine.razoring
+    assert uci.engine.futilityPruning
+    assert uci.engine.nullMoveReduction == 4 and uci.engine.lmrMinMoves == 5
+
+#Testing position with a FEN and with moves from the starting position, including castling and promotion.
+def test_uci_position(uci):
+    uci.handleCommand("position startpos moves e2e4 e7e5 g1f3 b8c6 f1c4 g8f6 e1g1")
+    assert uci.engine.board[7][6] == "K"
+    assert uci.engine.board[7][5] == "R"
+    assert uci.engine.turn == "black"
+    uci.handleCommand("position fen 8/P6k/8/8/8/8/8/K7 w - - 0 1 moves a7a8q")
+    assert uci.engine.board[0][0] == "Q"
+    uci.handleCommand("position startpos moves e2e9")
+    assert "info string Invalid position" in uci.out.getvalue()
+    assert uci.engine.getFen().startswith("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w")
+
+#Testing go with a fixed depth and the info line.
+def test_uci_go_depth(uci):
+    uci.handleCommand("position fen 6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1")
+    uci.handleCommand("go depth 3")
+    uci.waitForSearch()
+    lines = output(uci)
+    assert lines[-1] == "bestmove a1a8"
+    assert lines[-2].startswith("info depth")
+    assert "score cp 999900" in lines[-2]
+    #Every iteration sends its own info lines.
+    assert lines[0].startswith("info depth 1 score cp ") and " pv " in lines[0]
+    assert lines[1].startswith("info string qnodes ")
+
+#Testing that a search given a move time answers in time and that "stop" ends an infinite search.
+def test_uci_movetime_and_stop(uci):
+    uci.handleCommand("position startpos")
+    start = time.perf_counter()
+    uci.handleCommand("go movetime 300")
+    uci.waitForSearch()
+    assert time.perf_counter() - start < 0.3 + MOVE_OVERHEAD
+    assert output(uci)[-1].startswith("bestmove ")
+    uci.handleCommand("go infinite")
+    time.sleep(0.1)
+    uci.handleCommand("isready")
+    assert output(uci)[-1] == "readyok"
+    uci.handleCommand("stop")
+    assert output(uci)[-1].startswith("bestmove ")
+
+#Testing go with a node budget and in a position without moves.
+def test_uci_go_nodes_and_no_moves(uci):
+    uci.handleCommand("position startpos")
+    uci.handleCommand("go nodes 500")
+    uci.waitForSearch()
+    assert uci.engine.nodes + uci.engine.qNodes <= 500
+    uci.handleCommand("position fen 7k/5Q2/6K1/8/8/8/8/8 b - - 0 1")
+    uci.handleCommand("go depth 2")
+    uci.waitForSearch()
+    assert output(uci)[-1] == "bestmove 0000"
+
+#Testing time allocation from the clock.
+def test_allocate_time():
+    assert allocateTime(60) == pytest.approx(2.0)
+    assert allocateTime(60, increment=1) == pytest.approx(2.75)
+    assert allocateTime(60, movesToGo=10) == pytest.approx(6.0)
+    #With little time left the budget stays below the remaining time.
+    assert allocateTime(0.5, increment=2) == pytest.approx(0.25)
+    assert allocateTime(0.04) == 0.001
+    #Time is split by the side to move.
+    front_end = UCI(out=io.StringIO())
+    front_end.handleCommand("position startpos moves e2e4")
+    assert front_end.searchLimits("wtime 1000 btime 60000 movestogo 20".split())[1] == pytest.approx(3.0)
+    assert front_end.searchLimits(["infinite"])[3]
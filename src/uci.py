@@ -0,0 +1,407 @@
+import multiprocessing
+import os
+import sys
+import threading
+import time
+
+from book import OpeningBook
+from chessengine import MAX_SEARCH_DEPTH, OPENING_BOOK, TranspositionTable, createEngine
+from parallel import LazySMP
+
+ENGINE_NAME = "chess_ai"
+ENGINE_AUTHOR = "August Rouvari"
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+MAX_HASH_MB = 1024
+MAX_THREADS = 64
+#Time in seconds kept back from every move for reading the command, stopping the search and sending the move.
+MOVE_OVERHEAD = 0.05
+#Number of moves the remaining clock time is divided over when the GUI does not say how many are left.
+DEFAULT_MOVES_TO_GO = 30
+#Never plan to use more than this share of the remaining clock time on one move.
+MAX_CLOCK_SHARE = 0.5
+#Scores are in pawns, UCI reports them in centipawns.
+CENTIPAWNS = 100
+#Search options: UCI name -> (ChessEngine attribute, minimum, maximum), None for check options.
+SEARCH_OPTIONS = {
+    "NullMove": ("nullMove", None),
+    "NullMoveReduction": ("nullMoveReduction", (1, 4)),
+    "LMR": ("lateMoveReductions", None),
+    "LMRMinDepth": ("lmrMinDepth", (1, 10)),
+    "LMRMinMoves": ("lmrMinMoves", (1, 20)),
+    "Futility": ("futilityPruning", None),
+    "Razoring": ("razoring", None),
+}
+
+
+def allocateTime(timeLeft, increment=0.0, movesToGo=None):
+    """
+    Decides how long to think on one move from the clock.
+
+    Args:
+        timeLeft (float): Time left on the engine's clock in seconds.
+        increment (float): Time added to the clock after every move in seconds.
+        movesToGo (int): Moves until the next time control, None if the rest of the game has to be played in timeLeft.
+
+    Returns:
+        float: Time budget for the move in seconds.
+    """
+    moves = movesToGo if movesToGo else DEFAULT_MOVES_TO_GO
+    budget = timeLeft / moves + increment * 0.75
+    budget = min(budget, timeLeft * MAX_CLOCK_SHARE)
+    return max(0.001, min(budget, timeLeft - MOVE_OVERHEAD))
+
+
+def infoLines(stats, whiteToMove):
+    """
+    Formats the statistics of a search iteration as UCI info lines: the standard fields, then an info string with
+    the quiescence nodes, first-move cutoff rate, transposition table hit rate and branching factor.
+
+    Args:
+        stats (dict): The statistics from ChessEngine.searchStats.
+        whiteToMove (bool): True if white is to move in the root position.
+
+    Returns:
+        list: The info lines.
+    """
+    score = stats["score"] if whiteToMove else -stats["score"]
+    line = (f"info depth {stats['depth']} score cp {round(score * CENTIPAWNS)} nodes {stats['totalNodes']} "
+            f"nps {round(stats['nps'])} time {round(stats['time'] * 1000)}")
+    if stats["pv"]:
+        line += " pv " + " ".join(stats["pv"])
+    details = (f"info string qnodes {stats['qNodes']} fmc {stats['firstMoveCutoffRate']:.2f} "
+               f"tthit {stats['ttHitRate']:.2f} ebf {stats['branchingFactor']:.2f}")
+    return [line, details]
+
+
+class UCI:
+    """
+    Universal Chess Interface front-end for the engine. Commands are read on the calling thread and the search
+    runs on a worker thread, so "stop" and "isready" are answered while the engine is thinking. Every completed
+    iteration sends info lines, and the final one is sent before the best move.
+    With Threads above 1 the search is a Lazy SMP search with helper processes.
+    """
+    def __init__(self, out=sys.stdout, backend="mailbox"):
+        """
+        Args:
+            out (file): Where the responses are written.
+            backend (str): Board representation of the engine.
+        """
+        self.out = out
+        self.outputLock = threading.Lock()
+        self.engine = createEngine(backend)
+        self.engine.verbose = False
+        self.backend = backend
+        self.hashSizeMB = TranspositionTable.DEFAULT_SIZE_MB
+        self.threads = 1
+        self.smp = None
+        self.searchThread = None
+        #Read by ChessEngine.checkLimits on the search thread.
+        self.stopFlag = multiprocessing.RawValue("b", 0)
+        self.engine.stopFlag = self.stopFlag
+        self.engine.infoCallback = self.sendInfo
+        #Set when "stop" arrives, a "go infinite" search does not answer before it.
+        self.stopped = threading.Event()
+        #The opening book is used while OwnBook is on.
+        self.book = None
+        self.ownBook = True
+        if os.path.exists(OPENING_BOOK):
+            self.loadBook(OPENING_BOOK)
+
+    def send(self, line):
+        """
+        Writes one response line.
+
+        Args:
+            line (str): The response.
+        """
+        with self.outputLock:
+            print(line, file=self.out, flush=True)
+
+    def sendInfo(self, stats):
+        """
+        Sends the info lines of a completed search iteration, called by the engine.
+
+        Args:
+            stats (dict): The statistics from ChessEngine.searchStats.
+        """
+        for line in infoLines(stats, self.engine.turn == "white"):
+            self.send(line)
+
+    def run(self, commands=sys.stdin):
+        """
+        Reads and handles commands until "quit" or the end of the input.
+
+        Args:
+            commands (iterable): Lines of input.
+        """
+        for line in commands:
+            if not self.handleCommand(line):
+                break
+        self.close()
+
+    def close(self):
+        """
+        Stops the search and the helper processes.
+        """
+        self.stopSearch()
+        if self.smp is not None:
+            self.smp.close()
+            self.smp = None
+        self.loadBook("")
+
+    def loadBook(self, path):
+        """
+        Opens an opening book in place of the current one.
+
+        Args:
+            path (str): Path of the book file, empty for no book.
+        """
+        if self.book is not None:
+            self.book.close()
+            self.book = None
+        if path:
+            try:
+                self.book = OpeningBook(path)
+            except OSError as error:
+                self.send(f"info string Cannot open book: {error}")
+        self.engine.book = self.book if self.ownBook else None
+
+    def handleCommand(self, line):
+        """
+        Handles one command line.
+
+        Args:
+            line (str): The command.
+
+        Returns:
+            bool: False if the command was "quit".
+        """
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, args = tokens[0], tokens[1:]
+        if command == "uci":
+            self.send(f"id name {ENGINE_NAME}")
+            self.send(f"id author {ENGINE_AUTHOR}")
+            self.send(f"option name Hash type spin default {TranspositionTable.DEFAULT_SIZE_MB} min 1 max {MAX_HASH_MB}")
+            self.send(f"option name Threads type spin default 1 min 1 max {MAX_THREADS}")
+            self.send("option name OwnBook type check default true")
+            self.send(f"option name BookFile type string default {OPENING_BOOK if self.book is not None else '<empty>'}")
+            for option, (attribute, limits) in SEARCH_OPTIONS.items():
+                default = getattr(self.engine, attribute)
+                if limits is None:
+                    self.send(f"option name {option} type check default {str(default).lower()}")
+                else:
+                    self.send(f"option name {option} type spin default {default} min {limits[0]} max {limits[1]}")
+            self.send("uciok")
+        elif command == "isready":
+            self.send("readyok")
+        elif command == "ucinewgame":
+            self.stopSearch()
+            self.engine.resetBoard()
+        elif command == "setoption":
+            self.stopSearch()
+            self.setOption(args)
+        elif command == "position":
+            self.stopSearch()
+            self.setPosition(args)
+        elif command == "go":
+            self.stopSearch()
+            self.go(args)
+        elif command == "stop":
+            self.stopSearch()
+        elif command == "quit":
+            return False
+        else:
+            self.send(f"info string Unknown command: {line.strip()}")
+        return True
+
+    def setOption(self, args):
+        """
+        Handles "setoption name <name> value <value>". Hash, Threads, OwnBook, BookFile and the SEARCH_OPTIONS
+        are supported. The search options apply to the main search thread, Lazy SMP helpers keep the defaults.
+
+        Args:
+            args (list): The tokens after "setoption".
+        """
+        if "name" not in args or "value" not in args:
+            return
+        name = " ".join(args[args.index("name") + 1:args.index("value")]).lower()
+        value = " ".join(args[args.index("value") + 1:])
+        if name == "bookfile":
+            self.loadBook("" if value == "<empty>" else value)
+            return
+        if name == "ownbook":
+            self.ownBook = value.lower() == "true"
+            self.engine.book = self.book if self.ownBook else None
+            return
+        options = {option.lower(): setting for option, setting in SEARCH_OPTIONS.items()}
+        if name in options:
+            self.setSearchOption(*options[name], value)
+            return
+        try:
+            number = int(value)
+        except ValueError:
+            self.send(f"info string Invalid value for {name}: {value}")
+            return
+        if name == "hash":
+            self.hashSizeMB = min(max(number, 1), MAX_HASH_MB)
+            self.engine.setHashSize(self.hashSizeMB)
+        elif name == "threads":
+            self.threads = min(max(number, 1), MAX_THREADS)
+        else:
+            self.send(f"info string Unknown option: {name}")
+            return
+        if self.smp is not None:
+            #The helper processes are started again with the new settings on the next search.
+            self.smp.close()
+            self.smp = None
+
+    def setSearchOption(self, attribute, limits, value):
+        """
+        Sets one of the SEARCH_OPTIONS on the engine.
+
+        Args:
+            attribute (str): The ChessEngine attribute of the option.
+            limits (tuple): (minimum, maximum) of a spin option, None for a check option.
+            value (str): The value from "setoption".
+        """
+        if limits is None:
+            setattr(self.engine, attribute, value.lower() == "true")
+            return
+        try:
+            number = int(value)
+        except ValueError:
+            self.send(f"info string Invalid value for {attribute}: {value}")
+            return
+        setattr(self.engine, attribute, min(max(number, limits[0]), limits[1]))
+
+    def setPosition(self, args):
+        """
+        Handles "position startpos|fen <fen> [moves <move>...]".
+
+        Args:
+            args (list): The tokens after "position".
+        """
+        moves = []
+        if "moves" in args:
+            moves = args[args.index("moves") + 1:]
+            args = args[:args.index("moves")]
+        if args and args[0] == "fen":
+            fen = " ".join(args[1:])
+        else:
+            fen = START_FEN
+        try:
+            self.engine.setBoard(fen)
+            for move in moves:
+                self.engine.handleMove(move)
+        except (ValueError, KeyError, IndexError) as error:
+            self.send(f"info string Invalid position: {error}")
+            self.engine.setBoard(START_FEN)
+
+    def searchLimits(self, args):
+        """
+        Turns the arguments of "go" into the limits of the search.
+
+        Args:
+            args (list): The tokens after "go".
+
+        Returns:
+            tuple: (depth, timeLimit, nodeLimit, infinite). timeLimit and nodeLimit are None if not limited.
+        """
+        values = {}
+        for i, token in enumerate(args[:-1]):
+            if token in ("wtime", "btime", "winc", "binc", "movestogo", "movetime", "depth", "nodes"):
+                try:
+                    values[token] = int(args[i + 1])
+                except ValueError:
+                    self.send(f"info string Invalid value for {token}: {args[i + 1]}")
+        infinite = "infinite" in args
+        depth = min(values.get("depth", MAX_SEARCH_DEPTH), MAX_SEARCH_DEPTH)
+        time_limit = None
+        if "movetime" in values:
+            time_limit = max(0.001, values["movetime"] / 1000 - MOVE_OVERHEAD)
+        else:
+            side = "w" if self.engine.turn == "white" else "b"
+            if f"{side}time" in values:
+                time_limit = allocateTime(values[f"{side}time"] / 1000, values.get(f"{side}inc", 0) / 1000,
+                                          values.get("movestogo"))
+        if infinite:
+            time_limit = None
+        if not infinite and time_limit is None and "depth" not in values and "nodes" not in values:
+            #A bare "go" searches until "stop".
+            infinite = True
+        return depth, time_limit, values.get("nodes"), infinite
+
+    def go(self, args):
+        """
+        Handles "go", starting the search on the worker thread. The best move is sent when the search ends.
+
+        Args:
+            args (list): The tokens after "go".
+        """
+        depth, time_limit, node_limit, infinite = self.searchLimits(args)
+        self.stopFlag.value = 0
+        self.stopped.clear()
+        self.searchThread = threading.Thread(target=self.search, args=(depth, time_limit, node_limit, infinite),
+                                             daemon=True)
+        self.searchThread.start()
+
+    def search(self, depth, timeLimit, nodeLimit, infinite):
+        """
+        Runs the search on the worker thread and sends the result.
+
+        Args:
+            depth (int): The maximum search depth.
+            timeLimit (float): Time budget in seconds or None.
+            nodeLimit (int): Node budget or None.
+            infinite (bool): If True, the best move is sent only after "stop".
+        """
+        engine = self.engine
+        start = time.perf_counter()
+        if self.threads > 1:
+            if self.smp is None:
+                self.smp = LazySMP(self.threads, self.hashSizeMB, self.backend)
+            move = self.smp.search(engine, depth, timeLimit, nodeLimit)
+            nodes = self.smp.stats["nodes"]
+        else:
+            move = engine.bestMove(depth, timeLimit, nodeLimit)
+            nodes = engine.nodes + engine.qNodes
+        elapsed = time.perf_counter() - start
+        score = engine.rootScore if engine.turn == "white" else -engine.rootScore
+        info = (f"info depth {engine.completedDepth} score cp {round(score * CENTIPAWNS)} nodes {nodes} "
+                f"nps {round(nodes / elapsed) if elapsed > 0 else 0} time {round(elapsed * 1000)}")
+        if move is not None:
+            info += f" pv {move.getUCI()}"
+        self.send(info)
+        if infinite:
+            self.stopped.wait()
+        self.send(f"bestmove {move.getUCI() if move is not None else '0000'}")
+
+    def stopSearch(self):
+        """
+        Stops a running search and waits until its best move has been sent.
+        """
+        self.stopFlag.value = 1
+        self.stopped.set()
+        if self.searchThread is not None:
+            self.searchThread.join()
+            self.searchThread = None
+
+    def waitForSearch(self):
+        """
+        Waits until a search that is not infinite sends its best move.
+        """
+        if self.searchThread is not None:
+            self.searchThread.join()
+            self.searchThread = None
+
+
+def main():
+    """
+    Command line entry point, eg. python src/uci.py for a chess GUI or tournament manager.
+    """
+    UCI().run()
+
+if __name__ == "__main__":
+    main()